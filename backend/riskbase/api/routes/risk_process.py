@@ -16,7 +16,6 @@ from ..dependencies import get_current_active_user, get_current_admin_user
 import pandas as pd
 import numpy as np
 from sqlalchemy import (
-    create_engine,
     MetaData,
     Table,
     Column,
@@ -32,17 +31,28 @@ from datetime import datetime
 from pydantic import BaseModel
 import traceback
 from ...services import (
-    get_data_sap,
-    df_matrices_avon_natura,
-    df_matrices_otros_tipos,
-    df_matrices_merge_raw,
-    filter_avon_natura,
-    filter_marca_otros,
+    get_data_sap_snapshot,
+    get_matrix_store,
+    invalidate_matrices,
     upload_dataframe_to_db,
-    get_inventory_by_month_year,
-    process_dataframe_avon_natura,
-    process_dataframe_otras_marcas,
-    combine_final_dataframes,
+    iter_inventory,
+    write_excel_chunks,
+    process_riskbase_parallel,
+    to_export_frame,
+    store_last_run,
+    recompute_last_run,
+    wait_temp_file_writes,
+    simulate_last_run,
+    run_scenarios_last_run,
+    Scenario,
+    scenario_grid,
+    SCENARIO_DIMENSIONS,
+    SCENARIO_MAX_COUNT,
+    MATRIZ_EDIT_FIELDS,
+    INVENTARIO_EDIT_FIELDS,
+    get_write_engine,
+    engine_pool_stats,
+    get_sap_pool,
 )
 import logging
 
@@ -60,22 +70,29 @@ logger = logging.getLogger(__name__)
 
 # Endpoint para ejecutar el proceso completo de extracción, transformación y carga de datos de base riesgo
 @router.post("/process", response_model=Dict[str, Any])
-async def process_riskbase(current_user: User = Depends(get_current_active_user)):
+async def process_riskbase(
+    refresh: bool = Query(False, description="Volver a consultar SAP aunque exista la foto del mes"),
+    current_user: User = Depends(get_current_active_user),
+):
 
     """
     Ejecuta el proceso completo de extracción, transformación y carga de datos de riesgo.
 
     Este endpoint realiza las siguientes operaciones:
     1. Obtiene las matrices de configuración para AVON/NATURA y otros marcas
-    2. Extrae datos de SAP
-    3. Filtra y procesa los datos según el tipo de marca
-    4. Combina los resultados y genera un archivo Excel temporal
+    2. Extrae datos de SAP, o los lee de la foto del mes guardada en disco si existe
+    3. Procesa en una sola pasada los datos de todas las marcas
+    4. Genera un archivo Excel temporal con el resultado
+    5. Guarda la corrida en memoria para recalcularla al editar las matrices
 
     Permisos: Solo administradores
 
+    Args:
+        refresh (bool): Si es True se ignora la foto del mes y se vuelve a consultar SAP
+
     Returns:
         Dict[str, Any]: Resultado del proceso con información sobre filas procesadas,
-        columnas y nombre del archivo temporal generado
+        columnas, nombre del archivo temporal generado y origen de los datos de SAP
 
     Raises:
         HTTPException: Si no se pueden obtener datos de SAP o si ocurre un error durante el proceso
@@ -91,10 +108,16 @@ async def process_riskbase(current_user: User = Depends(get_current_active_user)
     
     logger.info(f"[process] Realizando el procesamiento de la base de riesgo")
     try:
-        matrices_avon_natura = df_matrices_avon_natura()
-        matrices_otros_tipos = df_matrices_otros_tipos()
-
-        df_sap = get_data_sap()
+        # Las matrices se leen de la base de datos solo si cambiaron desde la última lectura
+        matrix_store = get_matrix_store()
+        matrices_avon_natura = matrix_store.avon_natura()
+        matrices_otros_tipos = matrix_store.otros_tipos()
+
+        # La foto del mes evita volver a consultar SAP al reprocesar (por ejemplo tras ajustar matrices)
+        df_sap, sap_snapshot = get_data_sap_snapshot(refresh=refresh)
+        logger.info(
+            f"[process] Datos de SAP desde {sap_snapshot['source']} ({sap_snapshot.get('rows', 0)} filas)"
+        )
 
         if df_sap is None or df_sap.empty:
             logger.error(f"[process] No se pudieron obtener los datos de SAP")
@@ -103,21 +126,10 @@ async def process_riskbase(current_user: User = Depends(get_current_active_user)
                 detail="No se pudieron obtener datos de SAP",
             )
 
-        # 2. Filtro para obtener solo los datos de AVON y NATURA
-        df_avon_natura = filter_avon_natura(df_sap)
-        # 3. Filtro para obtener los datos de otras marcas
-        df_otras_marcas = filter_marca_otros(df_sap)
-
-        df_final_avon_natura = process_dataframe_avon_natura(
-            df_avon_natura, matrices_avon_natura
-        )
-
-        df_final_otras_marcas = process_dataframe_otras_marcas(
-            df_otras_marcas, matrices_otros_tipos
-        )
-
-        df_final_combined = combine_final_dataframes(
-            df_final_avon_natura, df_final_otras_marcas
+        # 2. Procesar en una sola pasada todas las marcas; solo el factor/clasificación depende de la marca.
+        #    Con muchas filas el motor de reglas se reparte entre varios procesos (ver RISK_PROCESS_WORKERS)
+        df_final_combined = process_riskbase_parallel(
+            df_sap, matrices_avon_natura, matrices_otros_tipos
         )
 
         logger.info(f"[process] Generando archivo Excel temporal")
@@ -125,7 +137,12 @@ async def process_riskbase(current_user: User = Depends(get_current_active_user)
         temp_dir = os.environ.get("TEMP_DIR")
         os.makedirs(temp_dir, exist_ok=True)
         excel_path = os.path.join(temp_dir, excel_file)
-        df_final_combined.to_excel(excel_path, index=False)
+        to_export_frame(df_final_combined).to_excel(excel_path, index=False)
+
+        # Se guarda la corrida para recalcular solo las filas afectadas al editar matrices
+        store_last_run(
+            df_final_combined, matrices_avon_natura, matrices_otros_tipos, excel_file
+        )
 
         # Cálculo de métricas de rendimiento
         t1 = time.perf_counter()
@@ -140,6 +157,8 @@ async def process_riskbase(current_user: User = Depends(get_current_active_user)
             "rows_processed": len(df_final_combined),
             "columns": df_final_combined.columns.tolist(),
             "excel_file": excel_file,
+            "sap_snapshot": sap_snapshot,
+            "matrices_version": matrix_store.version,
             # Métricas de rendimiento
             "performance_metrics": {
                 "cpu_usage_percent": round(cpu_end - cpu_start, 2),
@@ -178,6 +197,10 @@ async def process_riskbase(current_user: User = Depends(get_current_active_user)
 async def consult_riskbase(
     mes: int = Query(..., ge=1, le=12, description="Mes a consultar (1-12)"),
     anio: int = Query(..., ge=2000, description="Año a consultar (desde 2000)"),
+    columnas: Optional[List[str]] = Query(None, description="Columnas a incluir (por defecto todas)"),
+    marca_qm: Optional[List[str]] = Query(None, description="Filtrar por MARCA DE QM"),
+    centro: Optional[List[str]] = Query(None, description="Filtrar por CENTRO"),
+    status_cons: Optional[List[str]] = Query(None, description="Filtrar por STATUS CONS"),
     current_user: User = Depends(get_current_active_user),
 ):
     """
@@ -185,11 +208,16 @@ async def consult_riskbase(
 
     Este endpoint permite filtrar y obtener datos de la base de riesgo según el mes y año
     indicados. Genera un archivo Excel temporal con los resultados para su posterior
-    visualización o descarga.
+    visualización o descarga. Las filas se leen y se escriben en el Excel por bloques
+    (INVENTORY_CHUNK_ROWS), sin cargar el mes completo en memoria.
 
     Args:
         mes: Número de mes (1-12)
         anio: Año (desde 2000)
+        columnas: Columnas a incluir en el archivo (por defecto todas)
+        marca_qm: Valores de MARCA DE QM a incluir (opcional)
+        centro: Valores de CENTRO a incluir (opcional)
+        status_cons: Valores de STATUS CONS a incluir (opcional)
         current_user: Usuario autenticado que realiza la consulta
 
     Permisos: Administradores y usuarios regulares
@@ -199,7 +227,8 @@ async def consult_riskbase(
         columnas y nombre del archivo temporal generado
 
     Raises:
-        HTTPException: Si no se encuentran datos para el mes y año especificados o si ocurre un error
+        HTTPException: Si se pide una columna o un filtro no válido, si no se encuentran datos
+        para el mes y año especificados o si ocurre un error
     """
     # Medir el uso de memoria y CPU al inicio del proceso
     pid = os.getpid()
@@ -214,8 +243,24 @@ async def consult_riskbase(
         f"[consult-riskbase] Usuario: {current_user.username} consultando base de riesgo para mes={mes}, año={anio}"
     )
     try:
-        df_final_combined = get_inventory_by_month_year(mes, anio)
-        if df_final_combined is None or df_final_combined.empty:
+        try:
+            bloques = iter_inventory(
+                mes,
+                anio,
+                columns=columnas,
+                filters={"MARCA DE QM": marca_qm, "CENTRO": centro, "STATUS CONS": status_cons},
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        excel_file = f"Archivo_temporal_{datetime.now().strftime('%d-%m-%y_%H-%M')}.xlsx"
+        temp_dir = os.environ.get("TEMP_DIR")
+        os.makedirs(temp_dir, exist_ok=True)
+        excel_path = os.path.join(temp_dir, excel_file)
+        total_rows, columns = write_excel_chunks(bloques, excel_path)
+
+        if total_rows == 0:
+            os.remove(excel_path)
             logger.warning(
                 f"[consult-riskbase] No se encontraron datos para mes={mes}, año={anio}"
             )
@@ -223,12 +268,6 @@ async def consult_riskbase(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No se encontraron datos para mes={mes} y año={anio}",
             )
-
-        excel_file = f"Archivo_temporal_{datetime.now().strftime('%d-%m-%y_%H-%M')}.xlsx"
-        temp_dir = os.environ.get("TEMP_DIR")
-        os.makedirs(temp_dir, exist_ok=True)
-        excel_path = os.path.join(temp_dir, excel_file)
-        df_final_combined.to_excel(excel_path, index=False)
         
         # Cálculo de métricas de rendimiento
         t1 = time.perf_counter()
@@ -239,8 +278,8 @@ async def consult_riskbase(
         result = {
             "success": True,
             "message": "Consulta ejecutada correctamente",
-            "rows_processed": len(df_final_combined),
-            "columns": df_final_combined.columns.tolist(),
+            "rows_processed": total_rows,
+            "columns": columns,
             "excel_file": excel_file,
             # Métricas de rendimiento
             "performance_metrics": {
@@ -252,7 +291,7 @@ async def consult_riskbase(
                 "disk_usage": disk_usage,
             },
             "summary": {
-                "total_records": len(df_final_combined),
+                "total_records": total_rows,
             },
         }
         
@@ -266,6 +305,8 @@ async def consult_riskbase(
         logger.info(f"[consult-riskbase] Tiempo total de ejecución: {result['performance_metrics']['execution_time_seconds']:.2f} segundos")
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[consult-riskbase] Error: {e}")
         tb = traceback.format_exc()
@@ -322,6 +363,8 @@ async def get_risk_data(
             ),
         )
         file_path = os.path.join(temp_dir, temp_file)
+        # Si /risk/matrices-save dejó el archivo en cola para reescribirse, se espera a que termine
+        wait_temp_file_writes()
         if not os.path.exists(file_path):
             raise HTTPException(
                 status_code=404, detail="Archivo temporal no encontrado."
@@ -462,6 +505,8 @@ async def save_to_database(
         temp_dir = os.environ.get("TEMP_DIR")
         filename = request.filename
         file_path = os.path.join(temp_dir, filename)
+        # Si /risk/matrices-save dejó el archivo en cola para reescribirse, se espera a que termine
+        wait_temp_file_writes()
         if not os.path.exists(file_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -469,8 +514,8 @@ async def save_to_database(
             )
         df = pd.read_excel(file_path)
         
-        # Ejecutar la carga de datos
-        upload_dataframe_to_db(df)
+        # Ejecutar la carga de datos (staging y reemplazo de las filas del mes en una transacción)
+        carga = upload_dataframe_to_db(df)
         
         # Cálculo de métricas de rendimiento
         t1 = time.perf_counter()
@@ -482,6 +527,7 @@ async def save_to_database(
             "success": True,
             "message": "Datos guardados correctamente en la base de datos",
             "rows_saved": len(df),
+            "load": carga,
             # Métricas de rendimiento
             "performance_metrics": {
                 "cpu_usage_percent": round(cpu_end - cpu_start, 2),
@@ -543,7 +589,8 @@ async def get_matrices(current_user: User = Depends(get_current_admin_user)):
     )
     try:
         # Obtener datos de la base de datos
-        matrices = df_matrices_merge_raw()
+        matrix_store = get_matrix_store()
+        matrices = matrix_store.raw()
 
         if matrices is None or matrices.empty:
             raise HTTPException(
@@ -564,6 +611,7 @@ async def get_matrices(current_user: User = Depends(get_current_admin_user)):
             "matrices": matrices_dict,
             "total": len(matrices_dict),
             "columns": matrices.columns.tolist(),
+            "version": matrix_store.version,
             # Métricas de rendimiento
             "performance_metrics": {
                 "cpu_usage_percent": round(cpu_end - cpu_start, 2),
@@ -605,7 +653,10 @@ async def update_matrices(
     Este endpoint permite modificar los campos de las matrices de la política de la base de riesgo,
     incluyendo factor_prov y clasificacion en MatrizBaseRiesgo, así como campos
     relacionados en InventarioMatriz. Antes de realizar cualquier actualización,
-    guarda el estado actual en la tabla histórica MatrizBaseRiesgoHist.
+    guarda el estado actual en la tabla histórica MatrizBaseRiesgoHist. Si hay una corrida
+    de /risk/process en memoria, recalcula solo las filas afectadas con los campos que sí
+    quedaron escritos y deja en cola la reescritura de su archivo Excel temporal (el que leen
+    /risk/save-to-db y /risk/data-view, que esperan a que termine).
 
     Args:
         data: Diccionario con las filas a actualizar (debe contener "rows" o "matrices")
@@ -634,17 +685,8 @@ async def update_matrices(
         )
 
     # --- CONEXIÓN A LA BASE DE DATOS ---
-    # Aquí preparamos todo lo necesario para conectarnos a la base de datos.
-    # Se obtienen los datos de acceso y se crea el motor de conexión.
-    usuario = os.getenv("DB_USER")
-    pwd = os.getenv("DB_PASSWORD")
-    server = os.getenv("DB_SERVER")
-    db = os.getenv("DATABASE")
-    driver = "ODBC Driver 17 for SQL Server"
-    engine = create_engine(
-        f"mssql+pyodbc://{usuario}:{pwd}@{server}/{db}?driver={driver}",
-        connect_args={"fast_executemany": True},
-    )
+    # Se usa el engine compartido de escritura (fast_executemany), sin crear uno por solicitud.
+    engine = get_write_engine()
 
     metadata = MetaData()
     # Definimos la tabla principal donde están las matrices base de riesgo.
@@ -695,6 +737,8 @@ async def update_matrices(
 
     errors = []
     updated = 0
+    # Campos escritos por fila, con su id; con ellos se recalcula la última corrida
+    guardadas = []
 
     # Aquí empieza la parte principal donde se hacen los cambios.
     with engine.begin() as conn:
@@ -799,23 +843,14 @@ async def update_matrices(
             Ahora sí, preparamos los datos que realmente se van a actualizar.
             Solo se actualizan los campos que vienen en la petición y que no son nulos.
             """
-            matriz_fields = [
-                "concatenado",
-                "segmento",
-                "permanencia",
-                "factor_prov",
-                "clasificacion",
-                "tipo_matriz",
-            ]
-            inventario_fields = ["subsegmento", "estado", "cobertura", "negocio"]
             update_dict_matriz = {
                 field: row[field]
-                for field in matriz_fields
+                for field in MATRIZ_EDIT_FIELDS
                 if field in row and row[field] is not None
             }
             update_dict_inventario = {
                 field: row[field]
-                for field in inventario_fields
+                for field in INVENTARIO_EDIT_FIELDS
                 if field in row and row[field] is not None
             }
 
@@ -823,6 +858,8 @@ async def update_matrices(
                 # Si no hay nada para actualizar, lo reportamos.
                 errors.append({"id": id_, "error": "Nada para actualizar"})
                 continue
+            # Campos que sí quedaron escritos, por tabla, para recalcular la corrida solo con ellos.
+            escritos = {"id_politica_base_riesgo": id_}
             # Actualizamos la tabla principal si hay cambios para ella.
             if update_dict_matriz:
                 stmt = sqlalchemy_update(matriz_table).where(
@@ -831,6 +868,8 @@ async def update_matrices(
                 try:
                     result = conn.execute(stmt.values(**update_dict_matriz))
                     updated += result.rowcount
+                    if result.rowcount:
+                        escritos.update(update_dict_matriz)
                 except Exception as ex:
                     errors.append({"id": id_, "error": str(ex)})
             # Actualizamos la tabla de inventario si hay cambios para ella.
@@ -841,12 +880,32 @@ async def update_matrices(
                 try:
                     result_inv = conn.execute(stmt_inv.values(**update_dict_inventario))
                     updated += result_inv.rowcount
+                    if result_inv.rowcount:
+                        escritos.update(update_dict_inventario)
                 except Exception as ex:
                     errors.append({"id": id_, "error": str(ex)})
+            if len(escritos) > 1:
+                guardadas.append(escritos)
+    # La transacción ya se confirmó: las matrices en memoria se descartan para que la siguiente
+    # consulta lea los valores guardados.
+    matrices_version = invalidate_matrices() if updated > 0 else get_matrix_store().version
+
     # Al final, dejamos un registro en los logs de cuántas filas se actualizaron y cuántos errores hubo.
     logger.info(
         f"[matrices-save] Matrices actualizadas correctamente. Filas actualizadas: {updated}, Errores: {len(errors)}"
     )
+
+    # Recalculamos la última corrida de /risk/process solo para las filas cuyas llaves de matriz cambiaron.
+    recalculo = None
+    if guardadas:
+        try:
+            recalculo = recompute_last_run(guardadas)
+        except Exception as ex:
+            logger.error(f"[matrices-save] Error al recalcular la última corrida: {ex}")
+        if recalculo is not None:
+            logger.info(
+                f"[matrices-save] Recalculadas {recalculo['rows_recomputed']} filas en {recalculo['elapsed_ms']} ms"
+            )
     # Devolvemos un resumen de lo que pasó: si fue exitoso, cuántas filas se actualizaron y detalles de los errores si los hubo.
     return {
         "success": len(errors) == 0,
@@ -854,8 +913,182 @@ async def update_matrices(
         "rows_updated": updated,
         "errorRows": [e["id"] for e in errors],
         "errors": errors,
+        "recalculo": recalculo,
+        "matrices_version": matrices_version,
+    }
+
+
+# Endpoint para simular el impacto de cambios en las matrices sin guardarlos
+@router.post("/matrices-simulate", response_model=Dict[str, Any])
+async def simulate_matrices(
+    data: Dict[str, Any], current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Simula el impacto en la provisión de cambios propuestos en las matrices, sin guardarlos.
+
+    Las filas propuestas (mismo formato que /risk/matrices-save) se aplican a una copia en
+    memoria de las matrices y se recalculan solo las filas de la última corrida de
+    /risk/process que consultan las llaves editadas. No se escribe en la base de datos.
+
+    Args:
+        data: Diccionario con las filas propuestas (debe contener "rows" o "matrices")
+        current_user: Administrador autenticado que realiza la operación
+
+    Permisos: Solo administradores
+
+    Returns:
+        Dict[str, Any]: Filas afectadas, totales actuales y simulados y deltas de BASE RIESGO
+        y PROVISION agrupados por MARCA DE QM, SEGMENTACION y STATUS CONS
+
+    Raises:
+        HTTPException: Si no se envían filas, si no hay una corrida en memoria o si ocurre un error
+    """
+    matrices = data.get("rows") or data.get("matrices") or []
+    if not matrices:
+        logger.warning(f"[matrices-simulate] No se enviaron filas para simular")
+        raise HTTPException(status_code=400, detail="No se enviaron filas para simular.")
+    try:
+        simulacion = simulate_last_run(matrices)
+    except Exception as e:
+        logger.error(f"[matrices-simulate] Error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al simular los cambios de las matrices: {str(e)}",
+        )
+    if simulacion is None:
+        logger.warning(f"[matrices-simulate] No hay una corrida procesada en memoria")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay una corrida procesada en memoria. Ejecute el proceso primero.",
+        )
+    return {"success": True, **simulacion}
+
+
+# Endpoint para evaluar escenarios de estrés sobre la última corrida
+@router.post("/scenarios", response_model=Dict[str, Any])
+async def run_stress_scenarios(
+    data: Dict[str, Any], current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Evalúa en una sola llamada varios escenarios de estrés sobre la última corrida de /risk/process.
+
+    Cada escenario puede multiplicar el factor de provisión por clasificación
+    ("factor_scale", por ejemplo {"MUY ALTO": 1.2}) y desplazar los límites de los rangos de
+    días ("threshold_shift_days"). Los escenarios se envían en "scenarios" o se generan como
+    todas las combinaciones de "grid" ({"factor_scale": {"MUY ALTO": [1.0, 1.2]},
+    "threshold_shift_days": [0, -30]}). No se escribe en la base de datos. Se admiten hasta
+    SCENARIO_MAX_COUNT escenarios en total y sus nombres no se pueden repetir.
+
+    Args:
+        data: Diccionario con "scenarios" y/o "grid" y, opcionalmente, "dimension"
+              (por defecto 'MARCA DE QM'; ver SCENARIO_DIMENSIONS)
+        current_user: Administrador autenticado que realiza la operación
+
+    Permisos: Solo administradores
+
+    Returns:
+        Dict[str, Any]: Resumen escenario × dimensión con BASE RIESGO, PROVISION y sus deltas,
+        y los totales de cada escenario
+
+    Raises:
+        HTTPException: Si los escenarios no son válidos, si no hay una corrida en memoria o si
+        ocurre un error
+    """
+    logger.info(f"[scenarios] Usuario: {current_user.username} evaluando escenarios de estrés")
+    t0 = time.perf_counter()
+    dimension = data.get("dimension") or "MARCA DE QM"
+    try:
+        if dimension not in SCENARIO_DIMENSIONS:
+            raise ValueError(
+                f"La dimensión '{dimension}' no está permitida (solo {SCENARIO_DIMENSIONS})"
+            )
+        escenarios = [
+            Scenario(
+                e.get("name") or f"ESCENARIO {i + 1}",
+                e.get("factor_scale"),
+                e.get("threshold_shift_days", 0),
+            )
+            for i, e in enumerate(data.get("scenarios") or [])
+        ]
+        if len(escenarios) > SCENARIO_MAX_COUNT:
+            raise ValueError(
+                f"Se enviaron {len(escenarios)} escenarios; el máximo es {SCENARIO_MAX_COUNT}"
+            )
+        grid = data.get("grid")
+        if grid:
+            escenarios += scenario_grid(
+                grid.get("factor_scale"),
+                grid.get("threshold_shift_days") or [0],
+                SCENARIO_MAX_COUNT - len(escenarios),
+            )
+        if not escenarios:
+            raise ValueError("No se enviaron escenarios.")
+        resumen = run_scenarios_last_run(escenarios, dimension)
+    except ValueError as e:
+        logger.warning(f"[scenarios] Escenarios no válidos: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"[scenarios] Error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al evaluar los escenarios: {str(e)}",
+        )
+    if resumen is None:
+        logger.warning(f"[scenarios] No hay una corrida procesada en memoria")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay una corrida procesada en memoria. Ejecute el proceso primero.",
+        )
+
+    totales = (
+        resumen.drop(columns=[dimension])
+        .groupby("ESCENARIO", sort=False)
+        .sum()
+        .reset_index()
+    )
+    logger.info(
+        f"[scenarios] {len(escenarios)} escenarios evaluados en {time.perf_counter() - t0:.2f} segundos"
+    )
+    return {
+        "success": True,
+        "scenarios": len(escenarios),
+        "dimension": dimension,
+        "summary": jsonable_encoder(
+            resumen.astype(object).where(resumen.notna(), None).to_dict(orient="records")
+        ),
+        "totals": totales.to_dict(orient="records"),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
     }
 
+# Endpoint para monitorear los pools de conexiones a SQL Server y a SAP
+@router.get("/pool-stats", response_model=Dict[str, Any])
+async def get_pool_stats(current_user: User = Depends(get_current_admin_user)):
+    """
+    Retorna el estado de los pools de conexiones del proceso del API.
+
+    Permisos: Solo administradores
+
+    Returns:
+        Dict[str, Any]: Estado de los engines de SQLAlchemy ('sql', por engine de lectura y
+        escritura), del pool de conexiones RFC a SAP ('sap') y de las matrices en memoria
+        ('matrices').
+
+    Raises:
+        HTTPException: Si ocurre un error al leer el estado de los pools
+    """
+    try:
+        return {
+            "sql": engine_pool_stats(),
+            "sap": get_sap_pool().stats(),
+            "matrices": get_matrix_store().stats(),
+        }
+    except Exception as e:
+        logger.error(f"[pool-stats] Error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al consultar el estado de los pools: {str(e)}",
+        )
+
 #* Este endpoint se dispara automaticamente cuando se guarda la información en la base de datos
 # Endpoint para eliminar un archivo temporal Excel
 @router.delete("/delete-temp-file")
@@ -893,6 +1126,8 @@ async def delete_temp_file(
             )
         temp_dir = os.environ.get("TEMP_DIR")
         file_path = os.path.join(temp_dir, filename)
+        # Una reescritura pendiente de /risk/matrices-save no debe volver a crear el archivo
+        wait_temp_file_writes()
         if os.path.exists(file_path):
             os.remove(file_path)
             logger.info(f"[delete-temp-file] Archivo temporal eliminado correctamente")
@@ -1,9 +1,10 @@
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from .models.user import User, UserInDB, TokenData, UserRole
+from ..services.db_engine import get_read_engine
 import os
 from dotenv import load_dotenv
-from sqlalchemy import Column, Integer, String, Boolean, Enum as SqlEnum, create_engine
+from sqlalchemy import Column, Integer, String, Boolean, Enum as SqlEnum
 from sqlalchemy.orm import declarative_base, sessionmaker
 from typing import Optional
 from datetime import datetime, timedelta
@@ -12,11 +13,8 @@ from datetime import datetime, timedelta
 load_dotenv()
 
 # Configuración de seguridad
-db_url = (
-    f"mssql+pyodbc://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_SERVER')}/{os.getenv('DATABASE')}"
-    "?driver=ODBC+Driver+17+for+SQL+Server"
-)
-engine = create_engine(db_url)
+# La sesión usa el engine compartido del API (mismo pool que los servicios)
+engine = get_read_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -3,6 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
 from .api.routes import router as api_router
+from .services.sap_pool import close_sap_pool
+from .services.db_engine import dispose_engines
 import os
 from dotenv import load_dotenv
 
@@ -48,6 +50,13 @@ async def global_exception_handler(request: Request, exc: Exception):
 app.include_router(api_router)
 
 
+# Cerrar las conexiones a SAP y a SQL Server que quedan abiertas en los pools al apagar el API
+@app.on_event("shutdown")
+def shutdown_pools():
+    close_sap_pool()
+    dispose_engines()
+
+
 host = os.getenv("API_HOST")
 port = int(os.getenv("API_PORT"))
 # Ruta raíz
@@ -2,6 +2,9 @@ from .data_processing import (
     insert_marks,
     insert_subsegmentacion,
     insert_segments,
+    BRAND_MAPPINGS,
+    BRAND_CATEGORIES,
+    apply_brand_mappings,
     calculate_rango_permanencia_column,
     calculate_status_cons_column,
     calculate_valor_def_column,
@@ -16,16 +19,183 @@ from .data_processing import (
     calculate_otros_marcas_factor_and_class,
     process_dataframe_avon_natura,
     process_dataframe_otras_marcas,
-    combine_final_dataframes
+    combine_final_dataframes,
+    COLUMNAS_ORDENADAS,
+    order_final_columns,
+    apply_shared_steps,
+    process_riskbase_dataframe
+)
+
+from .rules_engine import (
+    RANGO_PERMANENCIA_EDGES,
+    compute_rango_permanencia_column,
+    compute_status_cons_column,
+    compute_valor_def_column,
+    compute_rango_obsoleto_column,
+    compute_rango_vencido_column,
+    compute_rango_bloqueado_column,
+    compute_day_range_columns,
+    bin_days,
+    compute_tiempo_bloqueo_column,
+    compute_rango_cons_column,
+    compute_base_riesgo_column,
+    compute_provision_column,
+    compile_avon_natura_index,
+    resolve_avon_natura_factor_and_class,
+    avon_natura_candidate_keys,
+    resolve_otros_marcas_factor_and_class,
+    compile_otros_marcas_plan,
+    verify_rules_engine
+)
+
+from .schema import (
+    SapColumn,
+    SAP_OUTPUT_SCHEMA,
+    SAP_MEASURE_COLUMNS,
+    SAP_CATEGORICAL_COLUMNS,
+    DERIVED_CATEGORICAL_COLUMNS,
+    CATEGORICAL_COLUMNS,
+    DATE_COLUMNS,
+    apply_categorical_schema,
+    parse_date_columns,
+    replace_invalid_values,
+    transform_categories,
+    concat_categorical,
+    text_column,
+    to_export_frame
+)
+
+from .decision_table import (
+    DecisionRule,
+    DecisionPlan,
+    OTROS_MARCAS_DECISION_TABLE,
+    compile_decision_plan
+)
+
+from .parallel_processing import (
+    partition_rows,
+    resolve_worker_count,
+    process_riskbase_parallel
+)
+
+from .matrix_index import (
+    MatrixIndex,
+    compile_matrix_index,
+    MATRIX_KEY_SEPARATOR,
+    matrix_key
+)
+
+from .run_cache import (
+    MATRIZ_EDIT_FIELDS,
+    INVENTARIO_EDIT_FIELDS,
+    SIMULATION_GROUP_COLUMNS,
+    ProcessedRun,
+    apply_matrix_edits,
+    store_last_run,
+    get_last_run,
+    recompute_last_run,
+    wait_temp_file_writes,
+    simulate_last_run,
+    run_scenarios_last_run
+)
+
+from .scenarios import (
+    SCENARIO_CHUNK_ROWS,
+    SCENARIO_DIMENSIONS,
+    SCENARIO_MAX_COUNT,
+    Scenario,
+    scenario_grid,
+    run_scenarios
+)
+
+from .sap_decoding import (
+    ROWS_AXIS,
+    key_characteristics,
+    decode_axis_data,
+    decode_axis_columns,
+    decode_cell_data,
+)
+
+from .sap_replay import (
+    SAP_RFC_MODE,
+    SAP_RECORD_DIR,
+    SAP_REPLAY_FALLBACK,
+    PYRFC_AVAILABLE,
+    ReplayConnection,
+    RecordingConnection,
+    recording_name,
+    save_response,
+    load_response,
+    scale_response,
+    rfc_connection,
+)
+
+from .sap_pool import (
+    SAP_POOL_SIZE,
+    SAP_POOL_IDLE_TIMEOUT,
+    SAP_POOL_ACQUIRE_TIMEOUT,
+    SAPConnectionPool,
+    sap_connection_params,
+    get_sap_pool,
+    close_sap_pool,
 )
 
 from .sap_operations import (
     SAPConnection,
+    SAP_SHARD_VARIABLE,
+    parse_shards,
+    shard_parameters,
+    decode_query_result,
+    extract_sharded,
     get_data_sap,
     filter_avon_natura,
     filter_marca_otros
 )
 
+from .sap_snapshot import (
+    SAP_SNAPSHOT_DIR,
+    snapshot_paths,
+    save_snapshot,
+    load_snapshot,
+    get_data_sap_snapshot,
+)
+
+from .db_engine import (
+    database_url,
+    get_read_engine,
+    get_write_engine,
+    engine_pool_stats,
+    dispose_engines,
+)
+
+from .bulk_load import (
+    DB_STAGING_TABLE,
+    DB_BULK_CHUNK_ROWS,
+    DB_WRITE_WORKERS,
+    INVENTORY_KEY_COLUMNS,
+    ensure_staging_table,
+    prepare_inventory_frame,
+    stage_dataframe,
+    hash_partitions,
+    resolve_write_workers,
+    stage_partitioned,
+    merge_staged,
+    clear_staged,
+    bulk_upsert_inventory,
+)
+
+from .inventory_reader import (
+    INVENTORY_CHUNK_ROWS,
+    INVENTORY_COLUMNS,
+    INVENTORY_NUMERIC_COLUMNS,
+    INVENTORY_FILTER_COLUMNS,
+    build_inventory_query,
+    type_inventory_chunk,
+    iter_inventory,
+    read_inventory,
+    write_excel_chunks,
+)
+
 from .database_operations import (
     get_sql_engine,
     execute_query,
@@ -37,16 +207,98 @@ from .database_operations import (
     export_dataframe_to_excel,
     get_inventory_by_month_year,
     df_matrices_avon_natura,
-    df_matrices_otros_tipos
+    df_matrices_otros_tipos,
+    normalize_matrices,
+    split_matrices
+)
+
+from .matrix_store import (
+    MatrixStore,
+    get_matrix_store,
+    invalidate_matrices,
 )
 
 __all__ = [
     # SAP Operations
     'SAPConnection',
+    'SAP_SHARD_VARIABLE',
+    'parse_shards',
+    'shard_parameters',
+    'decode_query_result',
+    'extract_sharded',
     'get_data_sap',
     'filter_avon_natura',
     'filter_marca_otros',
+
+    # SAP Decoding
+    'ROWS_AXIS',
+    'key_characteristics',
+    'decode_axis_data',
+    'decode_axis_columns',
+    'decode_cell_data',
+
+    # SAP Replay
+    'SAP_RFC_MODE',
+    'SAP_RECORD_DIR',
+    'SAP_REPLAY_FALLBACK',
+    'PYRFC_AVAILABLE',
+    'ReplayConnection',
+    'RecordingConnection',
+    'recording_name',
+    'save_response',
+    'load_response',
+    'scale_response',
+    'rfc_connection',
+
+    # SAP Pool
+    'SAP_POOL_SIZE',
+    'SAP_POOL_IDLE_TIMEOUT',
+    'SAP_POOL_ACQUIRE_TIMEOUT',
+    'SAPConnectionPool',
+    'sap_connection_params',
+    'get_sap_pool',
+    'close_sap_pool',
+
+    # SAP Snapshot
+    'SAP_SNAPSHOT_DIR',
+    'snapshot_paths',
+    'save_snapshot',
+    'load_snapshot',
+    'get_data_sap_snapshot',
     
+    # DB Engine
+    'database_url',
+    'get_read_engine',
+    'get_write_engine',
+    'engine_pool_stats',
+    'dispose_engines',
+
+    # Bulk Load
+    'DB_STAGING_TABLE',
+    'DB_BULK_CHUNK_ROWS',
+    'DB_WRITE_WORKERS',
+    'INVENTORY_KEY_COLUMNS',
+    'ensure_staging_table',
+    'prepare_inventory_frame',
+    'stage_dataframe',
+    'hash_partitions',
+    'resolve_write_workers',
+    'stage_partitioned',
+    'merge_staged',
+    'clear_staged',
+    'bulk_upsert_inventory',
+
+    # Inventory Reader
+    'INVENTORY_CHUNK_ROWS',
+    'INVENTORY_COLUMNS',
+    'INVENTORY_NUMERIC_COLUMNS',
+    'INVENTORY_FILTER_COLUMNS',
+    'build_inventory_query',
+    'type_inventory_chunk',
+    'iter_inventory',
+    'read_inventory',
+    'write_excel_chunks',
+
     # Database Operations
     'get_sql_engine',
     'execute_query',
@@ -59,11 +311,21 @@ __all__ = [
     'get_inventory_by_month_year',
     'df_matrices_avon_natura',
     'df_matrices_otros_tipos',
+    'normalize_matrices',
+    'split_matrices',
+
+    # Matrix Store
+    'MatrixStore',
+    'get_matrix_store',
+    'invalidate_matrices',
     
     # Data Processing
     'insert_marks',
     'insert_subsegmentacion',
     'insert_segments',
+    'BRAND_MAPPINGS',
+    'BRAND_CATEGORIES',
+    'apply_brand_mappings',
     'calculate_rango_permanencia_column',
     'calculate_status_cons_column',
     'calculate_valor_def_column',
@@ -80,4 +342,83 @@ __all__ = [
     'process_dataframe_avon_natura',
     'process_dataframe_otras_marcas',
     'combine_final_dataframes',
+    'COLUMNAS_ORDENADAS',
+    'order_final_columns',
+    'apply_shared_steps',
+    'process_riskbase_dataframe',
+
+    # Rules Engine
+    'RANGO_PERMANENCIA_EDGES',
+    'compute_rango_permanencia_column',
+    'compute_status_cons_column',
+    'compute_valor_def_column',
+    'compute_rango_obsoleto_column',
+    'compute_rango_vencido_column',
+    'compute_rango_bloqueado_column',
+    'compute_day_range_columns',
+    'bin_days',
+    'compute_tiempo_bloqueo_column',
+    'compute_rango_cons_column',
+    'compute_base_riesgo_column',
+    'compute_provision_column',
+    'compile_avon_natura_index',
+    'resolve_avon_natura_factor_and_class',
+    'avon_natura_candidate_keys',
+    'resolve_otros_marcas_factor_and_class',
+    'compile_otros_marcas_plan',
+    'verify_rules_engine',
+
+# Schema
+    'SapColumn',
+    'SAP_OUTPUT_SCHEMA',
+    'SAP_MEASURE_COLUMNS',
+    'SAP_CATEGORICAL_COLUMNS',
+    'DERIVED_CATEGORICAL_COLUMNS',
+    'CATEGORICAL_COLUMNS',
+    'DATE_COLUMNS',
+    'apply_categorical_schema',
+    'parse_date_columns',
+    'replace_invalid_values',
+    'transform_categories',
+    'concat_categorical',
+    'text_column',
+    'to_export_frame',
+
+# Decision Table
+    'DecisionRule',
+    'DecisionPlan',
+    'OTROS_MARCAS_DECISION_TABLE',
+    'compile_decision_plan',
+
+# Parallel Processing
+    'partition_rows',
+    'resolve_worker_count',
+    'process_riskbase_parallel',
+
+# Matrix Index
+    'MatrixIndex',
+    'compile_matrix_index',
+    'MATRIX_KEY_SEPARATOR',
+    'matrix_key',
+
+# Run Cache
+    'MATRIZ_EDIT_FIELDS',
+    'INVENTARIO_EDIT_FIELDS',
+    'SIMULATION_GROUP_COLUMNS',
+    'ProcessedRun',
+    'apply_matrix_edits',
+    'store_last_run',
+    'get_last_run',
+    'recompute_last_run',
+    'wait_temp_file_writes',
+    'simulate_last_run',
+    'run_scenarios_last_run',
+
+# Scenarios
+    'SCENARIO_CHUNK_ROWS',
+    'SCENARIO_DIMENSIONS',
+    'SCENARIO_MAX_COUNT',
+    'Scenario',
+    'scenario_grid',
+    'run_scenarios',
 ]
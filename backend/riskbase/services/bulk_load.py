@@ -0,0 +1,372 @@
+import pandas as pd
+import numpy as np
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import time
+import uuid
+import os
+from sqlalchemy import Column, Index, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from dotenv import load_dotenv
+
+from .schema import to_export_frame
+from .db_engine import get_write_engine
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA LA CARGA MASIVA DE InventarioBaseRiesgo A TRAVÉS DE UNA TABLA DE STAGING
+#! LAS FILAS SE CARGAN PRIMERO EN STAGING Y LUEGO SE REEMPLAZAN EN UNA SOLA TRANSACCIÓN: GUARDAR DOS VECES EL MISMO MES NO DUPLICA FILAS
+
+# Configuración por variables de entorno
+DB_STAGING_TABLE = os.getenv("DB_STAGING_TABLE", "InventarioBaseRiesgoStaging")
+DB_BULK_CHUNK_ROWS = int(os.getenv("DB_BULK_CHUNK_ROWS", "50000"))
+DB_WRITE_WORKERS = int(os.getenv("DB_WRITE_WORKERS", "0"))  # 0 = tamaño del pool de escritura
+
+# Tabla destino y llave con la que se reemplazan las filas de un mes
+INVENTORY_TABLE = "InventarioBaseRiesgo"
+INVENTORY_KEY_COLUMNS: List[str] = ["mes_registro", "año_registro", "MATERIAL", "LOTE", "CENTRO"]
+
+# Columna de staging que identifica cada carga
+LOAD_ID_COLUMN = "id_carga"
+
+
+def ensure_staging_table(
+    conn: Connection, table: str = INVENTORY_TABLE, staging: str = DB_STAGING_TABLE
+) -> Table:
+    """
+    Crea la tabla de staging si no existe, con las mismas columnas y tipos que la tabla
+    destino (sin llave primaria, identidad ni valores por defecto) más la columna id_carga,
+    indexada junto con MATERIAL, LOTE y CENTRO.
+
+    En SQL Server se desactiva el escalamiento de bloqueos de la tabla para que varias
+    conexiones puedan escribir particiones en paralelo sin bloquearse entre sí.
+
+    Args:
+        conn: Conexión abierta
+        table: Tabla destino
+        staging: Nombre de la tabla de staging
+
+    Returns:
+        Table: Definición de la tabla de staging.
+    """
+    metadata = MetaData()
+    destino = Table(table, metadata, autoload_with=conn)
+    columnas = [Column(c.name, c.type, nullable=True) for c in destino.columns]
+    tabla = Table(
+        staging,
+        metadata,
+        *columnas,
+        Column(LOAD_ID_COLUMN, String(36), nullable=False),
+        # La llave de la carga permite que el borrado por conjuntos busque por índice
+        Index(
+            f"IX_{staging}_{LOAD_ID_COLUMN}",
+            LOAD_ID_COLUMN,
+            *[c for c in INVENTORY_KEY_COLUMNS if c in destino.columns and c not in ("mes_registro", "año_registro")],
+        ),
+    )
+    if not inspect(conn).has_table(staging):
+        tabla.create(conn)
+        if conn.dialect.name == "mssql":
+            conn.execute(
+                text(f"ALTER TABLE {conn.dialect.identifier_preparer.quote(staging)} SET (LOCK_ESCALATION = DISABLE)")
+            )
+    return tabla
+
+
+def prepare_inventory_frame(
+    df: pd.DataFrame, mes: int, anio: int, load_id: str
+) -> pd.DataFrame:
+    """
+    Frame que se escribe en staging: columnas categóricas como texto, mes y año de registro
+    y el id de la carga.
+
+    Args:
+        df: DataFrame final de /risk/process (o leído del Excel temporal)
+        mes: Mes de registro (1-12)
+        anio: Año de registro
+        load_id: Id de la carga
+
+    Returns:
+        pd.DataFrame: Copia lista para to_sql.
+    """
+    frame = to_export_frame(df)
+    frame = frame.assign(**{"mes_registro": mes, "año_registro": anio, LOAD_ID_COLUMN: load_id})
+    return frame
+
+
+def stage_dataframe(
+    frame: pd.DataFrame,
+    engine: Engine,
+    staging: str = DB_STAGING_TABLE,
+    chunksize: int = DB_BULK_CHUNK_ROWS,
+) -> int:
+    """
+    Escribe un frame preparado (ver prepare_inventory_frame) en la tabla de staging en
+    lotes grandes; con el engine de escritura cada lote es un solo executemany de pyodbc.
+
+    Args:
+        frame: Frame con las columnas de la tabla destino e id_carga
+        engine: Engine de escritura
+        staging: Tabla de staging
+        chunksize: Filas por lote
+
+    Returns:
+        int: Filas escritas.
+    """
+    frame.to_sql(
+        name=staging, con=engine, if_exists="append", index=False, chunksize=chunksize
+    )
+    return len(frame)
+
+
+def hash_partitions(
+    frame: pd.DataFrame, n_partitions: int, keys: List[str] = INVENTORY_KEY_COLUMNS
+) -> List[np.ndarray]:
+    """
+    Reparte las filas en particiones por hash de la llave (las filas de una misma llave
+    quedan en la misma partición).
+
+    Args:
+        frame: DataFrame a particionar
+        n_partitions: Número de particiones
+        keys: Columnas de la llave; se usan las que existan en el frame
+
+    Returns:
+        List[np.ndarray]: Posiciones de las filas de cada partición no vacía.
+    """
+    columnas = [c for c in keys if c in frame.columns]
+    if n_partitions <= 1 or not columnas:
+        return [np.arange(len(frame))]
+    hashes = pd.util.hash_pandas_object(frame[columnas], index=False).to_numpy()
+    destino = hashes % np.uint64(n_partitions)
+    particiones = [np.flatnonzero(destino == i) for i in range(n_partitions)]
+    return [p for p in particiones if len(p)]
+
+
+def resolve_write_workers(engine: Engine, workers: Optional[int] = None) -> int:
+    """
+    Hilos de escritura: los indicados, DB_WRITE_WORKERS o, si es 0, el tamaño del pool del
+    engine. Nunca más que el tamaño del pool, porque cada hilo ocupa una conexión durante
+    toda su partición (para más hilos aumentar DB_WRITE_POOL_SIZE).
+    """
+    if workers is None:
+        workers = DB_WRITE_WORKERS
+    tamano = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    return max(1, min(workers or tamano, tamano))
+
+
+def stage_partitioned(
+    frame: pd.DataFrame,
+    engine: Engine,
+    workers: Optional[int] = None,
+    staging: str = DB_STAGING_TABLE,
+    chunksize: int = DB_BULK_CHUNK_ROWS,
+) -> List[Dict[str, Any]]:
+    """
+    Escribe un frame preparado en staging repartido en particiones por hash de la llave,
+    cada una en un hilo con su propia conexión del pool.
+
+    Cada partición se confirma por separado en staging; la tabla destino no cambia hasta
+    merge_staged, de modo que si una partición falla la carga completa se descarta.
+
+    Args:
+        frame: Frame preparado (ver prepare_inventory_frame)
+        engine: Engine de escritura
+        workers: Hilos (y particiones). Por defecto DB_WRITE_WORKERS (ver resolve_write_workers)
+        staging: Tabla de staging
+        chunksize: Filas por lote
+
+    Returns:
+        List[Dict[str, Any]]: Por partición, filas, segundos y filas por segundo.
+    """
+    hilos = resolve_write_workers(engine, workers)
+
+    def escribir(args) -> Dict[str, Any]:
+        numero, posiciones = args
+        t0 = time.perf_counter()
+        filas = stage_dataframe(frame.iloc[posiciones], engine, staging, chunksize)
+        segundos = time.perf_counter() - t0
+        print(f"[bulk-load] Partición {numero}: {filas} filas en {segundos:.2f} s")
+        return {
+            "partition": numero,
+            "rows": filas,
+            "seconds": round(segundos, 2),
+            "rows_per_second": round(filas / segundos, 1) if segundos > 0 else None,
+        }
+
+    particiones = list(enumerate(hash_partitions(frame, hilos)))
+    if len(particiones) == 1:
+        return [escribir(particiones[0])]
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        return list(executor.map(escribir, particiones))
+
+
+def _null_safe_equal(preparer: Any, alias: str, table: str, column: str) -> str:
+    """
+    Condición SQL de igualdad entre staging y destino que considera iguales dos NULL.
+    """
+    s = f"{alias}.{preparer.quote(column)}"
+    t = f"{table}.{preparer.quote(column)}"
+    return f"({s} = {t} OR ({s} IS NULL AND {t} IS NULL))"
+
+
+def _key_match(conn: Connection, alias: str, table: str, columns: List[str]) -> str:
+    """
+    Condición SQL que compara la llave de staging con la del destino, considerando iguales dos NULL.
+
+    En SQL Server se usa EXISTS (SELECT ... INTERSECT SELECT ...): INTERSECT ya compara los
+    NULL como iguales y el optimizador lo resuelve como una igualdad que puede usar el índice
+    de la llave (con OR ... IS NULL la búsqueda deja de usar el índice). En otros motores se
+    usa la comparación con OR.
+    """
+    preparer = conn.dialect.identifier_preparer
+    if conn.dialect.name == "mssql":
+        origen = ", ".join(f"{alias}.{preparer.quote(c)}" for c in columns)
+        destino = ", ".join(f"{table}.{preparer.quote(c)}" for c in columns)
+        return f"EXISTS (SELECT {origen} INTERSECT SELECT {destino})"
+    return " AND ".join(_null_safe_equal(preparer, alias, table, c) for c in columns)
+
+
+def merge_staged(
+    conn: Connection,
+    load_id: str,
+    columns: List[str],
+    mes: int,
+    anio: int,
+    table: str = INVENTORY_TABLE,
+    staging: str = DB_STAGING_TABLE,
+) -> Dict[str, int]:
+    """
+    Reemplaza en la tabla destino las filas de una carga de staging (borrado e inserción
+    por conjuntos). Debe ejecutarse dentro de una transacción (engine.begin()).
+
+    Se borran las filas del mes y año cuya llave (MATERIAL, LOTE, CENTRO) aparece en la
+    carga y luego se insertan todas las filas de la carga. Una misma llave puede tener
+    varias filas (por ejemplo por almacén), por eso se reemplazan en bloque en lugar de
+    actualizarse fila a fila con MERGE.
+
+    Args:
+        conn: Conexión con una transacción abierta
+        load_id: Id de la carga en staging
+        columns: Columnas a copiar a la tabla destino
+        mes: Mes de registro
+        anio: Año de registro
+        table: Tabla destino
+        staging: Tabla de staging
+
+    Returns:
+        Dict[str, int]: Filas borradas ('rows_deleted') e insertadas ('rows_inserted').
+    """
+    preparer = conn.dialect.identifier_preparer
+    destino = preparer.quote(table)
+    origen = preparer.quote(staging)
+    id_carga = preparer.quote(LOAD_ID_COLUMN)
+    llave = _key_match(
+        conn,
+        "s",
+        destino,
+        [c for c in INVENTORY_KEY_COLUMNS if c not in ("mes_registro", "año_registro")],
+    )
+
+    borrado = conn.execute(
+        text(
+            f"DELETE FROM {destino} "
+            f"WHERE {preparer.quote('mes_registro')} = :mes "
+            f"AND {preparer.quote('año_registro')} = :anio "
+            f"AND EXISTS (SELECT 1 FROM {origen} s WHERE s.{id_carga} = :id_carga AND {llave})"
+        ),
+        {"mes": mes, "anio": anio, "id_carga": load_id},
+    )
+    lista = ", ".join(preparer.quote(columna) for columna in columns)
+    insercion = conn.execute(
+        text(
+            f"INSERT INTO {destino} ({lista}) "
+            f"SELECT {lista} FROM {origen} WHERE {id_carga} = :id_carga"
+        ),
+        {"id_carga": load_id},
+    )
+    return {"rows_deleted": int(borrado.rowcount), "rows_inserted": int(insercion.rowcount)}
+
+
+def clear_staged(
+    engine: Engine, load_id: str, staging: str = DB_STAGING_TABLE
+) -> None:
+    """
+    Borra de staging las filas de una carga.
+    """
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"DELETE FROM {preparer.quote(staging)} "
+                f"WHERE {preparer.quote(LOAD_ID_COLUMN)} = :id_carga"
+            ),
+            {"id_carga": load_id},
+        )
+
+
+def bulk_upsert_inventory(
+    df: pd.DataFrame,
+    mes: Optional[int] = None,
+    anio: Optional[int] = None,
+    engine: Optional[Engine] = None,
+    chunksize: int = DB_BULK_CHUNK_ROWS,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Guarda el DataFrame final en InventarioBaseRiesgo a través de la tabla de staging.
+
+    1. Escribe las filas en staging bajo un id de carga nuevo, en lotes de chunksize filas,
+       repartidas en particiones que se escriben en paralelo (ver stage_partitioned)
+    2. En una sola transacción borra las filas del mes con las mismas llaves e inserta las de la carga
+    3. Borra la carga de staging (también si el paso 2 falla)
+
+    Volver a guardar el mismo mes reemplaza las filas en lugar de duplicarlas.
+
+    Args:
+        df: DataFrame final (mismas columnas que la tabla, sin mes_registro ni año_registro)
+        mes: Mes de registro. Por defecto el mes actual.
+        anio: Año de registro. Por defecto el año actual.
+        engine: Engine a usar. Por defecto el engine compartido de escritura.
+        chunksize: Filas por lote al escribir en staging
+        workers: Hilos de escritura en staging. Por defecto DB_WRITE_WORKERS.
+
+    Returns:
+        Dict[str, Any]: Id de la carga, filas escritas en staging, borradas e insertadas,
+        segundos de cada etapa y filas por segundo de cada partición.
+    """
+    hoy = datetime.now()
+    mes = mes or hoy.month
+    anio = anio or hoy.year
+    engine = engine or get_write_engine()
+    load_id = uuid.uuid4().hex
+
+    with engine.begin() as conn:
+        ensure_staging_table(conn)
+
+    frame = prepare_inventory_frame(df, mes, anio, load_id)
+    columnas = [c for c in frame.columns if c != LOAD_ID_COLUMN]
+    try:
+        t0 = time.perf_counter()
+        particiones = stage_partitioned(frame, engine, workers, chunksize=chunksize)
+        filas = sum(p["rows"] for p in particiones)
+        t1 = time.perf_counter()
+        with engine.begin() as conn:
+            resultado = merge_staged(conn, load_id, columnas, mes, anio)
+        t2 = time.perf_counter()
+    finally:
+        clear_staged(engine, load_id)
+
+    return {
+        "id_carga": load_id,
+        "mes_registro": mes,
+        "año_registro": anio,
+        "rows_staged": filas,
+        **resultado,
+        "stage_seconds": round(t1 - t0, 2),
+        "merge_seconds": round(t2 - t1, 2),
+        "rows_per_second": round(filas / (t1 - t0), 1) if t1 > t0 else None,
+        "workers": len(particiones),
+        "partitions": particiones,
+    }
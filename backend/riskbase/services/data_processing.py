@@ -1,9 +1,29 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Mapping, Tuple, Union
+from types import MappingProxyType
 from datetime import datetime
 import os
 from sqlalchemy import create_engine
+from .rules_engine import (
+    compute_rango_permanencia_column,
+    compute_status_cons_column,
+    compute_valor_def_column,
+    compute_day_range_columns,
+    compute_tiempo_bloqueo_column,
+    compute_rango_cons_column,
+    compute_base_riesgo_column,
+    compute_provision_column,
+    compile_avon_natura_index,
+    resolve_avon_natura_factor_and_class,
+    AVON_NATURA_FACTOR_COLUMNS,
+    OTROS_MARCAS_FACTOR_COLUMNS,
+    compile_otros_marcas_plan,
+    resolve_otros_marcas_factor_and_class,
+)
+from .matrix_index import MatrixIndex, compile_matrix_index
+from .decision_table import DecisionPlan
+from .schema import apply_categorical_schema, replace_invalid_values, concat_categorical, parse_date_columns
 
 #* AQUÍ SE ENCUENTRAN TODAS LAS FUNCIONES DE MAPEO
 
@@ -323,6 +343,57 @@ def insert_segments() -> Dict[str, str]:
     }
 
 
+#* REGISTRO DE MAPEOS DE MARCA: SE CONSTRUYE UNA SOLA VEZ AL IMPORTAR EL MÓDULO
+#! SI SE MODIFICAN LOS DICCIONARIOS DE ARRIBA, EL REGISTRO SE ACTUALIZA AL REINICIAR EL BACKEND
+
+# Columna formulada → (mapeo congelado MARCA DE QM → valor, valor por defecto)
+BRAND_MAPPINGS: Mapping[str, Tuple[Mapping[str, str], str]] = MappingProxyType(
+    {
+        "MARCA CONCAT": (MappingProxyType(insert_marks()), ""),
+        "SEGMENTACION": (MappingProxyType(insert_segments()), "OTRAS"),
+        "SUBSEGMENTACION": (MappingProxyType(insert_subsegmentacion()), ""),
+    }
+)
+
+# Diccionario único de categorías compartido por las tres columnas de mapeo
+BRAND_CATEGORIES = pd.CategoricalDtype(
+    sorted(
+        {
+            valor
+            for mapeo, default in BRAND_MAPPINGS.values()
+            for valor in (*mapeo.values(), default)
+        }
+    )
+)
+
+
+def apply_brand_mappings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Añade 'MARCA CONCAT', 'SEGMENTACION' y 'SUBSEGMENTACION' a partir de 'MARCA DE QM'.
+
+    Los mapeos se resuelven una sola vez por marca distinta (categorías de 'MARCA DE QM')
+    y luego se expanden a todas las filas con los códigos de la categoría, de modo que el
+    costo no crece con el número de lotes. Las tres columnas resultantes son categóricas
+    y comparten el diccionario BRAND_CATEGORIES.
+
+    Args:
+        df: DataFrame con la columna 'MARCA DE QM'
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame con las tres columnas de mapeo añadidas.
+    """
+    marcas = pd.Categorical(df["MARCA DE QM"])
+    codigos_marca = marcas.codes
+    for columna, (mapeo, default) in BRAND_MAPPINGS.items():
+        # Un código por marca distinta; la última posición corresponde a marcas nulas (código -1)
+        valores = [mapeo.get(marca, default) for marca in marcas.categories] + [default]
+        codigos_por_marca = BRAND_CATEGORIES.categories.get_indexer(valores)
+        df[columna] = pd.Categorical.from_codes(
+            codigos_por_marca[codigos_marca], dtype=BRAND_CATEGORIES
+        )
+    return df
+
+
 #* AQUÍ PUEDES AÑADIR MÁS FUNCIONES DE COLUMNAS FORMULADAS SEGUN LO NECESITE LA LÓGICA DE NEGOCIO
 
 def calculate_rango_permanencia_column(row: pd.Series) -> str:
@@ -894,253 +965,236 @@ def calculate_otros_marcas_factor_and_class(
 #! PRIMERO REALIZAR PRUEBAS ANTES DE MODIFICAR LA LÓGICA TANTO PARA AVON Y NATURA COMO PARA EL RESTO DE MARCAS
 
 
-#* AQUÍ SE ENCUENTRAN LAS DOS FUNCIONES PARA EL PROCESAMIENTO DE LOS DATOS DE AVON Y NATURA Y EL RESTO DE MARCAS
-#TODO: CADA QUE SE CREA UNA COLUMNA FORMULADA DEBES DE AÑADIRLA A ESTAS FUNCIONES
+#* AQUÍ SE APLICAN LOS PASOS COMUNES A TODAS LAS MARCAS (1 A 11)
 
-def process_dataframe_avon_natura(
-    df_avon_natura: pd.DataFrame, df_matrices_avon_natura: pd.DataFrame
-) -> pd.DataFrame:
+def apply_shared_steps(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Procesa el DataFrame de AVON y NATURA aplicando todas las reglas de negocio en orden.
+    Calcula las columnas formuladas que no dependen de la marca (pasos 1 a 11).
 
-    Esta función realiza el procesamiento completo de los datos de inventario para las
-    marcas AVON y NATURA, aplicando secuencialmente todas las transformaciones y cálculos
-    necesarios para el análisis de riesgo, incluyendo mapeos, cálculos de rangos,
-    estados, valores y provisiones.
+    Incluye los mapeos de marca, 'RANGO DE PERMANENCIA 2', 'STATUS CONS', 'VALOR DEF',
+    la limpieza de valores inválidos, la conversión de fechas, los rangos de días,
+    'RANGO CONS' y 'TIEMPO BLOQUEADO'. Solo el cálculo de 'FACTOR PROV' y
+    'CLAS BASE RIESGO' (paso 12) depende de la marca.
 
     Args:
-        df_avon_natura: DataFrame con los datos de inventario de AVON y NATURA
-        df_matrices_avon_natura: DataFrame con las matrices de referencia para el cálculo
-                                de factores de provisión y clasificaciones
+        df: DataFrame con los datos de SAP (se modifica en el lugar)
 
     Returns:
-        pd.DataFrame: DataFrame procesado con todas las columnas calculadas, incluyendo
-                     marcas concatenadas, segmentaciones, rangos, estados, valores,
-                     factores de provisión, clasificaciones y montos de provisión.
+        pd.DataFrame: El mismo DataFrame con las columnas comunes calculadas.
     """
-    # 1. Añadir columnas formuladas de 'MARCA CONCAT' y 'SEGMENTACION'
-    df_avon_natura["MARCA CONCAT"] = df_avon_natura["MARCA DE QM"].apply(
-        lambda x: insert_marks().get(x, "")
-    )
-    df_avon_natura["SEGMENTACION"] = df_avon_natura["MARCA DE QM"].apply(
-        lambda x: insert_segments().get(x, "OTRAS")
-    )
-    df_avon_natura["SUBSEGMENTACION"] = df_avon_natura["MARCA DE QM"].apply(
-        lambda x: insert_subsegmentacion().get(x, "")
-    )
+    # Asegurar que las columnas de texto del esquema sean categóricas (no hace nada si ya lo son)
+    apply_categorical_schema(df)
+
+    # 1. Añadir columnas formuladas de 'MARCA CONCAT', 'SEGMENTACION' y 'SUBSEGMENTACION'
+    apply_brand_mappings(df)
 
     # 2. Calcular 'RANGO DE PERMANENCIA 2'
     required_columns = {"LOTE", "PERMANENCIA", "RANGO DE PERMANENCIA"}
-    if required_columns.issubset(df_avon_natura.columns):
-        df_avon_natura["RANGO DE PERMANENCIA 2"] = df_avon_natura.apply(
-            calculate_rango_permanencia_column, axis=1
-        )
+    if required_columns.issubset(df.columns):
+        df["RANGO DE PERMANENCIA 2"] = compute_rango_permanencia_column(df)
     else:
-        print(f"Faltan columnas: {required_columns - set(df_avon_natura.columns)}")
+        print(f"Faltan columnas: {required_columns - set(df.columns)}")
 
     # 3. Calcular 'STATUS CONS'
     required_columns = {"RANGO PRÓX.VENCER MM", "VALOR BLOQUEADO MM", "VALOR OBSOLETO"}
-    if required_columns.issubset(df_avon_natura.columns):
-        df_avon_natura["STATUS CONS"] = df_avon_natura.apply(
-            calculate_status_cons_column, axis=1
-        )
+    if required_columns.issubset(df.columns):
+        df["STATUS CONS"] = compute_status_cons_column(df)
     else:
-        print(f"Faltan columnas: {required_columns - set(df_avon_natura.columns)}")
+        print(f"Faltan columnas: {required_columns - set(df.columns)}")
 
     # 4. Calcular 'VALOR DEF'
     required_columns = {"STATUS CONS", "VALOR BLOQUEADO MM", "VALOR TOTAL MM"}
-    if required_columns.issubset(df_avon_natura.columns):
-        df_avon_natura["VALOR DEF"] = df_avon_natura.apply(
-            calculate_valor_def_column, axis=1
-        )
+    if required_columns.issubset(df.columns):
+        df["VALOR DEF"] = compute_valor_def_column(df)
     else:
-        print(f"Faltan columnas: {required_columns - set(df_avon_natura.columns)}")
+        print(f"Faltan columnas: {required_columns - set(df.columns)}")
 
     # 5. Reemplazar valores inválidos
-    df_avon_natura.replace("#", np.nan, inplace=True)
+    replace_invalid_values(df)
 
     # 6. Convertir columnas de fecha
-    date_columns = [
-        "FECHA ENTRADA",
-        "FECHA OBSOLETO",
-        "FECHA BLOQUEADO",
-        "FECH. FABRICACIÓN",
-        "CREADO EL",
-        "FECH, CADUCIDAD/FECH PREF. CONSUMO",
-    ]
-
-    for col in date_columns:
-        if col in df_avon_natura.columns:
-            df_avon_natura[col] = pd.to_datetime(
-                df_avon_natura[col], format="%d/%m/%Y", errors="coerce"
-            )
-
-    # 7. Calcular 'RANGO OBSOLESCENCIA'
-    df_avon_natura["RANGO OBSOLESCENCIA"] = df_avon_natura.apply(
-        calculate_rango_obsoleto_column, axis=1
-    )
+    #    Las fechas llegan tipadas desde get_data_sap; solo se interpretan las que aún vengan como texto
+    parse_date_columns(df, format="%d/%m/%Y")
 
-    # 8. Calcular 'RANGO VENCIDO 2'
-    df_avon_natura["RANGO VENCIDO 2"] = df_avon_natura.apply(
-        calculate_rango_vencido_column, axis=1
-    )
-
-    # 9. Calcular 'RANGO BLOQUEADO 2'
-    df_avon_natura["RANGO BLOQUEADO 2"] = df_avon_natura.apply(
-        calculate_rango_bloqueado_column, axis=1
-    )
+    # 7, 8 y 9. Calcular 'RANGO OBSOLESCENCIA', 'RANGO VENCIDO 2' y 'RANGO BLOQUEADO 2'
+    rangos_dias = compute_day_range_columns(df)
+    for columna in rangos_dias.columns:
+        df[columna] = rangos_dias[columna]
 
     # 10. Calcular 'RANGO CONS'
-    df_avon_natura["RANGO CONS"] = df_avon_natura.apply(
-        calculate_rango_cons_column, axis=1
-    )
+    df["RANGO CONS"] = compute_rango_cons_column(df)
 
     # 11. Calcular 'TIEMPO BLOQUEO'
-    df_avon_natura["TIEMPO BLOQUEADO"] = df_avon_natura.apply(
-        calculate_tiempo_bloqueo_column, axis=1
-    )
+    df["TIEMPO BLOQUEADO"] = compute_tiempo_bloqueo_column(df)
 
-    # Construir lookup_dict **una vez** antes del apply
-    lookup_dict = {
-        str(r["concatenado"]).strip(): (r["factor_prov"], r["clasificacion"])
-        for _, r in df_matrices_avon_natura.iterrows()
-    }
+    return df
 
-    # Aplicar fila a fila y asignar dos nuevas columnas
-    df_avon_natura[["FACTOR PROV", "CLAS BASE RIESGO"]] = df_avon_natura.apply(
-        lambda row: pd.Series(calculate_avon_natura_factor_and_class(row, lookup_dict)),
-        axis=1,
-    )
+
+#* AQUÍ SE ENCUENTRAN LAS DOS FUNCIONES PARA EL PROCESAMIENTO DE LOS DATOS DE AVON Y NATURA Y EL RESTO DE MARCAS
+#TODO: CADA QUE SE CREA UNA COLUMNA FORMULADA DEBES DE AÑADIRLA A ESTAS FUNCIONES
+
+def process_dataframe_avon_natura(
+    df_avon_natura: pd.DataFrame, df_matrices_avon_natura: Union[pd.DataFrame, MatrixIndex]
+) -> pd.DataFrame:
+    """
+    Procesa el DataFrame de AVON y NATURA aplicando todas las reglas de negocio en orden.
+
+    Esta función realiza el procesamiento completo de los datos de inventario para las
+    marcas AVON y NATURA, aplicando secuencialmente todas las transformaciones y cálculos
+    necesarios para el análisis de riesgo, incluyendo mapeos, cálculos de rangos,
+    estados, valores y provisiones.
+
+    Args:
+        df_avon_natura: DataFrame con los datos de inventario de AVON y NATURA
+        df_matrices_avon_natura: DataFrame con las matrices de referencia para el cálculo
+                                de factores de provisión y clasificaciones, o su índice ya
+                                compilado con compile_avon_natura_index
+
+    Returns:
+        pd.DataFrame: DataFrame procesado con todas las columnas calculadas, incluyendo
+                     marcas concatenadas, segmentaciones, rangos, estados, valores,
+                     factores de provisión, clasificaciones y montos de provisión.
+    """
+    # 1 a 11. Columnas formuladas comunes a todas las marcas
+    apply_shared_steps(df_avon_natura)
+
+    # 12. Calcular 'FACTOR PROV' y 'CLAS BASE RIESGO' contra el índice compilado de la matriz NaturaCo
+    if isinstance(df_matrices_avon_natura, MatrixIndex):
+        indice_matrices = df_matrices_avon_natura
+    else:
+        indice_matrices = compile_avon_natura_index(df_matrices_avon_natura)
+    factor_clase = resolve_avon_natura_factor_and_class(df_avon_natura, indice_matrices)
+    df_avon_natura["FACTOR PROV"] = factor_clase["FACTOR PROV"]
+    df_avon_natura["CLAS BASE RIESGO"] = factor_clase["CLAS BASE RIESGO"]
 
     # 13. BASE RIESGO
-    df_avon_natura["BASE RIESGO"] = df_avon_natura.apply(
-        calculate_base_riesgo_column, axis=1
-    )
+    df_avon_natura["BASE RIESGO"] = compute_base_riesgo_column(df_avon_natura)
     # 14. PROVISION
-    df_avon_natura["PROVISION"] = df_avon_natura.apply(
-        calculate_provision_column, axis=1
-    )
+    df_avon_natura["PROVISION"] = compute_provision_column(df_avon_natura)
 
     return df_avon_natura
 
 
 def process_dataframe_otras_marcas(
-    df_otras_marcas: pd.DataFrame, df_matrices_otros_tipos: pd.DataFrame
+    df_otras_marcas: pd.DataFrame, df_matrices_otros_tipos: Union[pd.DataFrame, MatrixIndex]
 ) -> pd.DataFrame:
     """
     Procesa el DataFrame aplicando todas las reglas de negocio en el orden específico requerido.
 
     Args:
         df: DataFrame con los datos de SAP
+        df_matrices_otros_tipos: DataFrame de matrices del resto de marcas o su índice ya
+                                 compilado con compile_matrix_index
 
     Returns:
         pd.DataFrame: DataFrame procesado con todas las columnas calculadas
     """
 
-    # 1. Añadir columnas formuladas de 'MARCA CONCAT' y 'SEGMENTACION'
-    df_otras_marcas["MARCA CONCAT"] = df_otras_marcas["MARCA DE QM"].apply(
-        lambda x: insert_marks().get(x, "")
-    )
-    df_otras_marcas["SEGMENTACION"] = df_otras_marcas["MARCA DE QM"].apply(
-        lambda x: insert_segments().get(x, "OTRAS")
-    )
-    df_otras_marcas["SUBSEGMENTACION"] = df_otras_marcas["MARCA DE QM"].apply(
-        lambda x: insert_subsegmentacion().get(x, "")
-    )
+    # 1 a 11. Columnas formuladas comunes a todas las marcas
+    apply_shared_steps(df_otras_marcas)
 
-    # 2. Calcular 'RANGO DE PERMANENCIA 2'
-    required_columns = {"LOTE", "PERMANENCIA", "RANGO DE PERMANENCIA"}
-    if required_columns.issubset(df_otras_marcas.columns):
-        df_otras_marcas["RANGO DE PERMANENCIA 2"] = df_otras_marcas.apply(
-            calculate_rango_permanencia_column, axis=1
-        )
-    else:
-        print(f"Faltan columnas: {required_columns - set(df_otras_marcas.columns)}")
-
-    # 3. Calcular 'STATUS CONS'
-    required_columns = {"RANGO PRÓX.VENCER MM", "VALOR BLOQUEADO MM", "VALOR OBSOLETO"}
-    if required_columns.issubset(df_otras_marcas.columns):
-        df_otras_marcas["STATUS CONS"] = df_otras_marcas.apply(
-            calculate_status_cons_column, axis=1
-        )
+    # 12. Calcular 'FACTOR PROV' y 'CLAS BASE RIESGO' contra el índice compilado de matrices
+    if isinstance(df_matrices_otros_tipos, MatrixIndex):
+        indice_matrices = df_matrices_otros_tipos
     else:
-        print(f"Faltan columnas: {required_columns - set(df_otras_marcas.columns)}")
+        indice_matrices = compile_matrix_index(df_matrices_otros_tipos, keep="first")
+    factor_clase = resolve_otros_marcas_factor_and_class(df_otras_marcas, indice_matrices)
+    df_otras_marcas["FACTOR PROV"] = factor_clase["FACTOR PROV"]
+    df_otras_marcas["CLAS BASE RIESGO"] = factor_clase["CLAS BASE RIESGO"]
 
-    # 4. Calcular 'VALOR DEF'
-    required_columns = {"STATUS CONS", "VALOR BLOQUEADO MM", "VALOR TOTAL MM"}
-    if required_columns.issubset(df_otras_marcas.columns):
-        df_otras_marcas["VALOR DEF"] = df_otras_marcas.apply(
-            calculate_valor_def_column, axis=1
-        )
-    else:
-        print(f"Faltan columnas: {required_columns - set(df_otras_marcas.columns)}")
-
-    # 5. Reemplazar valores inválidos
-    df_otras_marcas.replace("#", np.nan, inplace=True)
-
-    # 6. Convertir columnas de fecha
-    date_columns = [
-        "FECHA ENTRADA",
-        "FECHA OBSOLETO",
-        "FECHA BLOQUEADO",
-        "FECH. FABRICACIÓN",
-        "CREADO EL",
-        "FECH, CADUCIDAD/FECH PREF. CONSUMO",
-    ]
-
-    for col in date_columns:
-        if col in df_otras_marcas.columns:
-            df_otras_marcas[col] = pd.to_datetime(
-                df_otras_marcas[col], format="%d/%m/%Y", errors="coerce"
-            )
-
-    # 7. Calcular 'RANGO OBSOLESCENCIA'
-    df_otras_marcas["RANGO OBSOLESCENCIA"] = df_otras_marcas.apply(
-        calculate_rango_obsoleto_column, axis=1
-    )
+    # 13. Calcular 'BASE RIESGO'
+    df_otras_marcas["BASE RIESGO"] = compute_base_riesgo_column(df_otras_marcas)
 
-    # 8. Calcular 'RANGO VENCIDO 2'
-    df_otras_marcas["RANGO VENCIDO 2"] = df_otras_marcas.apply(
-        calculate_rango_vencido_column, axis=1
-    )
+    # 14. Calcular 'PROVISION'
+    df_otras_marcas["PROVISION"] = compute_provision_column(df_otras_marcas)
 
-    # 9. Calcular 'RANGO BLOQUEADO 2'
-    df_otras_marcas["RANGO BLOQUEADO 2"] = df_otras_marcas.apply(
-        calculate_rango_bloqueado_column, axis=1
-    )
+    return df_otras_marcas
 
-    # 10. Calcular 'RANGO CONS'
-    df_otras_marcas["RANGO CONS"] = df_otras_marcas.apply(
-        calculate_rango_cons_column, axis=1
-    )
 
-    # 11. Calcular 'TIEMPO BLOQUEO'
-    df_otras_marcas["TIEMPO BLOQUEADO"] = df_otras_marcas.apply(
-        calculate_tiempo_bloqueo_column, axis=1
-    )
+#* AQUÍ SE ENCUENTRA LA FUNCION PARA UNIR LOS DATAFRAMES
 
-    # 12. Aplicar cálculo fila a fila, pasando el DataFrame de matrices:
-    df_otras_marcas[["FACTOR PROV", "CLAS BASE RIESGO"]] = df_otras_marcas.apply(
-        lambda r: pd.Series(
-            calculate_otros_marcas_factor_and_class(r, df_matrices_otros_tipos)
-        ),
-        axis=1,
-    )
+# Columnas del resultado final en el orden deseado
+COLUMNAS_ORDENADAS: List[str] = [
+    "NEGOCIO INVENTARIOS",
+    "AÑO NATURAL/MES",
+    "TIPO MATERIAL INVENTARIO",
+    "MARCA DE QM",
+    "MATERIAL",
+    "DESCRIPCIÓN",
+    "UNIDAD MEDIDA",
+    "CENTRO",
+    "CODIGO ALMACEN CLIENTE",
+    "INDICADOR STOCK ESPEC.",
+    "NÚM.STOCK.ESP.",
+    "LOTE",
+    "CREADO EL",
+    "FECH. FABRICACIÓN",
+    "FECH, CADUCIDAD/FECH PREF. CONSUMO",
+    "FECHA BLOQUEADO",
+    "FECHA OBSOLETO",
+    "FECHA ENTRADA",
+    "RANGO OBSOLETO 2",
+    "RANGO COBERTURA",
+    "RANGO DE PERMANENCIA",
+    "RANGO BLOQUEADO",
+    "RANGO OBSOLETO",
+    "RANGO VENCIDOS",
+    "PRÓXIMO A VENCER",
+    "RANGO PRÓX.VENCER MM",
+    "RANGO PRÓXIMOS A VEN",
+    "TIPO DE MATERIAL (I)",
+    "COSTO UNITARIO REAL",
+    "INVENTARIO DISPONIBL",
+    "INVENTARIO NO DISPON",
+    "VALOR OBSOLETO",
+    "VALOR BLOQUEADO MM",
+    "VALOR TOTAL MM",
+    "PERMANENCIA",
+    "TIEMPO BLOQUEADO",
+    "MARCA CONCAT",
+    "SEGMENTACION",
+    "SUBSEGMENTACION",
+    "RANGO DE PERMANENCIA 2",
+    "STATUS CONS",
+    "VALOR DEF",
+    "RANGO OBSOLESCENCIA",
+    "RANGO VENCIDO 2",
+    "RANGO BLOQUEADO 2",
+    "RANGO CONS",
+    "FACTOR PROV",
+    "CLAS BASE RIESGO",
+    "BASE RIESGO",
+    "PROVISION",
+]
+
+
+def order_final_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja el DataFrame procesado con las columnas de COLUMNAS_ORDENADAS y en ese orden.
 
-    # 13. Calcular 'BASE RIESGO'
-    df_otras_marcas["BASE RIESGO"] = df_otras_marcas.apply(
-        calculate_base_riesgo_column, axis=1
-    )
+    Las columnas con nombre repetido (SAP trae algunas dos veces) se renombran con un
+    sufijo '_n', de modo que solo se conserva la primera aparición.
 
-    # 14. Calcular 'PROVISION'
-    df_otras_marcas["PROVISION"] = df_otras_marcas.apply(
-        calculate_provision_column, axis=1
-    )
+    Args:
+        df: DataFrame procesado
 
-    return df_otras_marcas
+    Returns:
+        pd.DataFrame: DataFrame con las columnas finales ordenadas.
+    """
+    # Renombrar columnas duplicadas automáticamente
+    nuevos_nombres = []
+    conteo = {}
+    for col in df.columns:
+        if col in conteo:
+            conteo[col] += 1
+            nuevos_nombres.append(f"{col}_{conteo[col]}")
+        else:
+            conteo[col] = 0
+            nuevos_nombres.append(col)
+    df.columns = nuevos_nombres
 
+    return df.reindex(columns=COLUMNAS_ORDENADAS)
 
-#* AQUÍ SE ENCUENTRA LA FUNCION PARA UNIR LOS DATAFRAMES
 
 def combine_final_dataframes(
     df_final_avon_natura: pd.DataFrame, df_final_otras_marcas: pd.DataFrame
@@ -1162,77 +1216,78 @@ def combine_final_dataframes(
             f"Otras marcas: {cols2}"
         )
 
-    # Concatenar uno encima del otro
-    df_final_merge = pd.concat(
-        [df_final_avon_natura, df_final_otras_marcas], ignore_index=True
-    )
+    # Concatenar uno encima del otro, conservando las columnas categóricas
+    df_final_merge = concat_categorical([df_final_avon_natura, df_final_otras_marcas])
 
-    # Columnas en el orden deseado
-    columnas_ordenadas = [
-        "NEGOCIO INVENTARIOS",
-        "AÑO NATURAL/MES",
-        "TIPO MATERIAL INVENTARIO",
-        "MARCA DE QM",
-        "MATERIAL",
-        "DESCRIPCIÓN",
-        "UNIDAD MEDIDA",
-        "CENTRO",
-        "CODIGO ALMACEN CLIENTE",
-        "INDICADOR STOCK ESPEC.",
-        "NÚM.STOCK.ESP.",
-        "LOTE",
-        "CREADO EL",
-        "FECH. FABRICACIÓN",
-        "FECH, CADUCIDAD/FECH PREF. CONSUMO",
-        "FECHA BLOQUEADO",
-        "FECHA OBSOLETO",
-        "FECHA ENTRADA",
-        "RANGO OBSOLETO 2",
-        "RANGO COBERTURA",
-        "RANGO DE PERMANENCIA",
-        "RANGO BLOQUEADO",
-        "RANGO OBSOLETO",
-        "RANGO VENCIDOS",
-        "PRÓXIMO A VENCER",
-        "RANGO PRÓX.VENCER MM",
-        "RANGO PRÓXIMOS A VEN",
-        "TIPO DE MATERIAL (I)",
-        "COSTO UNITARIO REAL",
-        "INVENTARIO DISPONIBL",
-        "INVENTARIO NO DISPON",
-        "VALOR OBSOLETO",
-        "VALOR BLOQUEADO MM",
-        "VALOR TOTAL MM",
-        "PERMANENCIA",
-        "TIEMPO BLOQUEADO",
-        "MARCA CONCAT",
-        "SEGMENTACION",
-        "SUBSEGMENTACION",
-        "RANGO DE PERMANENCIA 2",
-        "STATUS CONS",
-        "VALOR DEF",
-        "RANGO OBSOLESCENCIA",
-        "RANGO VENCIDO 2",
-        "RANGO BLOQUEADO 2",
-        "RANGO CONS",
-        "FACTOR PROV",
-        "CLAS BASE RIESGO",
-        "BASE RIESGO",
-        "PROVISION",
-    ]
 
-    # Renombrar columnas duplicadas automáticamente
-    nuevos_nombres = []
-    conteo = {}
-    for col in df_final_merge.columns:
-        if col in conteo:
-            conteo[col] += 1
-            nuevos_nombres.append(f"{col}_{conteo[col]}")
-        else:
-            conteo[col] = 0
-            nuevos_nombres.append(col)
-    df_final_merge.columns = nuevos_nombres
+    return order_final_columns(df_final_merge)
+
+
+#* AQUÍ SE ENCUENTRA EL PIPELINE UNIFICADO PARA TODAS LAS MARCAS
+
+def process_riskbase_dataframe(
+    df_sap: pd.DataFrame,
+    df_matrices_avon_natura: Union[pd.DataFrame, MatrixIndex],
+    df_matrices_otros_tipos: Union[pd.DataFrame, MatrixIndex, DecisionPlan],
+) -> pd.DataFrame:
+    """
+    Procesa en una sola pasada el DataFrame completo de SAP, sin separarlo por marca.
+
+    Los pasos comunes (1 a 11, 13 y 14) se calculan una sola vez sobre todas las filas.
+    Solo el paso 12 ('FACTOR PROV' y 'CLAS BASE RIESGO') se resuelve por separado para
+    AVON/NATURA y para el resto de marcas, con una máscara de marca, y su resultado se
+    escribe en el lugar. Así se evitan las copias de filter_avon_natura/filter_marca_otros
+    y la concatenación de combine_final_dataframes. Las filas conservan el orden de SAP.
+
+    Args:
+        df_sap: DataFrame retornado por get_data_sap (se modifica en el lugar)
+        df_matrices_avon_natura: Matrices de AVON y NATURA o su índice compilado
+                                 con compile_avon_natura_index
+        df_matrices_otros_tipos: Matrices del resto de marcas, su índice compilado con
+                                 compile_matrix_index o su plan compilado con compile_decision_plan
 
-    df_final_merge = df_final_merge.reindex(columns=columnas_ordenadas)
+    Returns:
+        pd.DataFrame: DataFrame final con las columnas de COLUMNAS_ORDENADAS.
+    """
+    if not isinstance(df_matrices_avon_natura, MatrixIndex):
+        df_matrices_avon_natura = compile_avon_natura_index(df_matrices_avon_natura)
+    df_matrices_otros_tipos = compile_otros_marcas_plan(df_matrices_otros_tipos)
+
+    # 1 a 11. Columnas formuladas comunes a todas las marcas
+    apply_shared_steps(df_sap)
+
+    # 12. 'FACTOR PROV' y 'CLAS BASE RIESGO' según la marca
+    es_avon_natura = df_sap["MARCA DE QM"].isin(["AVON", "NATURA"]).to_numpy(dtype=bool)
+    factores = np.zeros(len(df_sap), dtype=float)
+    clasificaciones = np.full(len(df_sap), "BAJO", dtype=object)
+    for filas, resolver, indice, columnas in (
+        (
+            es_avon_natura,
+            resolve_avon_natura_factor_and_class,
+            df_matrices_avon_natura,
+            AVON_NATURA_FACTOR_COLUMNS,
+        ),
+        (
+            ~es_avon_natura,
+            resolve_otros_marcas_factor_and_class,
+            df_matrices_otros_tipos,
+            OTROS_MARCAS_FACTOR_COLUMNS,
+        ),
+    ):
+        if not filas.any():
+            continue
+        # Solo se toman las columnas que lee el resolvedor, no el DataFrame completo
+        presentes = [c for c in columnas if c in df_sap.columns]
+        factor_clase = resolver(df_sap.loc[filas, presentes], indice)
+        factores[filas] = factor_clase["FACTOR PROV"].to_numpy()
+        clasificaciones[filas] = factor_clase["CLAS BASE RIESGO"].to_numpy(dtype=object)
+    df_sap["FACTOR PROV"] = factores
+    df_sap["CLAS BASE RIESGO"] = pd.Categorical(clasificaciones)
+
+    # 13. Calcular 'BASE RIESGO'
+    df_sap["BASE RIESGO"] = compute_base_riesgo_column(df_sap)
+
+    # 14. Calcular 'PROVISION'
+    df_sap["PROVISION"] = compute_provision_column(df_sap)
 
-    return df_final_merge
+    return order_final_columns(df_sap)
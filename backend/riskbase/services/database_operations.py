@@ -1,9 +1,12 @@
 import pandas as pd
 import os
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
+from .schema import to_export_frame
+from .db_engine import get_read_engine
+from .bulk_load import bulk_upsert_inventory
+from .inventory_reader import read_inventory
 
 load_dotenv()
 
@@ -12,10 +15,10 @@ load_dotenv()
 
 def get_sql_engine():
     """
-    Establece la conexión a SQL Server mediante SQLAlchemy.
-    Configura los datos de conexión utilizando variables de entorno definidas en el archivo .env.
-    
-    Las variables de entorno requeridas son:
+    Retorna el engine de SQLAlchemy compartido para la conexión a SQL Server.
+
+    El engine se crea una sola vez por proceso (ver db_engine.get_read_engine) con los datos
+    de conexión de las variables de entorno:
     - DB_USER: Usuario de la base de datos
     - DB_PASSWORD: Contraseña del usuario
     - DB_SERVER: Dirección del servidor SQL
@@ -25,21 +28,10 @@ def get_sql_engine():
         sqlalchemy.engine.Engine: Objeto engine de SQLAlchemy configurado para la conexión a SQL Server.
         
     Raises:
-        Exception: Si ocurre un error durante la conexión a la base de datos.
+        Exception: Si ocurre un error al crear el engine.
     """
     try:
-        connection_string = (
-            "mssql+pyodbc://{user}:{pwd}@{server}/{db}"
-            "?driver=ODBC+Driver+17+for+SQL+Server"
-        ).format(
-            user=os.getenv("DB_USER"),
-            pwd=os.getenv("DB_PASSWORD"),
-            server=os.getenv("DB_SERVER"),
-            db=os.getenv("DATABASE")
-        )
-        engine = create_engine(connection_string)
-        print("Conexión exitosa a la base de datos.")
-        return engine
+        return get_read_engine()
     except Exception as e:
         print(f"Error al conectar a la base de datos: {str(e)}")
         raise
@@ -47,7 +39,7 @@ def get_sql_engine():
 def execute_query(query):
     """
     Ejecuta el query en la base de datos y retorna un DataFrame utilizando SQLAlchemy.
-    Gestiona automáticamente la conexión y desconexión a la base de datos.
+    La conexión se toma del pool del engine compartido y se devuelve al terminar.
     
     Args:
         query (str): Consulta SQL a ejecutar en la base de datos.
@@ -56,14 +48,12 @@ def execute_query(query):
         pandas.DataFrame: DataFrame con los resultados de la consulta.
         En caso de error, retorna un DataFrame vacío.
     """
-    engine = get_sql_engine()
     try:
-        df = pd.read_sql(query, engine)
+        with get_sql_engine().connect() as conn:
+            df = pd.read_sql(query, conn)
     except Exception as e:
         print(f"Error al ejecutar el query: {str(e)}")
         df = pd.DataFrame()  # Retorna un DataFrame vacío en caso de error
-    finally:
-        engine.dispose()  # Cierra la conexión
     return df
 
 
@@ -132,6 +122,47 @@ def df_matrices_merge_raw():
     # NO se modifica ningún campo
     return df_matrices_merge
 
+def normalize_matrices(df_matrices_merge: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza una copia de las matrices unificadas (resultado de df_matrices_merge_raw):
+    convierte los campos de texto a mayúsculas de forma vectorizada y pasa 'factor_prov'
+    de porcentaje a decimal.
+
+    Args:
+        df_matrices_merge: Matrices unificadas sin modificar
+
+    Returns:
+        pandas.DataFrame: Copia con los textos en mayúsculas y factor_prov normalizado.
+    """
+    df = df_matrices_merge.copy()
+
+    # Convertir los campos de tipo string a mayúsculas de forma vectorizada
+    for col in df.select_dtypes(include=["object"]).columns:
+        df[col] = df[col].str.upper()
+
+    # Convertir 'factor_prov' a float y normalizarlo
+    df["factor_prov"] = df["factor_prov"].astype(float) / 100.0
+    return df
+
+def split_matrices(df_matrices: pd.DataFrame):
+    """
+    Separa las matrices normalizadas en las de AVON/NATURA ('MATRIZ NATURACO') y las del
+    resto de marcas.
+
+    Args:
+        df_matrices: Matrices normalizadas (resultado de normalize_matrices)
+
+    Returns:
+        Tuple[pandas.DataFrame, pandas.DataFrame]: (matrices 'MATRIZ NATURACO', demás matrices),
+        ambas con el índice reiniciado.
+    """
+    # Ya están en mayúsculas, por eso se compara con 'MATRIZ NATURACO'
+    mask = df_matrices["tipo_matriz"] == "MATRIZ NATURACO"
+    return (
+        df_matrices[mask].reset_index(drop=True),
+        df_matrices[~mask].reset_index(drop=True),
+    )
+
 def df_matrices_merge():
     """
     Extrae los datos de ambas tablas, los unifica utilizando pd.merge() y convierte
@@ -142,170 +173,82 @@ def df_matrices_merge():
     2. Realiza una unión interna (inner join) utilizando 'id_politica_base_riesgo'
     3. Convierte todos los campos de texto a mayúsculas
     4. Normaliza el campo 'factor_prov' dividiéndolo por 100 (convierte de porcentaje a decimal)
+
+    Siempre consulta la base de datos; para reutilizar las matrices entre solicitudes
+    usar get_matrix_store().
     
     Returns:
         pandas.DataFrame: DataFrame unificado con los textos en mayúsculas y factor_prov normalizado.
     """
-    df_inventario = get_inventario_matriz()
-    df_matrices = get_matrices_base_riesgo()
-    
-    # Unificación utilizando la columna en común 'id_politica_base_riesgo'
-    df_matrices_merge = pd.merge(df_inventario, df_matrices, 
-                        on="id_politica_base_riesgo", 
-                        how="inner")  # Cambia 'inner' por 'left' o 'outer' según lo requieras
-    
-    # Convertir los campos de tipo string a mayúsculas de forma vectorizada
-    for col in df_matrices_merge.select_dtypes(include=["object"]).columns:
-        df_matrices_merge[col] = df_matrices_merge[col].str.upper()
-    
-    # Convertir 'factor_prov' a float y normalizarlo
-    df_matrices_merge["factor_prov"] = df_matrices_merge["factor_prov"].astype(float) / 100.0
-    
-    return df_matrices_merge
+    return normalize_matrices(df_matrices_merge_raw())
 
 def df_matrices_avon_natura():
     """
-    Extrae los datos de ambas tablas, las unifica utilizando pd.merge(),
-    convierte todos los campos de texto a mayúsculas de forma vectorizada,
-    normaliza el factor provisional y, finalmente, filtra solo las filas
+    Extrae las matrices normalizadas (ver df_matrices_merge) y filtra solo las filas
     donde 'tipo_matriz' == 'MATRIZ NATURACO'.
     
-    Realiza las siguientes operaciones:
-    1. Extrae datos de las tablas InventarioMatriz y MatrizBaseRiesgo
-    2. Realiza una unión interna (inner join) utilizando 'id_politica_base_riesgo'
-    3. Convierte todos los campos de texto a mayúsculas
-    4. Normaliza el campo 'factor_prov' dividiéndolo por 100
-    5. Filtra solo las filas donde tipo_matriz es 'MATRIZ NATURACO'
-    
     Returns:
         pandas.DataFrame: DataFrame filtrado que contiene solo los registros de tipo 'MATRIZ NATURACO'.
     """
-    # 1. Extraer los DataFrames base
-    df_inventario = get_inventario_matriz()
-    df_matrices   = get_matrices_base_riesgo()
-    
-    # 2. Unirlos por la clave foránea
-    df = pd.merge(
-        df_inventario,
-        df_matrices,
-        on="id_politica_base_riesgo",
-        how="inner"  # o 'left' / 'outer' según necesidad
-    )
-    
-    # 3. Pasar a mayúsculas todas las columnas de texto
-    text_cols = df.select_dtypes(include="object").columns
-    for c in text_cols:
-        df[c] = df[c].str.upper()
-    
-    # 4. Normalizar el factor provisional (de porcentaje a [0–1])
-    df["factor_prov"] = df["factor_prov"].astype(float) / 100.0
-    
-    # 5. Filtrar solo las filas de 'Matriz NaturaCo'
-    #    (ten en cuenta que ya convertimos todo a mayúsculas)
-    df = df[df["tipo_matriz"] == "MATRIZ NATURACO"].reset_index(drop=True)
-    
-    return df
+    return split_matrices(df_matrices_merge())[0]
 
 def df_matrices_otros_tipos():
     """
-    Devuelve solo las filas de df_merge donde 'tipo_matriz' sea distinto de 'Matriz NaturaCo'.
+    Devuelve solo las filas de df_matrices_merge donde 'tipo_matriz' sea distinto de 'MATRIZ NATURACO'.
     Útil para aislar todas las demás matrices.
     
-    Realiza las siguientes operaciones:
-    1. Extrae datos de las tablas InventarioMatriz y MatrizBaseRiesgo
-    2. Realiza una unión interna (inner join) utilizando 'id_politica_base_riesgo'
-    3. Convierte todos los campos de texto a mayúsculas
-    4. Normaliza el campo 'factor_prov' dividiéndolo por 100
-    5. Filtra solo las filas donde tipo_matriz NO es 'MATRIZ NATURACO'
-    
     Returns:
         pandas.DataFrame: DataFrame filtrado que contiene solo los registros que NO son de tipo 'MATRIZ NATURACO'.
     """
-    # 1. Extraer los DataFrames base
-    df_inventario = get_inventario_matriz()
-    df_matrices   = get_matrices_base_riesgo()
-    
-    # 2. Unirlos por la clave foránea
-    df = pd.merge(
-        df_inventario,
-        df_matrices,
-        on="id_politica_base_riesgo",
-        how="inner"  # o 'left' / 'outer' según necesidad
-    )
-    
-    # 3. Pasar a mayúsculas todas las columnas de texto
-    text_cols = df.select_dtypes(include="object").columns
-    for c in text_cols:
-        df[c] = df[c].str.upper()
-    
-    # 4. Normalizar el factor provisional (de porcentaje a [0–1])
-    df["factor_prov"] = df["factor_prov"].astype(float) / 100.0
-    
-    # Filtramos aquellas filas cuyo tipo de matriz NO sea 'MATRIZ NATURACO'
-    mask = df["tipo_matriz"] != "MATRIZ NATURACO"
-    
-    return df[mask].reset_index(drop=True)
-
-
+    return split_matrices(df_matrices_merge())[1]
 
 
 def upload_dataframe_to_db(
-    df_final_combined: pd.DataFrame
-) -> None:
+    df_final_combined: pd.DataFrame,
+    mes: Optional[int] = None,
+    anio: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Sube el DataFrame 'df_final_combined' a la base de datos en la tabla 'InventarioBaseRiesgo'.
-    Se utiliza SQLAlchemy para establecer la conexión y el método to_sql de pandas para insertar
-    todos los registros (append). Se asume que la tabla ya existe y que los nombres de columnas en 
-    el DataFrame coinciden exactamente con los de la tabla en la base de datos.
+    Se asume que la tabla ya existe y que los nombres de columnas en el DataFrame coinciden
+    exactamente con los de la tabla en la base de datos.
     
-    La función realiza las siguientes operaciones:
-    1. Establece una conexión a la base de datos SQL Server utilizando variables de entorno
-    2. Crea un engine de SQLAlchemy con fast_executemany habilitado para mejorar el rendimiento
-    3. Inserta los datos del DataFrame en la tabla 'InventarioBaseRiesgo' en modo 'append'
-    4. Utiliza un tamaño de chunk de 1000 registros para optimizar las inserciones masivas
+    La función realiza las siguientes operaciones (ver bulk_load.bulk_upsert_inventory):
+    1. Usa el engine compartido de escritura, con fast_executemany habilitado para mejorar el rendimiento
+    2. Escribe las filas en la tabla de staging (DB_STAGING_TABLE) en lotes de DB_BULK_CHUNK_ROWS registros,
+       repartidas por hash de la llave en DB_WRITE_WORKERS particiones que se escriben en paralelo
+    3. En una sola transacción reemplaza en 'InventarioBaseRiesgo' las filas del mes con la misma
+       llave (mes_registro, año_registro, MATERIAL, LOTE, CENTRO), de modo que guardar dos veces
+       el mismo mes no duplica registros
     
     Args:
         df_final_combined (pd.DataFrame): DataFrame con las columnas y el orden requeridos.
             Los nombres de las columnas deben coincidir exactamente con los de la tabla en la base de datos.
+        mes (int, opcional): Mes de registro. Por defecto el mes actual.
+        anio (int, opcional): Año de registro. Por defecto el año actual.
     
     Returns:
-        None
+        Dict[str, Any]: Resumen de la carga (filas en staging, borradas, insertadas, tiempos y
+        filas por segundo de cada partición).
         
     Note:
         Esta función requiere que las variables de entorno DB_USER, DB_PASSWORD, DB_SERVER y DATABASE
         estén correctamente configuradas en el archivo .env.
         
     Raises:
-        Exception: Si ocurre un error durante la subida de datos a la base de datos.
+        Exception: Si ocurre un error durante la subida de datos a la base de datos; en ese
+        caso la tabla 'InventarioBaseRiesgo' queda sin cambios.
     """
-    connection_string = (
-            "mssql+pyodbc://{user}:{pwd}@{server}/{db}"
-            "?driver=ODBC+Driver+17+for+SQL+Server"
-        ).format(
-            user=os.getenv("DB_USER"),
-            pwd=os.getenv("DB_PASSWORD"),
-            server=os.getenv("DB_SERVER"),
-            db=os.getenv("DATABASE")
-        )
-    
-    # Crear el engine de SQLAlchemy con fast_executemany habilitado
-    engine = create_engine(connection_string, fast_executemany=True)
-    
     try:
-        # Insertar datos en la tabla InventarioBaseRiesgo. 
-        # if_exists='append' se utiliza para agregar los datos sin reemplazar la tabla.
-        df_final_combined.to_sql(
-            name='InventarioBaseRiesgo',
-            con=engine,
-            if_exists='append',
-            index=False,
-            chunksize=1000  # Tamaño del chunk para inserciones masivas
+        resumen = bulk_upsert_inventory(df_final_combined, mes=mes, anio=anio)
+        print(
+            f"Datos subidos correctamente a InventarioBaseRiesgo: {resumen['rows_inserted']} filas "
+            f"insertadas, {resumen['rows_deleted']} reemplazadas."
         )
-        print("Datos subidos correctamente a InventarioBaseRiesgo.")
+        return resumen
     except Exception as e:
         print("Error al subir el DataFrame a la base de datos:", e)
-    finally:
-        engine.dispose()
+        raise
 
 def export_dataframe_to_excel(
     df: pd.DataFrame,
@@ -347,7 +290,7 @@ def export_dataframe_to_excel(
 
     # Exportar a Excel
     try:
-        df.to_excel(file_path, index=False, sheet_name="Base de Riesgo")
+        to_export_frame(df).to_excel(file_path, index=False, sheet_name="Base de Riesgo")
         print(f"Archivo Excel creado exitosamente: {file_path}")
         return file_path
     except Exception as e:
@@ -361,7 +304,8 @@ def get_inventory_by_month_year(
     """
     Consulta la tabla InventarioBaseRiesgo filtrando por mes y año de registro.
     Obtiene todos los campos de la tabla y realiza conversiones de tipos de datos para
-    columnas numéricas y fechas.
+    columnas numéricas y fechas. Para leer solo algunas columnas o filtrar por marca, centro
+    o status, o para recorrer el mes por bloques, usar inventory_reader.iter_inventory.
     
     Args:
         mes (int): Número del mes a consultar (1-12).
@@ -373,108 +317,6 @@ def get_inventory_by_month_year(
     
     Note:
         Las columnas numéricas se convierten usando pd.to_numeric con errors='coerce'.
-        Las columnas de fechas se convierten usando pd.to_datetime con errors='coerce'.
+        Las columnas de fechas se convierten con parse_date_columns (pd.to_datetime con errors='coerce').
     """
-    usuario = os.getenv("DB_USER")
-    pwd     = os.getenv("DB_PASSWORD")
-    server  = os.getenv("DB_SERVER")
-    db      = os.getenv("DATABASE")
-    driver  = "ODBC Driver 17 for SQL Server"
-
-    engine = create_engine(
-        f"mssql+pyodbc://{usuario}:{pwd}@{server}/{db}?driver={driver}",
-        connect_args={"fast_executemany": True}
-    )
-    sql = text("""
-        SELECT
-            mes_registro,
-            año_registro,
-            [NEGOCIO INVENTARIOS],
-            [AÑO NATURAL/MES],
-            [TIPO MATERIAL INVENTARIO],
-            [MARCA DE QM],
-            [MATERIAL],
-            [DESCRIPCIÓN],
-            [UNIDAD MEDIDA],
-            [CENTRO],
-            [CODIGO ALMACEN CLIENTE],
-            [INDICADOR STOCK ESPEC.],
-            [NÚM.STOCK.ESP.],
-            [LOTE],
-            [CREADO EL],
-            [FECH. FABRICACIÓN],
-            [FECH, CADUCIDAD/FECH PREF. CONSUMO],
-            [FECHA BLOQUEADO],
-            [FECHA OBSOLETO],
-            [FECHA ENTRADA],
-            [RANGO OBSOLETO 2],
-            [RANGO COBERTURA],
-            [RANGO DE PERMANENCIA],
-            [RANGO BLOQUEADO],
-            [RANGO OBSOLETO],
-            [RANGO VENCIDOS],
-            [PRÓXIMO A VENCER],
-            [RANGO PRÓX.VENCER MM],
-            [RANGO PRÓXIMOS A VEN],
-            [TIPO DE MATERIAL (I)],
-            [COSTO UNITARIO REAL],
-            [INVENTARIO DISPONIBL],
-            [INVENTARIO NO DISPON],
-            [VALOR OBSOLETO],
-            [VALOR BLOQUEADO MM],
-            [VALOR TOTAL MM],
-            [PERMANENCIA],
-            [TIEMPO BLOQUEADO],
-            [MARCA CONCAT],
-            [SEGMENTACION],
-            [SUBSEGMENTACION],
-            [RANGO DE PERMANENCIA 2],
-            [STATUS CONS],
-            [VALOR DEF],
-            [RANGO OBSOLESCENCIA],
-            [RANGO VENCIDO 2],
-            [RANGO BLOQUEADO 2],
-            [RANGO CONS],
-            [FACTOR PROV],
-            [CLAS BASE RIESGO],
-            [BASE RIESGO],
-            [PROVISION]
-            FROM InventarioBaseRiesgo
-            WHERE mes_registro = :mes
-            AND año_registro = :anio
-    """)
-    with engine.connect() as conn:
-        df = pd.read_sql(sql, conn, params={"mes": mes, "anio": anio})
-
-    # Convertir columnas numéricas
-    columnas_numericas = [
-        "COSTO UNITARIO REAL",
-        "INVENTARIO DISPONIBL",
-        "INVENTARIO NO DISPON",
-        "VALOR OBSOLETO",
-        "VALOR BLOQUEADO MM",
-        "VALOR TOTAL MM",
-        "PERMANENCIA",
-        "FACTOR PROV",
-        "VALOR DEF",
-        "BASE RIESGO",
-        "PROVISION"
-    ]
-    for col in columnas_numericas:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    # Convertir columnas de fechas
-    columnas_fecha = [
-        "FECHA ENTRADA",
-        "CREADO EL",
-        "FECHA BLOQUEADO",
-        "FECHA OBSOLETO",
-        "FECH. FABRICACIÓN",
-        "FECH, CADUCIDAD/FECH PREF. CONSUMO"
-    ]
-    for col in columnas_fecha:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-
-    return df
\ No newline at end of file
+    return read_inventory(mes, anio)
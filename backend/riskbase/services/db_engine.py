@@ -0,0 +1,123 @@
+from typing import Any, Dict, Optional
+import threading
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRAN LOS ENGINES DE SQLALCHEMY COMPARTIDOS POR TODO EL PROCESO DEL API
+#! NO CREAR ENGINES POR CONSULTA: USAR get_read_engine() PARA LECTURAS Y get_write_engine() PARA CARGAS MASIVAS
+
+# Configuración del pool por variables de entorno
+DB_DRIVER = os.getenv("DB_DRIVER", "ODBC Driver 17 for SQL Server")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "2"))
+
+# Engines del proceso, creados en la primera solicitud
+_engines: Dict[str, Engine] = {}
+_lock = threading.Lock()
+
+
+def database_url() -> str:
+    """
+    URL de conexión a SQL Server tomada de las variables de entorno
+    (DB_USER, DB_PASSWORD, DB_SERVER, DATABASE y DB_DRIVER).
+    """
+    return (
+        f"mssql+pyodbc://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@{os.getenv('DB_SERVER')}/{os.getenv('DATABASE')}"
+        f"?driver={DB_DRIVER.replace(' ', '+')}"
+    )
+
+
+def _engine_options(nombre: str) -> Dict[str, Any]:
+    """
+    Opciones de create_engine de cada engine del registro.
+    """
+    opciones: Dict[str, Any] = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if nombre == "write":
+        # Las cargas masivas usan fast_executemany de pyodbc y pocas conexiones
+        opciones.update(pool_size=DB_WRITE_POOL_SIZE, max_overflow=0, fast_executemany=True)
+    return opciones
+
+
+def _get_engine(nombre: str) -> Engine:
+    """
+    Retorna el engine del registro con ese nombre, creándolo una sola vez.
+    """
+    engine = _engines.get(nombre)
+    if engine is not None:
+        return engine
+    with _lock:
+        if nombre not in _engines:
+            _engines[nombre] = create_engine(database_url(), **_engine_options(nombre))
+        return _engines[nombre]
+
+
+def get_read_engine() -> Engine:
+    """
+    Engine compartido para consultas y transacciones cortas (servicios, autenticación y rutas).
+
+    Returns:
+        Engine: Engine con pool de conexiones (pool_size, max_overflow, pre_ping y recycle configurables).
+    """
+    return _get_engine("read")
+
+
+def get_write_engine() -> Engine:
+    """
+    Engine compartido para cargas masivas (to_sql, executemany) con fast_executemany habilitado.
+
+    Returns:
+        Engine: Engine con un pool pequeño dedicado a escrituras.
+    """
+    return _get_engine("write")
+
+
+def engine_pool_stats() -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Estado de los pools de conexiones de los engines del registro.
+
+    Returns:
+        Dict: Por engine ('read' y 'write'), tamaño configurado, conexiones libres, en uso y
+        de desborde; None si el engine todavía no se ha creado.
+    """
+    estado: Dict[str, Optional[Dict[str, Any]]] = {}
+    for nombre in ("read", "write"):
+        engine = _engines.get(nombre)
+        if engine is None:
+            estado[nombre] = None
+            continue
+        pool = engine.pool
+        estado[nombre] = {
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "status": pool.status(),
+        }
+    return estado
+
+
+def dispose_engines() -> None:
+    """
+    Cierra las conexiones de todos los engines (por ejemplo al apagar el API).
+    Las siguientes solicitudes vuelven a crear los engines.
+    """
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
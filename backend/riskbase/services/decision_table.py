@@ -0,0 +1,377 @@
+import pandas as pd
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from string import Formatter
+import logging
+
+from .matrix_index import MatrixIndex, MATRIX_KEY_SEPARATOR, matrix_key
+from .schema import text_column
+
+# Configuración del logger para este módulo
+logger = logging.getLogger(__name__)
+
+#* AQUÍ SE ENCUENTRA LA TABLA DE DECISIÓN DEL RESTO DE MARCAS Y SU COMPILADOR
+#! PARA AÑADIR UN NUEVO TIPO DE MATRIZ BASTA CON AÑADIR UNA FILA A OTROS_MARCAS_DECISION_TABLE
+
+# Operadores admitidos en las condiciones de la tabla
+_OPERADORES = ("==", "!=", "in", "not in", "<=")
+
+
+class DecisionRule:
+    """
+    Una fila de la tabla de decisión.
+
+    Cada regla declara sus condiciones (todas deben cumplirse), la prioridad en la que se
+    evalúa y, o bien el tipo de matriz y la plantilla de la clave a buscar, o bien un
+    resultado fijo (factor, clasificación) que no consulta las matrices.
+
+    Las condiciones son tuplas (columna, operador, valor) con operador '==', '!=', 'in',
+    'not in' o '<='. Las de texto se comparan contra str(valor).strip(), igual que la lógica
+    fila a fila; '<=' compara el valor numérico original.
+
+    La plantilla de la clave usa los nombres de columna entre llaves y texto literal fuera
+    de ellas, por ejemplo "{SEGMENTACION}{STATUS CONS} {RANGO CONS}".
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        conditions: Sequence[Tuple[str, str, Any]],
+        tipo_matriz: Optional[str] = None,
+        key: Optional[str] = None,
+        result: Optional[Tuple[float, str]] = None,
+    ):
+        """
+        Inicializa y valida la regla.
+
+        Args:
+            name (str): Nombre descriptivo de la regla.
+            priority (int): Nivel de prioridad; los niveles menores se evalúan primero.
+            conditions (Sequence[Tuple[str, str, Any]]): Condiciones que deben cumplirse.
+            tipo_matriz (str, opcional): Tipo de matriz en el que se busca la clave.
+            key (str, opcional): Plantilla de la clave concatenada.
+            result (Tuple[float, str], opcional): Resultado fijo de la regla.
+
+        Raises:
+            ValueError: Si la regla no define exactamente uno de (tipo_matriz y key) o result,
+                        o si usa un operador no admitido.
+        """
+        if (result is None) == (tipo_matriz is None or key is None):
+            raise ValueError(
+                f"La regla '{name}' debe definir tipo_matriz y key, o un resultado fijo"
+            )
+        for columna, operador, _ in conditions:
+            if operador not in _OPERADORES:
+                raise ValueError(
+                    f"Operador '{operador}' no admitido en la regla '{name}' (columna '{columna}')"
+                )
+
+        self.name = name
+        self.priority = priority
+        self.conditions = list(conditions)
+        self.tipo_matriz = tipo_matriz
+        self.key = key
+        self.result = result
+        # Partes de la clave: (texto literal, columna o None)
+        self.key_parts: List[Tuple[str, Optional[str]]] = (
+            [(literal, columna) for literal, columna, _, _ in Formatter().parse(key)]
+            if key is not None
+            else []
+        )
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Columnas que lee la regla (condiciones y clave).
+        """
+        columnas = [columna for columna, _, _ in self.conditions]
+        columnas += [columna for _, columna in self.key_parts if columna]
+        return list(dict.fromkeys(columnas))
+
+    def __repr__(self) -> str:
+        destino = self.result if self.result is not None else f"{self.tipo_matriz}: {self.key}"
+        return f"DecisionRule({self.priority}, {self.name!r} → {destino})"
+
+
+# Resultado de las filas sin riesgo
+SIN_RIESGO: Tuple[float, str] = (0.0, "BAJO")
+
+# Tabla de decisión del resto de marcas: equivalente a calculate_otros_marcas_factor_and_class
+OTROS_MARCAS_DECISION_TABLE: List[DecisionRule] = [
+    # Prioridad 0: filas sin riesgo
+    DecisionRule(
+        "Bloqueado por poco tiempo",
+        0,
+        [
+            ("SEGMENTACION", "in", ("DUEÑOS DE CANAL", "MARCAS PROPIAS", "EXPERTOS NO LOCALES")),
+            ("STATUS CONS", "==", "BLOQUEADO"),
+            ("TIEMPO BLOQUEADO", "<=", 30),
+        ],
+        result=SIN_RIESGO,
+    ),
+    DecisionRule("Indicador K", 0, [("INDICADOR STOCK ESPEC.", "==", "K")], result=SIN_RIESGO),
+    DecisionRule(
+        "Granel con poca permanencia",
+        0,
+        [
+            ("STATUS CONS", "in", ("DISPONIBLE", "PAV")),
+            ("TIPO DE MATERIAL (I)", "in", ("GRANEL", "GRANEL FAB A TERCERO")),
+            ("PERMANENCIA", "<=", 30),
+        ],
+        result=SIN_RIESGO,
+    ),
+    DecisionRule("Marca OTRAS", 0, [("MARCA DE QM", "==", "OTRAS")], result=SIN_RIESGO),
+    DecisionRule(
+        "Disponible sin cobertura",
+        0,
+        [("STATUS CONS", "==", "DISPONIBLE"), ("RANGO COBERTURA", "==", "")],
+        result=SIN_RIESGO,
+    ),
+    # Prioridad 1: indicador W
+    DecisionRule(
+        "W vencido o PAV",
+        1,
+        [("INDICADOR STOCK ESPEC.", "==", "W"), ("STATUS CONS", "in", ("VENCIDO", "PAV"))],
+        tipo_matriz="PVA Y VENCIDOS",
+        key="{SEGMENTACION}{STATUS CONS}{RANGO DE PERMANENCIA 2}",
+    ),
+    DecisionRule(
+        "W disponible",
+        1,
+        [("INDICADOR STOCK ESPEC.", "==", "W"), ("STATUS CONS", "==", "DISPONIBLE")],
+        tipo_matriz="MATRIZ DISPONIBLES VMI",
+        key="{SEGMENTACION}{RANGO COBERTURA}{RANGO DE PERMANENCIA 2}",
+    ),
+    DecisionRule(
+        "W obsoleto o bloqueado",
+        1,
+        [
+            ("INDICADOR STOCK ESPEC.", "==", "W"),
+            ("STATUS CONS", "not in", ("VENCIDO", "PAV", "DISPONIBLE")),
+        ],
+        tipo_matriz="OBSOLETO",
+        key="{SEGMENTACION}{STATUS CONS}{RANGO CONS}",
+    ),
+    # Prioridad 1: indicador SIN ASIGNAR u O
+    DecisionRule(
+        "PAV 1 a 3 meses",
+        1,
+        [
+            ("INDICADOR STOCK ESPEC.", "in", ("SIN ASIGNAR", "O")),
+            ("STATUS CONS", "==", "PAV"),
+            ("RANGO PRÓX.VENCER MM", "==", "1.PAV 3 MESES"),
+        ],
+        tipo_matriz="PVA 1 A 3 MESES",
+        key="{SEGMENTACION}{SUBSEGMENTACION}{RANGO COBERTURA}{RANGO DE PERMANENCIA 2}",
+    ),
+    DecisionRule(
+        "PAV 4 a 6 meses",
+        1,
+        [
+            ("INDICADOR STOCK ESPEC.", "in", ("SIN ASIGNAR", "O")),
+            ("STATUS CONS", "==", "PAV"),
+            ("RANGO PRÓX.VENCER MM", "==", "2.PAV 4 A 6 MESES"),
+        ],
+        tipo_matriz="PVA 4 A 6 MESES",
+        key="{SEGMENTACION}{SUBSEGMENTACION}{RANGO COBERTURA}{RANGO DE PERMANENCIA 2}",
+    ),
+    DecisionRule(
+        "Disponible",
+        1,
+        [
+            ("INDICADOR STOCK ESPEC.", "in", ("SIN ASIGNAR", "O")),
+            ("STATUS CONS", "==", "DISPONIBLE"),
+        ],
+        tipo_matriz="DISPONIBLE",
+        key="{SEGMENTACION}{SUBSEGMENTACION}{RANGO COBERTURA}{RANGO DE PERMANENCIA 2}",
+    ),
+    DecisionRule(
+        "Obsoleto, bloqueado o vencido",
+        1,
+        [
+            ("INDICADOR STOCK ESPEC.", "in", ("SIN ASIGNAR", "O")),
+            ("STATUS CONS", "in", ("OBSOLETO", "VENCIDO", "BLOQUEADO")),
+        ],
+        tipo_matriz="OBSOLETOS, BLOQUEADOS, VENCIDOS",
+        key="{SEGMENTACION}{SUBSEGMENTACION}{STATUS CONS} {RANGO CONS}",
+    ),
+    # Prioridad 2: los disponibles sin coincidencia se buscan en la matriz de obsoletos (note el espacio)
+    DecisionRule(
+        "Disponible sin coincidencia",
+        2,
+        [
+            ("INDICADOR STOCK ESPEC.", "in", ("SIN ASIGNAR", "O")),
+            ("STATUS CONS", "==", "DISPONIBLE"),
+        ],
+        tipo_matriz="OBSOLETOS, BLOQUEADOS, VENCIDOS",
+        key="{SEGMENTACION}{SUBSEGMENTACION}{STATUS CONS} {RANGO CONS}",
+    ),
+]
+
+
+class DecisionPlan:
+    """
+    Plan ejecutable compilado a partir de una tabla de decisión y un MatrixIndex.
+
+    Las reglas se agrupan por prioridad. En cada nivel, cada fila pendiente toma la primera
+    regla del nivel cuyas condiciones cumple; las reglas con resultado fijo se asignan
+    directamente y el resto de filas del nivel se resuelven con una sola búsqueda de
+    (tipo_matriz, clave) contra el índice compilado. Las filas que no encuentran su clave
+    pasan al siguiente nivel; las que no se resuelven en ningún nivel quedan sin riesgo.
+    """
+
+    def __init__(self, rules: Sequence[DecisionRule], matrix_index: MatrixIndex):
+        """
+        Compila la tabla de decisión contra las matrices.
+
+        Args:
+            rules (Sequence[DecisionRule]): Tabla de decisión.
+            matrix_index (MatrixIndex): Índice compilado de las matrices.
+        """
+        prioridades = sorted({regla.priority for regla in rules})
+        self.levels: List[Tuple[int, List[DecisionRule]]] = [
+            (prioridad, [regla for regla in rules if regla.priority == prioridad])
+            for prioridad in prioridades
+        ]
+        self.columns: List[str] = list(
+            dict.fromkeys(columna for regla in rules for columna in regla.columns)
+        )
+
+        entries = matrix_index.entries
+        claves = matrix_key(entries["tipo_matriz"].astype(str), entries["concatenado"])
+        self._indice = pd.Index(claves.to_numpy(dtype=object))
+        self._factores = entries["factor_prov"].to_numpy(dtype=float)
+        self._clasificaciones = entries["clasificacion"].to_numpy(dtype=object)
+
+        tipos = set(matrix_index.tipos)
+        faltantes = {r.tipo_matriz for r in rules if r.tipo_matriz and r.tipo_matriz not in tipos}
+        if faltantes:
+            logger.warning(
+                f"[decision-table] Tipos de matriz sin filas en las matrices: {sorted(faltantes)}"
+            )
+
+    def _assign(self, df: pd.DataFrame) -> List[Tuple[List[Tuple[np.ndarray, Tuple[float, str]]], np.ndarray]]:
+        """
+        Asigna a cada fila, por nivel de prioridad, la primera regla cuyas condiciones cumple.
+
+        La asignación no depende de las matrices: por nivel devuelve las filas con resultado
+        fijo y la llave (tipo_matriz + clave) que buscaría cada fila, o None. Las filas con
+        resultado fijo ya no participan en los niveles siguientes.
+        """
+        n = len(df)
+        textos: Dict[str, np.ndarray] = {}
+
+        def _texto(columna: str) -> np.ndarray:
+            if columna not in textos:
+                textos[columna] = text_column(df, columna).to_numpy(dtype=object)
+            return textos[columna]
+
+        def _cumple(regla: DecisionRule) -> np.ndarray:
+            mascara = np.ones(n, dtype=bool)
+            for columna, operador, valor in regla.conditions:
+                if operador == "<=":
+                    mascara &= (df[columna] <= valor).to_numpy(dtype=bool)
+                elif operador == "==":
+                    mascara &= _texto(columna) == valor
+                elif operador == "!=":
+                    mascara &= _texto(columna) != valor
+                elif operador == "in":
+                    mascara &= np.isin(_texto(columna), list(valor))
+                else:
+                    mascara &= ~np.isin(_texto(columna), list(valor))
+            return mascara
+
+        fijadas = np.zeros(n, dtype=bool)
+        niveles = []
+        for _, reglas in self.levels:
+            asignadas = fijadas.copy()
+            claves = np.full(n, None, dtype=object)
+            fijos = []
+            for regla in reglas:
+                filas = ~asignadas & _cumple(regla)
+                if not filas.any():
+                    continue
+                asignadas |= filas
+                if regla.result is not None:
+                    fijos.append((filas, regla.result))
+                    continue
+                clave = np.full(filas.sum(), regla.tipo_matriz + MATRIX_KEY_SEPARATOR, dtype=object)
+                for literal, columna in regla.key_parts:
+                    if literal:
+                        clave = clave + literal
+                    if columna:
+                        clave = clave + _texto(columna)[filas]
+                claves[filas] = clave
+            for filas, _ in fijos:
+                fijadas |= filas
+            niveles.append((fijos, claves))
+        return niveles
+
+    def candidate_keys(self, df: pd.DataFrame) -> List[np.ndarray]:
+        """
+        Llaves (tipo_matriz + clave) que cada fila puede llegar a buscar, una por nivel.
+
+        Sirve para saber qué filas se ven afectadas cuando cambia una fila de las matrices.
+
+        Args:
+            df: DataFrame con las columnas que leen las reglas
+
+        Returns:
+            List[np.ndarray]: Un arreglo por nivel de prioridad con la llave de cada fila o None.
+        """
+        return [claves for _, claves in self._assign(df)]
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Resuelve 'FACTOR PROV' y 'CLAS BASE RIESGO' para todas las filas.
+
+        Args:
+            df: DataFrame con las columnas que leen las reglas (ver DecisionPlan.columns)
+
+        Returns:
+            pd.DataFrame: DataFrame con las columnas 'FACTOR PROV' y 'CLAS BASE RIESGO', alineado con df.
+        """
+        n = len(df)
+        factores = np.full(n, SIN_RIESGO[0], dtype=float)
+        clasificaciones = np.full(n, SIN_RIESGO[1], dtype=object)
+        resueltas = np.zeros(n, dtype=bool)
+
+        for fijos, claves in self._assign(df):
+            for filas, (factor, clasificacion) in fijos:
+                aplicar = filas & ~resueltas
+                factores[aplicar] = factor
+                clasificaciones[aplicar] = clasificacion
+                resueltas |= aplicar
+
+            # Una sola búsqueda para todas las filas del nivel que consultan las matrices
+            consultar = pd.notna(claves) & ~resueltas
+            if not consultar.any():
+                continue
+            posiciones = self._indice.get_indexer(claves[consultar])
+            encontradas = posiciones >= 0
+            filas_encontradas = np.flatnonzero(consultar)[encontradas]
+            factores[filas_encontradas] = self._factores[posiciones[encontradas]]
+            clasificaciones[filas_encontradas] = self._clasificaciones[posiciones[encontradas]]
+            resueltas[filas_encontradas] = True
+
+        return pd.DataFrame(
+            {"FACTOR PROV": factores, "CLAS BASE RIESGO": pd.Categorical(clasificaciones)},
+            index=df.index,
+        )
+
+
+def compile_decision_plan(
+    matrix_index: MatrixIndex, rules: Optional[Sequence[DecisionRule]] = None
+) -> DecisionPlan:
+    """
+    Compila una tabla de decisión (por defecto OTROS_MARCAS_DECISION_TABLE) contra las matrices.
+
+    Args:
+        matrix_index: Índice compilado de df_matrices_otros_tipos (ver compile_matrix_index)
+        rules: Tabla de decisión a compilar
+
+    Returns:
+        DecisionPlan: Plan listo para evaluar DataFrames.
+    """
+    return DecisionPlan(OTROS_MARCAS_DECISION_TABLE if rules is None else rules, matrix_index)
@@ -0,0 +1,273 @@
+import pandas as pd
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import os
+from openpyxl import Workbook
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+
+from .schema import parse_date_columns
+from .db_engine import get_read_engine
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA LA LECTURA POR BLOQUES DE InventarioBaseRiesgo
+#! CADA CONSULTA TRAE SOLO LAS COLUMNAS Y FILAS QUE USA, EN BLOQUES DE TAMAÑO FIJO (MEMORIA CONSTANTE)
+
+# Configuración por variables de entorno
+INVENTORY_CHUNK_ROWS = int(os.getenv("INVENTORY_CHUNK_ROWS", "50000"))
+
+# Columnas que se pueden leer de InventarioBaseRiesgo, en el orden de la tabla
+INVENTORY_COLUMNS: List[str] = [
+    "mes_registro",
+    "año_registro",
+    "NEGOCIO INVENTARIOS",
+    "AÑO NATURAL/MES",
+    "TIPO MATERIAL INVENTARIO",
+    "MARCA DE QM",
+    "MATERIAL",
+    "DESCRIPCIÓN",
+    "UNIDAD MEDIDA",
+    "CENTRO",
+    "CODIGO ALMACEN CLIENTE",
+    "INDICADOR STOCK ESPEC.",
+    "NÚM.STOCK.ESP.",
+    "LOTE",
+    "CREADO EL",
+    "FECH. FABRICACIÓN",
+    "FECH, CADUCIDAD/FECH PREF. CONSUMO",
+    "FECHA BLOQUEADO",
+    "FECHA OBSOLETO",
+    "FECHA ENTRADA",
+    "RANGO OBSOLETO 2",
+    "RANGO COBERTURA",
+    "RANGO DE PERMANENCIA",
+    "RANGO BLOQUEADO",
+    "RANGO OBSOLETO",
+    "RANGO VENCIDOS",
+    "PRÓXIMO A VENCER",
+    "RANGO PRÓX.VENCER MM",
+    "RANGO PRÓXIMOS A VEN",
+    "TIPO DE MATERIAL (I)",
+    "COSTO UNITARIO REAL",
+    "INVENTARIO DISPONIBL",
+    "INVENTARIO NO DISPON",
+    "VALOR OBSOLETO",
+    "VALOR BLOQUEADO MM",
+    "VALOR TOTAL MM",
+    "PERMANENCIA",
+    "TIEMPO BLOQUEADO",
+    "MARCA CONCAT",
+    "SEGMENTACION",
+    "SUBSEGMENTACION",
+    "RANGO DE PERMANENCIA 2",
+    "STATUS CONS",
+    "VALOR DEF",
+    "RANGO OBSOLESCENCIA",
+    "RANGO VENCIDO 2",
+    "RANGO BLOQUEADO 2",
+    "RANGO CONS",
+    "FACTOR PROV",
+    "CLAS BASE RIESGO",
+    "BASE RIESGO",
+    "PROVISION",
+]
+
+# Columnas que se convierten a número con pd.to_numeric
+INVENTORY_NUMERIC_COLUMNS: List[str] = [
+    "COSTO UNITARIO REAL",
+    "INVENTARIO DISPONIBL",
+    "INVENTARIO NO DISPON",
+    "VALOR OBSOLETO",
+    "VALOR BLOQUEADO MM",
+    "VALOR TOTAL MM",
+    "PERMANENCIA",
+    "FACTOR PROV",
+    "VALOR DEF",
+    "BASE RIESGO",
+    "PROVISION",
+]
+
+# Columnas por las que se puede filtrar
+INVENTORY_FILTER_COLUMNS: List[str] = ["MARCA DE QM", "CENTRO", "STATUS CONS"]
+
+
+def build_inventory_query(
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+    engine: Optional[Engine] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Construye la consulta de un mes de InventarioBaseRiesgo con las columnas y filtros pedidos.
+
+    Solo se aceptan columnas de INVENTORY_COLUMNS y filtros de INVENTORY_FILTER_COLUMNS, de
+    modo que ningún nombre recibido del cliente llega al SQL sin validar; los valores de
+    los filtros se envían como parámetros.
+
+    Args:
+        columns: Columnas a leer. Por defecto todas (INVENTORY_COLUMNS).
+        filters: Filtros por columna; cada valor es un texto o una lista de textos (IN).
+        engine: Engine cuyo dialecto se usa para citar los nombres. Por defecto el de lectura.
+
+    Returns:
+        Tuple[TextClause, Dict[str, Any]]: Consulta y sus parámetros (sin mes ni año).
+
+    Raises:
+        ValueError: Si se pide una columna o un filtro no permitido, o si no hay columnas.
+    """
+    columnas = list(INVENTORY_COLUMNS if columns is None else columns)
+    desconocidas = [c for c in columnas if c not in INVENTORY_COLUMNS]
+    if desconocidas:
+        raise ValueError(f"Columnas no permitidas en InventarioBaseRiesgo: {desconocidas}")
+    if not columnas:
+        raise ValueError("Se debe indicar al menos una columna")
+    filtros = {c: v for c, v in (filters or {}).items() if v is not None}
+    no_permitidos = [c for c in filtros if c not in INVENTORY_FILTER_COLUMNS]
+    if no_permitidos:
+        raise ValueError(
+            f"Filtros no permitidos: {no_permitidos} (solo {INVENTORY_FILTER_COLUMNS})"
+        )
+
+    quote = (engine or get_read_engine()).dialect.identifier_preparer.quote
+    condiciones = [f"{quote('mes_registro')} = :mes", f"{quote('año_registro')} = :anio"]
+    parametros: Dict[str, Any] = {}
+    expandidos = []
+    for numero, (columna, valor) in enumerate(filtros.items()):
+        nombre = f"filtro_{numero}"
+        if isinstance(valor, str):
+            condiciones.append(f"{quote(columna)} = :{nombre}")
+            parametros[nombre] = valor
+        else:
+            condiciones.append(f"{quote(columna)} IN :{nombre}")
+            parametros[nombre] = list(valor)
+            expandidos.append(bindparam(nombre, expanding=True))
+
+    sql = text(
+        f"SELECT {', '.join(quote(c) for c in columnas)} "
+        f"FROM {quote('InventarioBaseRiesgo')} "
+        f"WHERE {' AND '.join(condiciones)}"
+    ).bindparams(*expandidos)
+    return sql, parametros
+
+
+def type_inventory_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte a número y a fecha las columnas de un bloque leído de InventarioBaseRiesgo.
+
+    Args:
+        df: Bloque leído (se modifica en el lugar)
+
+    Returns:
+        pd.DataFrame: El mismo bloque con los tipos convertidos.
+    """
+    for col in INVENTORY_NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # Convertir columnas de fechas (las que el driver ya entrega como datetime64 no se recorren)
+    parse_date_columns(df)
+    return df
+
+
+def iter_inventory(
+    mes: int,
+    anio: int,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+    chunksize: Optional[int] = INVENTORY_CHUNK_ROWS,
+    engine: Optional[Engine] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lee un mes de InventarioBaseRiesgo en bloques tipados.
+
+    Las filas se traen del servidor a medida que se consumen los bloques, por lo que la
+    memoria depende de chunksize y de las columnas pedidas, no del tamaño del mes. La
+    conexión se devuelve al pool al terminar de recorrer el iterador (o al cerrarlo).
+
+    Args:
+        mes: Mes de registro (1-12)
+        anio: Año de registro
+        columns: Columnas a leer (ver INVENTORY_COLUMNS). Por defecto todas.
+        filters: Filtros por MARCA DE QM, CENTRO o STATUS CONS; cada valor es un texto o una lista
+        chunksize: Filas por bloque. None lee el mes en un solo bloque.
+        engine: Engine a usar. Por defecto el engine compartido de lectura.
+
+    Returns:
+        Iterator[pd.DataFrame]: Bloques con las columnas numéricas y de fecha convertidas.
+
+    Raises:
+        ValueError: Si se pide una columna o un filtro no permitido.
+    """
+    # La consulta se valida aquí y no al recorrer el iterador, para que el error llegue de inmediato
+    engine = engine or get_read_engine()
+    sql, parametros = build_inventory_query(columns, filters, engine)
+    parametros.update(mes=mes, anio=anio)
+    return _stream_inventory(engine, sql, parametros, chunksize)
+
+
+def _stream_inventory(
+    engine: Engine, sql: Any, parametros: Dict[str, Any], chunksize: Optional[int]
+) -> Iterator[pd.DataFrame]:
+    """
+    Ejecuta la consulta y entrega sus bloques tipados.
+    """
+    with engine.connect().execution_options(stream_results=True) as conn:
+        if chunksize is None:
+            yield type_inventory_chunk(pd.read_sql(sql, conn, params=parametros))
+            return
+        for chunk in pd.read_sql(sql, conn, params=parametros, chunksize=chunksize):
+            yield type_inventory_chunk(chunk)
+
+
+def read_inventory(
+    mes: int,
+    anio: int,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None,
+    engine: Optional[Engine] = None,
+) -> pd.DataFrame:
+    """
+    Lee un mes de InventarioBaseRiesgo completo en un DataFrame (ver iter_inventory).
+
+    Returns:
+        pd.DataFrame: Filas del mes con las columnas y filtros pedidos.
+    """
+    bloques = iter_inventory(mes, anio, columns, filters, chunksize=None, engine=engine)
+    try:
+        return next(bloques)
+    finally:
+        bloques.close()
+
+
+def write_excel_chunks(
+    chunks: Iterable[pd.DataFrame], path: str, sheet_name: str = "Sheet1"
+) -> Tuple[int, List[str]]:
+    """
+    Escribe bloques en un archivo Excel sin juntarlos en memoria (openpyxl en modo write_only).
+
+    Los valores nulos (NaN, NaT) quedan como celdas vacías, igual que con DataFrame.to_excel.
+
+    Args:
+        chunks: Bloques con las mismas columnas (por ejemplo los de iter_inventory)
+        path: Ruta del archivo
+        sheet_name: Nombre de la hoja
+
+    Returns:
+        Tuple[int, List[str]]: Filas escritas y columnas.
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(sheet_name)
+    columnas: Optional[List[str]] = None
+    filas = 0
+    for chunk in chunks:
+        if columnas is None:
+            columnas = [str(c) for c in chunk.columns]
+            hoja.append(columnas)
+        valores = chunk.astype(object).where(chunk.notna(), None)
+        for fila in valores.itertuples(index=False, name=None):
+            hoja.append(fila)
+        filas += len(chunk)
+    if columnas is None:
+        columnas = []
+    libro.save(path)
+    return filas, columnas
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Optional, Tuple
+import logging
+
+# Configuración del logger para este módulo
+logger = logging.getLogger(__name__)
+
+#* AQUÍ SE ENCUENTRA EL ÍNDICE COMPILADO DE LAS MATRICES DE BASE RIESGO
+#! LAS MATRICES SE COMPILAN UNA SOLA VEZ POR PROCESO; LAS REGLAS SOLO HACEN BÚSQUEDAS SOBRE EL ÍNDICE
+
+# Separador entre tipo de matriz y clave concatenada cuando se combinan en una sola llave
+MATRIX_KEY_SEPARATOR = "\x1f"
+
+
+def matrix_key(tipo_matriz, concatenado):
+    """
+    Combina tipo de matriz y clave concatenada en una sola llave (escalares o columnas de texto).
+    """
+    return tipo_matriz + MATRIX_KEY_SEPARATOR + concatenado
+
+
+
+class MatrixIndex:
+    """
+    Índice compilado (tipo_matriz, concatenado) → (factor_prov, clasificacion).
+
+    Se construye una sola vez a partir del DataFrame de matrices con compile_matrix_index
+    y permite resolver claves en tiempo constante (get) o una columna completa de claves
+    con una sola búsqueda vectorizada por tipo de matriz (lookup).
+    """
+
+    def __init__(self, entries: pd.DataFrame, duplicates: pd.DataFrame):
+        """
+        Inicializa el índice a partir de las entradas ya depuradas.
+
+        Args:
+            entries (pd.DataFrame): Entradas únicas con las columnas 'tipo_matriz', 'concatenado',
+                                    'factor_prov' y 'clasificacion'.
+            duplicates (pd.DataFrame): Filas de la matriz original cuya clave estaba repetida.
+        """
+        self.entries = entries.reset_index(drop=True)
+        self.duplicates = duplicates.reset_index(drop=True)
+        self._por_tipo: Dict[str, Tuple[pd.Index, np.ndarray, np.ndarray]] = {}
+        self._mapa: Optional[Dict[Tuple[str, str], Tuple[float, str]]] = None
+
+        for tipo, grupo in self.entries.groupby("tipo_matriz", sort=False):
+            self._por_tipo[tipo] = (
+                pd.Index(grupo["concatenado"].to_numpy(dtype=object)),
+                grupo["factor_prov"].to_numpy(dtype=float),
+                grupo["clasificacion"].to_numpy(dtype=object),
+            )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._diccionario()
+
+    def _diccionario(self) -> Dict[Tuple[str, str], Tuple[float, str]]:
+        """
+        Diccionario (tipo_matriz, concatenado) → (factor_prov, clasificacion) para las búsquedas
+        de una sola clave. Se construye la primera vez que se usa: las búsquedas vectorizadas
+        (lookup) no lo necesitan y así recompilar el índice tras editar las matrices es más barato.
+        """
+        if self._mapa is None:
+            self._mapa = {}
+            for tipo, (indice, factores, clasificaciones) in self._por_tipo.items():
+                for clave, factor, clasificacion in zip(indice, factores, clasificaciones):
+                    self._mapa[(tipo, clave)] = (float(factor), clasificacion)
+        return self._mapa
+
+    @property
+    def tipos(self):
+        """
+        Tipos de matriz presentes en el índice.
+        """
+        return list(self._por_tipo.keys())
+
+    def get(
+        self, tipo_matriz: str, concatenado: str, default: Tuple[float, str] = (0.0, "BAJO")
+    ) -> Tuple[float, str]:
+        """
+        Busca una clave en tiempo constante.
+
+        Args:
+            tipo_matriz (str): Tipo de matriz a consultar.
+            concatenado (str): Clave concatenada construida a partir de la fila.
+            default (Tuple[float, str]): Valor a retornar si la clave no existe.
+
+        Returns:
+            Tuple[float, str]: Factor de provisión y clasificación de la clave.
+        """
+        return self._diccionario().get((tipo_matriz, concatenado), default)
+
+    def lookup(
+        self, tipo_matriz: str, claves: pd.Series
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Resuelve una columna completa de claves contra un tipo de matriz en una sola búsqueda.
+
+        Args:
+            tipo_matriz (str): Tipo de matriz a consultar.
+            claves (pd.Series): Claves concatenadas, una por fila.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Factores, clasificaciones y máscara de
+            claves encontradas. Las filas no encontradas tienen factor 0.0 y clasificación 'BAJO'.
+        """
+        n = len(claves)
+        factores = np.zeros(n, dtype=float)
+        clasificaciones = np.full(n, "BAJO", dtype=object)
+        if tipo_matriz not in self._por_tipo or n == 0:
+            return factores, clasificaciones, np.zeros(n, dtype=bool)
+
+        indice, factores_tipo, clasificaciones_tipo = self._por_tipo[tipo_matriz]
+        posiciones = indice.get_indexer(claves.to_numpy(dtype=object))
+        encontrados = posiciones >= 0
+        factores[encontrados] = factores_tipo[posiciones[encontrados]]
+        clasificaciones[encontrados] = clasificaciones_tipo[posiciones[encontrados]]
+        return factores, clasificaciones, encontrados
+
+
+def compile_matrix_index(
+    df_matrices: pd.DataFrame, keep: str = "first", strict: bool = False
+) -> MatrixIndex:
+    """
+    Compila el DataFrame de matrices en un MatrixIndex.
+
+    Normaliza la columna 'concatenado' (strip) una sola vez y detecta las claves
+    (tipo_matriz, concatenado) repetidas. En lugar de tomar en silencio la primera
+    coincidencia, los duplicados se reportan en el log y quedan disponibles en
+    MatrixIndex.duplicates.
+
+    Args:
+        df_matrices (pd.DataFrame): DataFrame con las columnas 'tipo_matriz', 'concatenado',
+                                    'factor_prov' y 'clasificacion' (por ejemplo el
+                                    resultado de df_matrices_otros_tipos()).
+        keep (str): Qué fila conservar ante claves repetidas: 'first' (como el antiguo
+                    iloc[0]) o 'last' (como un diccionario construido fila a fila).
+        strict (bool): Si es True, las claves repetidas generan un ValueError.
+
+    Returns:
+        MatrixIndex: Índice compilado listo para hacer búsquedas.
+
+    Raises:
+        ValueError: Si strict es True y hay claves repetidas.
+    """
+    entries = df_matrices[["tipo_matriz", "concatenado", "factor_prov", "clasificacion"]].copy()
+    entries = entries[entries["concatenado"].notna()]
+    entries["concatenado"] = entries["concatenado"].astype(str).str.strip()
+
+    repetidas = entries.duplicated(subset=["tipo_matriz", "concatenado"], keep=False)
+    duplicates = entries[repetidas]
+    if not duplicates.empty:
+        claves = (
+            duplicates[["tipo_matriz", "concatenado"]]
+            .drop_duplicates()
+            .itertuples(index=False, name=None)
+        )
+        claves = list(claves)
+        mensaje = (
+            f"Se encontraron {len(claves)} claves repetidas en las matrices "
+            f"(se conserva la fila '{keep}'): {claves[:10]}"
+        )
+        if strict:
+            raise ValueError(mensaje)
+        logger.warning(f"[matrix-index] {mensaje}")
+
+    entries = entries.drop_duplicates(subset=["tipo_matriz", "concatenado"], keep=keep)
+    return MatrixIndex(entries, duplicates)
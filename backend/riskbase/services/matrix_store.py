@@ -0,0 +1,168 @@
+import pandas as pd
+from typing import Any, Callable, Dict, Optional
+from datetime import datetime
+import threading
+import time
+
+from .database_operations import df_matrices_merge_raw, normalize_matrices, split_matrices
+
+#* AQUÍ SE GUARDAN EN MEMORIA LAS MATRICES DE LA POLÍTICA (InventarioMatriz + MatrizBaseRiesgo)
+#! SE LEEN UNA SOLA VEZ Y SE INVALIDAN AL CONFIRMARSE /risk/matrices-save; CADA PROCESO DEL BACKEND TIENE SU COPIA
+
+
+class MatrixStore:
+    """
+    Copia en memoria de las matrices de la política de la base de riesgo, con número de versión.
+
+    Las dos tablas se leen y se unifican una sola vez; a partir de esa copia se sirven la
+    vista sin modificar (/risk/matrices-view) y las normalizadas que usa /risk/process
+    (textos en mayúsculas y factor_prov en [0-1], separadas en AVON/NATURA y resto de marcas).
+    invalidate() descarta la copia e incrementa la versión; la siguiente lectura vuelve a
+    consultar la base de datos.
+
+    Los métodos retornan copias, de modo que quien las modifique no altera la copia guardada.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], pd.DataFrame]] = None):
+        """
+        Inicializa el almacén vacío; las matrices se leen en la primera consulta.
+
+        Args:
+            loader (Callable, opcional): Función que retorna las matrices unificadas sin
+                modificar. Por defecto df_matrices_merge_raw (base de datos).
+        """
+        self.loader = loader or df_matrices_merge_raw
+        # _lock protege el estado; _load_lock hace que solicitudes simultáneas esperen una sola lectura
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._version = 0
+        self._frames: Optional[Dict[str, pd.DataFrame]] = None
+        self._loaded_at: Optional[datetime] = None
+        self._stats = {"loads": 0, "hits": 0, "invalidations": 0, "load_seconds": None}
+
+    @property
+    def version(self) -> int:
+        """
+        Versión actual de las matrices; aumenta con cada invalidate().
+        """
+        with self._lock:
+            return self._version
+
+    def _get(self) -> Dict[str, pd.DataFrame]:
+        """
+        Retorna las vistas guardadas, leyéndolas de la base de datos si no están en memoria.
+        """
+        with self._lock:
+            if self._frames is not None:
+                self._stats["hits"] += 1
+                return self._frames
+
+        with self._load_lock:
+            with self._lock:
+                if self._frames is not None:
+                    self._stats["hits"] += 1
+                    return self._frames
+                version = self._version
+
+            t0 = time.perf_counter()
+            raw = self.loader()
+            normalized = normalize_matrices(raw)
+            avon_natura, otros_tipos = split_matrices(normalized)
+            frames = {
+                "raw": raw,
+                "normalized": normalized,
+                "avon_natura": avon_natura,
+                "otros_tipos": otros_tipos,
+            }
+
+            with self._lock:
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] = round(time.perf_counter() - t0, 3)
+                # execute_query retorna un DataFrame vacío si la consulta falla: no se guarda.
+                # Tampoco se guarda si se invalidó durante la lectura, porque podría ser anterior al cambio.
+                if raw.empty or version != self._version:
+                    print(f"[matrix-store] Matrices leídas sin guardar en memoria ({len(raw)} filas)")
+                else:
+                    self._frames = frames
+                    self._loaded_at = datetime.now()
+            return frames
+
+    def raw(self) -> pd.DataFrame:
+        """
+        Matrices unificadas tal como están en la base de datos (igual que df_matrices_merge_raw).
+        """
+        return self._get()["raw"].copy()
+
+    def normalized(self) -> pd.DataFrame:
+        """
+        Matrices unificadas y normalizadas (igual que df_matrices_merge).
+        """
+        return self._get()["normalized"].copy()
+
+    def avon_natura(self) -> pd.DataFrame:
+        """
+        Matrices normalizadas de tipo 'MATRIZ NATURACO' (igual que df_matrices_avon_natura).
+        """
+        return self._get()["avon_natura"].copy()
+
+    def otros_tipos(self) -> pd.DataFrame:
+        """
+        Matrices normalizadas del resto de tipos (igual que df_matrices_otros_tipos).
+        """
+        return self._get()["otros_tipos"].copy()
+
+    def invalidate(self) -> int:
+        """
+        Descarta las matrices en memoria; la siguiente consulta las vuelve a leer.
+
+        Returns:
+            int: La nueva versión.
+        """
+        with self._lock:
+            self._version += 1
+            self._frames = None
+            self._loaded_at = None
+            self._stats["invalidations"] += 1
+            return self._version
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estado del almacén.
+
+        Returns:
+            Dict[str, Any]: Versión, si las matrices están en memoria, cuándo se leyeron, filas y
+            contadores de lecturas, aciertos e invalidaciones.
+        """
+        with self._lock:
+            return {
+                "version": self._version,
+                "cached": self._frames is not None,
+                "loaded_at": self._loaded_at.isoformat(timespec="seconds") if self._loaded_at else None,
+                "rows": None if self._frames is None else int(len(self._frames["raw"])),
+                **self._stats,
+            }
+
+
+# Almacén compartido por el proceso del API
+_store = MatrixStore()
+
+
+def get_matrix_store() -> MatrixStore:
+    """
+    Retorna el almacén de matrices compartido por el proceso.
+
+    Returns:
+        MatrixStore: Almacén que lee las matrices de la base de datos.
+    """
+    return _store
+
+
+def invalidate_matrices() -> int:
+    """
+    Invalida las matrices en memoria (llamar después de confirmar cambios en InventarioMatriz
+    o MatrizBaseRiesgo).
+
+    Returns:
+        int: La nueva versión de las matrices.
+    """
+    return _store.invalidate()
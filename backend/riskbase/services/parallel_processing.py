@@ -0,0 +1,148 @@
+import pandas as pd
+import numpy as np
+from typing import List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+import os
+from dotenv import load_dotenv
+
+from .matrix_index import MatrixIndex
+from .decision_table import DecisionPlan
+from .rules_engine import compile_avon_natura_index, compile_otros_marcas_plan
+from .data_processing import process_riskbase_dataframe
+from .schema import concat_categorical
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA LA EJECUCIÓN EN PARALELO DEL MOTOR DE REGLAS
+#! LAS REGLAS SON INDEPENDIENTES ENTRE FILAS, POR LO QUE CADA PARTICIÓN SE PUEDE PROCESAR EN UN PROCESO DISTINTO
+
+# Configuración por variables de entorno
+RISK_PROCESS_WORKERS = int(os.getenv("RISK_PROCESS_WORKERS", "0"))  # 0 = número de núcleos
+RISK_PARALLEL_MIN_ROWS = int(os.getenv("RISK_PARALLEL_MIN_ROWS", "200000"))
+RISK_PARTITION_KEY = os.getenv("RISK_PARTITION_KEY", "CENTRO")
+
+# Índice de AVON/NATURA y plan del resto de marcas en cada proceso trabajador (se envían una sola vez)
+_indice_avon_natura: Optional[MatrixIndex] = None
+_plan_otros_tipos: Optional[DecisionPlan] = None
+
+
+def _init_worker(indice_avon_natura: MatrixIndex, plan_otros_tipos: DecisionPlan) -> None:
+    """
+    Inicializador de cada proceso trabajador: guarda las matrices ya compiladas.
+    """
+    global _indice_avon_natura, _plan_otros_tipos
+    _indice_avon_natura = indice_avon_natura
+    _plan_otros_tipos = plan_otros_tipos
+
+
+def _process_partition(df_particion: pd.DataFrame) -> pd.DataFrame:
+    """
+    Procesa una partición en un proceso trabajador con las matrices recibidas al iniciar.
+    """
+    return process_riskbase_dataframe(df_particion, _indice_avon_natura, _plan_otros_tipos)
+
+
+def resolve_worker_count(workers: Optional[int] = None) -> int:
+    """
+    Número de procesos a usar: el indicado, RISK_PROCESS_WORKERS o, si es 0, los núcleos disponibles.
+    """
+    if workers is None:
+        workers = RISK_PROCESS_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def partition_rows(
+    df: pd.DataFrame, partition_key: str, n_partitions: int
+) -> List[np.ndarray]:
+    """
+    Reparte las filas en particiones completas por valor de la llave de partición.
+
+    Los grupos se asignan de mayor a menor tamaño a la partición con menos filas hasta
+    el momento, para equilibrar la carga entre procesos.
+
+    Args:
+        df: DataFrame a particionar
+        partition_key: Columna usada como llave de partición (por ejemplo 'CENTRO' o 'MARCA DE QM')
+        n_partitions: Número máximo de particiones
+
+    Returns:
+        List[np.ndarray]: Posiciones de las filas de cada partición no vacía.
+    """
+    grupos = df.groupby(partition_key, sort=False, observed=True, dropna=False).indices
+    grupos = sorted(grupos.values(), key=len, reverse=True)
+
+    particiones: List[List[np.ndarray]] = [[] for _ in range(n_partitions)]
+    tamanos = np.zeros(n_partitions, dtype=np.int64)
+    for posiciones in grupos:
+        destino = int(np.argmin(tamanos))
+        particiones[destino].append(posiciones)
+        tamanos[destino] += len(posiciones)
+
+    return [np.sort(np.concatenate(p)) for p in particiones if p]
+
+
+def process_riskbase_parallel(
+    df_sap: pd.DataFrame,
+    df_matrices_avon_natura: Union[pd.DataFrame, MatrixIndex],
+    df_matrices_otros_tipos: Union[pd.DataFrame, MatrixIndex, DecisionPlan],
+    workers: Optional[int] = None,
+    partition_key: Optional[str] = None,
+    min_rows: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Procesa el DataFrame de SAP repartiendo las filas entre varios procesos.
+
+    El DataFrame se divide por la llave de partición, cada partición se procesa con
+    process_riskbase_dataframe en un ProcessPoolExecutor (las matrices y la tabla de decisión
+    se compilan una vez y se envían a cada proceso en su inicialización) y el resultado se vuelve a unir en el
+    orden original de las filas. Con pocas filas, un solo proceso o una sola partición,
+    se procesa en serie.
+
+    Args:
+        df_sap: DataFrame retornado por get_data_sap
+        df_matrices_avon_natura: Matrices de AVON y NATURA o su índice compilado
+        df_matrices_otros_tipos: Matrices del resto de marcas, su índice o su plan compilado
+        workers: Número de procesos. Por defecto RISK_PROCESS_WORKERS.
+        partition_key: Columna de partición. Por defecto RISK_PARTITION_KEY.
+        min_rows: Filas mínimas para procesar en paralelo. Por defecto RISK_PARALLEL_MIN_ROWS.
+
+    Returns:
+        pd.DataFrame: El mismo resultado que process_riskbase_dataframe.
+    """
+    if not isinstance(df_matrices_avon_natura, MatrixIndex):
+        df_matrices_avon_natura = compile_avon_natura_index(df_matrices_avon_natura)
+    df_matrices_otros_tipos = compile_otros_marcas_plan(df_matrices_otros_tipos)
+
+    workers = resolve_worker_count(workers)
+    partition_key = partition_key or RISK_PARTITION_KEY
+    min_rows = RISK_PARALLEL_MIN_ROWS if min_rows is None else min_rows
+
+    en_serie = (
+        workers <= 1 or len(df_sap) < min_rows or partition_key not in df_sap.columns
+    )
+    particiones = [] if en_serie else partition_rows(df_sap, partition_key, workers)
+    if en_serie or len(particiones) < 2:
+        return process_riskbase_dataframe(
+            df_sap, df_matrices_avon_natura, df_matrices_otros_tipos
+        )
+
+    print(
+        f"Procesando {len(df_sap)} filas en {len(particiones)} particiones por '{partition_key}'"
+    )
+    df_sap = df_sap.reset_index(drop=True)
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(particiones)),
+        initializer=_init_worker,
+        initargs=(df_matrices_avon_natura, df_matrices_otros_tipos),
+    ) as executor:
+        resultados = list(
+            executor.map(
+                _process_partition, [df_sap.iloc[posiciones] for posiciones in particiones]
+            )
+        )
+
+    # Reunir las particiones y restaurar el orden original de las filas
+    df_final = concat_categorical(resultados, ignore_index=False)
+    return df_final.sort_index(kind="stable").reset_index(drop=True)
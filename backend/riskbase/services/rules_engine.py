@@ -0,0 +1,734 @@
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .matrix_index import MatrixIndex, compile_matrix_index, matrix_key
+from .schema import text_column
+from .decision_table import OTROS_MARCAS_DECISION_TABLE, DecisionPlan, compile_decision_plan
+
+#* AQUÍ SE ENCUENTRA EL MOTOR DE REGLAS VECTORIZADO
+#! LAS FUNCIONES calculate_*_column DE data_processing.py SON LA IMPLEMENTACIÓN DE REFERENCIA.
+#! CUALQUIER CAMBIO EN LA LÓGICA DE NEGOCIO DEBE HACERSE EN AMBOS LUGARES Y VALIDARSE CON verify_rules_engine
+
+# Límites (en días) de '6.ENTRE 540 Y 720 DIAS' para los lotes de 360 días o más
+RANGO_PERMANENCIA_EDGES: Tuple[int, int] = (540, 720)
+
+
+def compute_rango_permanencia_column(
+    df: pd.DataFrame, edges: Tuple[int, int] = RANGO_PERMANENCIA_EDGES
+) -> pd.Series:
+    """
+    Calcula 'RANGO DE PERMANENCIA 2' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_rango_permanencia_column.
+
+    Args:
+        df: DataFrame con las columnas 'LOTE', 'PERMANENCIA' y 'RANGO DE PERMANENCIA'
+        edges: Límites de los rangos 5, 6 y 7. Por defecto RANGO_PERMANENCIA_EDGES;
+               los escenarios de estrés los desplazan.
+
+    Returns:
+        pd.Series: Rango de permanencia calculado para cada fila.
+    """
+    lote = df["LOTE"]
+    permanencia = df["PERMANENCIA"]
+    rango_permanencia = df["RANGO DE PERMANENCIA"]
+
+    mayor_360 = rango_permanencia == "5.MAYOR O IGUAL A 360 DIAS"
+    condiciones = [
+        lote == "222222",
+        mayor_360 & (permanencia == 0),
+        mayor_360 & (permanencia < edges[0]),
+        mayor_360 & (permanencia < edges[1]),
+        mayor_360,
+    ]
+    opciones = [
+        "1.MENOR DE 90 DIAS",
+        "5.ENTRE 360 Y 540 DIAS",
+        "5.ENTRE 360 Y 540 DIAS",
+        "6.ENTRE 540 Y 720 DIAS",
+        "7.MAYOR DE 720 DIAS",
+    ]
+    valores = np.select(
+        condiciones, opciones, default=rango_permanencia.to_numpy(dtype=object)
+    )
+    return pd.Series(pd.Categorical(valores), index=df.index)
+
+
+# Estados de consumo posibles, en orden de jerarquía
+STATUS_CONS_CATEGORIES = pd.CategoricalDtype(
+    ["VENCIDO", "BLOQUEADO", "OBSOLETO", "PAV", "DISPONIBLE"]
+)
+
+
+def compute_status_cons_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'STATUS CONS' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_status_cons_column. Respeta la misma
+    jerarquía: VENCIDO > BLOQUEADO > OBSOLETO > PAV > DISPONIBLE.
+
+    Args:
+        df: DataFrame con las columnas 'RANGO PRÓX.VENCER MM', 'VALOR BLOQUEADO MM'
+            y 'VALOR OBSOLETO'
+
+    Returns:
+        pd.Series: Estado de consumo calculado para cada fila (categórica).
+    """
+    rango_prox_vencer = df["RANGO PRÓX.VENCER MM"]
+
+    condiciones = [
+        rango_prox_vencer == "VENCIDO",
+        df["VALOR BLOQUEADO MM"].ne(0),
+        df["VALOR OBSOLETO"].ne(0),
+        rango_prox_vencer.isin(["1.PAV 3 MESES", "2.PAV 4 A 6 MESES"]),
+    ]
+    # Se seleccionan directamente los códigos de STATUS_CONS_CATEGORIES, en el mismo orden de jerarquía
+    codigos = np.select(condiciones, [0, 1, 2, 3], default=4)
+    return pd.Series(
+        pd.Categorical.from_codes(codigos, dtype=STATUS_CONS_CATEGORIES), index=df.index
+    )
+
+
+def compute_valor_def_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'VALOR DEF' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_valor_def_column.
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'VALOR BLOQUEADO MM' y 'VALOR TOTAL MM'
+
+    Returns:
+        pd.Series: Valor definitivo para cada fila.
+    """
+    return df["VALOR BLOQUEADO MM"].where(
+        df["STATUS CONS"] == "BLOQUEADO", df["VALOR TOTAL MM"]
+    )
+
+
+#* KERNEL COMPARTIDO PARA CLASIFICAR DIFERENCIAS DE DÍAS EN RANGOS
+
+# Límites superiores (inclusive) de cada rango de días, ordenados de menor a mayor
+DAY_RANGE_EDGES = np.array([90, 180, 270, 360, 540, 720], dtype=np.int64)
+
+# Etiquetas por familia de rangos: una por cada límite más la del último rango abierto
+RANGO_DIAS_LABELS: Tuple[str, ...] = (
+    "1.MENOR DE 90 DIAS",
+    "2.ENTRE 90 Y 180 DIAS",
+    "3.ENTRE 180 Y 270 DIAS",
+    "4.ENTRE 270 Y 360 DIAS",
+    "5.ENTRE 360 Y 540 DIAS",
+    "6.ENTRE 540 Y 720 DIAS",
+    "7.MAYOR DE 720 DIAS",
+)
+RANGO_BLOQUEADO_LABELS: Tuple[str, ...] = RANGO_DIAS_LABELS[:-1] + ("7.MAYOR A 720 DIAS",)
+
+# Columna destino, status al que aplica, columna de fecha del evento y etiquetas de cada familia
+DAY_RANGE_FAMILIES: List[Tuple[str, str, str, Tuple[str, ...]]] = [
+    ("RANGO OBSOLESCENCIA", "OBSOLETO", "FECHA OBSOLETO", RANGO_DIAS_LABELS),
+    ("RANGO VENCIDO 2", "VENCIDO", "FECH, CADUCIDAD/FECH PREF. CONSUMO", RANGO_DIAS_LABELS),
+    ("RANGO BLOQUEADO 2", "BLOQUEADO", "FECHA BLOQUEADO", RANGO_BLOQUEADO_LABELS),
+]
+
+_NS_POR_DIA = np.int64(24 * 60 * 60 * 10**9)
+
+
+def bin_days(
+    dias: np.ndarray,
+    aplica: np.ndarray,
+    labels: np.ndarray,
+    edges: np.ndarray = DAY_RANGE_EDGES,
+) -> np.ndarray:
+    """
+    Asigna a cada diferencia de días la etiqueta de su rango mediante una búsqueda binaria.
+
+    Con los límites ordenados, np.searchsorted(side="left") devuelve para cada valor el
+    índice del primer límite mayor o igual, que es justamente el rango al que pertenece
+    (<= 90 → 0, <= 180 → 1, ..., > 720 → len(edges)). Las filas que no aplican reciben
+    la última etiqueta de labels (por ejemplo 'FALSO').
+
+    Args:
+        dias: Arreglo (1D o 2D) con las diferencias de días
+        aplica: Máscara booleana con la misma forma que dias
+        labels: Arreglo de etiquetas con len(edges) + 2 elementos (1D), o una fila de
+                etiquetas por familia (2D) cuando dias es 2D
+        edges: Límites superiores de cada rango, ordenados de menor a mayor
+
+    Returns:
+        np.ndarray: Etiquetas con la misma forma que dias.
+    """
+    buckets = _bin_codes(dias, aplica, edges)
+    if labels.ndim == 1:
+        return labels[buckets]
+    return labels[np.arange(labels.shape[0])[:, None], buckets]
+
+
+def _bin_codes(dias: np.ndarray, aplica: np.ndarray, edges: np.ndarray = DAY_RANGE_EDGES) -> np.ndarray:
+    """
+    Calcula la posición de la etiqueta de cada diferencia de días (ver bin_days).
+    """
+    buckets = np.searchsorted(edges, dias.ravel(), side="left").reshape(dias.shape)
+    return np.where(aplica, buckets, len(edges) + 1)
+
+
+def _days_since(fecha_entrada: pd.Series, fechas_evento: List[pd.Series]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula en una sola resta los días entre 'FECHA ENTRADA' y cada fecha de evento.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Días (2D, una fila por fecha de evento, redondeados
+                                       hacia abajo como Timedelta.days) y máscara de fechas válidas.
+    """
+    entrada = fecha_entrada.to_numpy(dtype="datetime64[ns]")
+    eventos = np.stack([f.to_numpy(dtype="datetime64[ns]") for f in fechas_evento])
+    diferencia = entrada[None, :] - eventos
+    validas = ~np.isnat(diferencia)
+    dias = np.floor_divide(diferencia.view(np.int64), _NS_POR_DIA)
+    return dias, validas
+
+
+def compute_day_range_columns(
+    df: pd.DataFrame, edges: np.ndarray = DAY_RANGE_EDGES
+) -> pd.DataFrame:
+    """
+    Calcula 'RANGO OBSOLESCENCIA', 'RANGO VENCIDO 2' y 'RANGO BLOQUEADO 2' de una sola vez.
+
+    Las tres familias comparten el mismo kernel: una resta de fechas para las tres columnas
+    de evento, una búsqueda binaria sobre DAY_RANGE_EDGES y una selección de etiquetas
+    por familia (incluida la diferencia '7.MAYOR DE 720 DIAS' / '7.MAYOR A 720 DIAS').
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'FECHA ENTRADA', 'FECHA OBSOLETO',
+            'FECH, CADUCIDAD/FECH PREF. CONSUMO' y 'FECHA BLOQUEADO'
+        edges: Límites de los rangos. Por defecto DAY_RANGE_EDGES; los escenarios de
+               estrés los desplazan.
+
+    Returns:
+        pd.DataFrame: DataFrame con las tres columnas de rango, alineado con df.
+    """
+    return _day_range_columns(df, DAY_RANGE_FAMILIES, edges)
+
+
+def _day_range_columns(
+    df: pd.DataFrame,
+    familias: List[Tuple[str, str, str, Tuple[str, ...]]],
+    edges: np.ndarray = DAY_RANGE_EDGES,
+) -> pd.DataFrame:
+    """
+    Aplica el kernel de rangos de días a las familias indicadas.
+    """
+    dias, validas = _days_since(
+        df["FECHA ENTRADA"], [df[fecha] for _, _, fecha, _ in familias]
+    )
+    status = df["STATUS CONS"].to_numpy(dtype=object)
+    estados = np.array([estado for _, estado, _, _ in familias], dtype=object)
+    aplica = validas & (status[None, :] == estados[:, None])
+
+    # Los códigos del kernel son directamente los códigos de la categórica de cada familia
+    codigos = _bin_codes(dias, aplica, edges)
+    return pd.DataFrame(
+        {
+            columna: pd.Categorical.from_codes(
+                codigos[i], categories=list(labels) + ["FALSO"]
+            )
+            for i, (columna, _, _, labels) in enumerate(familias)
+        },
+        index=df.index,
+    )
+
+
+def _rango_por_dias(df: pd.DataFrame, columna: str) -> pd.Series:
+    """
+    Calcula una sola familia de rangos de días usando el kernel compartido.
+    """
+    familia = [f for f in DAY_RANGE_FAMILIES if f[0] == columna]
+    return _day_range_columns(df, familia)[columna]
+
+
+def compute_rango_obsoleto_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'RANGO OBSOLESCENCIA' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_rango_obsoleto_column.
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'FECHA ENTRADA' y 'FECHA OBSOLETO'
+
+    Returns:
+        pd.Series: Rango de obsolescencia para cada fila.
+    """
+    return _rango_por_dias(df, "RANGO OBSOLESCENCIA")
+
+
+def compute_rango_vencido_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'RANGO VENCIDO 2' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_rango_vencido_column.
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'FECHA ENTRADA'
+            y 'FECH, CADUCIDAD/FECH PREF. CONSUMO'
+
+    Returns:
+        pd.Series: Rango de vencimiento para cada fila.
+    """
+    return _rango_por_dias(df, "RANGO VENCIDO 2")
+
+
+def compute_rango_bloqueado_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'RANGO BLOQUEADO 2' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_rango_bloqueado_column.
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'FECHA ENTRADA' y 'FECHA BLOQUEADO'
+
+    Returns:
+        pd.Series: Rango de bloqueo para cada fila.
+    """
+    return _rango_por_dias(df, "RANGO BLOQUEADO 2")
+
+
+def compute_tiempo_bloqueo_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'TIEMPO BLOQUEADO' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_tiempo_bloqueo_column. Las filas sin alguna
+    de las dos fechas quedan en 0.
+
+    Args:
+        df: DataFrame con las columnas 'FECHA ENTRADA' y 'FECHA BLOQUEADO'
+
+    Returns:
+        pd.Series: Días de bloqueo (enteros) para cada fila.
+    """
+    dias = (df["FECHA ENTRADA"] - df["FECHA BLOQUEADO"]).dt.days
+    return dias.fillna(0).astype("int64")
+
+
+def compute_rango_cons_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'RANGO CONS' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_rango_cons_column.
+
+    Args:
+        df: DataFrame con las columnas 'STATUS CONS', 'RANGO OBSOLESCENCIA',
+            'RANGO VENCIDO 2', 'RANGO BLOQUEADO 2' y 'RANGO DE PERMANENCIA 2'
+
+    Returns:
+        pd.Series: Rango de consumo final para cada fila.
+    """
+    status = df["STATUS CONS"]
+    condiciones = [
+        status == "OBSOLETO",
+        status == "VENCIDO",
+        status == "BLOQUEADO",
+    ]
+    opciones = [
+        df["RANGO OBSOLESCENCIA"].to_numpy(dtype=object),
+        df["RANGO VENCIDO 2"].to_numpy(dtype=object),
+        df["RANGO BLOQUEADO 2"].to_numpy(dtype=object),
+    ]
+    valores = np.select(
+        condiciones, opciones, default=df["RANGO DE PERMANENCIA 2"].to_numpy(dtype=object)
+    )
+    return pd.Series(pd.Categorical(valores), index=df.index)
+
+
+def compute_base_riesgo_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'BASE RIESGO' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_base_riesgo_column.
+
+    Args:
+        df: DataFrame con las columnas 'CLAS BASE RIESGO' y 'VALOR DEF'
+
+    Returns:
+        pd.Series: Valor base de riesgo para cada fila.
+    """
+    return df["VALOR DEF"].where(df["CLAS BASE RIESGO"] != "BAJO", 0.0)
+
+
+def compute_provision_column(df: pd.DataFrame) -> pd.Series:
+    """
+    Calcula 'PROVISION' sobre todo el DataFrame a la vez.
+
+    Equivalente vectorizado de calculate_provision_column.
+
+    Args:
+        df: DataFrame con las columnas 'MARCA DE QM', 'VALOR DEF' y 'FACTOR PROV'
+
+    Returns:
+        pd.Series: Valor de provisión para cada fila.
+    """
+    provision = df["VALOR DEF"] * df["FACTOR PROV"]
+    return provision.where(df["MARCA DE QM"] != "OTRAS", 0.0)
+
+
+#* FACTOR PROV Y CLAS BASE RIESGO PARA AVON Y NATURA (VECTORIZADO)
+
+# Tipo de matriz con el que se compilan las matrices de AVON y NATURA
+MATRIZ_NATURACO = "MATRIZ NATURACO"
+
+
+def compile_avon_natura_index(df_matrices_avon_natura: pd.DataFrame) -> MatrixIndex:
+    """
+    Compila las matrices de AVON y NATURA en un MatrixIndex.
+
+    Ante claves repetidas se conserva la última fila, igual que el lookup_dict que se
+    construía fila a fila con iterrows().
+
+    Args:
+        df_matrices_avon_natura: DataFrame retornado por df_matrices_avon_natura()
+
+    Returns:
+        MatrixIndex: Índice compilado bajo el tipo de matriz MATRIZ_NATURACO.
+    """
+    return compile_matrix_index(
+        df_matrices_avon_natura.assign(tipo_matriz=MATRIZ_NATURACO), keep="last"
+    )
+
+
+# Columnas que lee resolve_avon_natura_factor_and_class
+AVON_NATURA_FACTOR_COLUMNS: List[str] = [
+    "SEGMENTACION",
+    "STATUS CONS",
+    "TIEMPO BLOQUEADO",
+    "PERMANENCIA",
+    "TIPO DE MATERIAL (I)",
+    "NEGOCIO INVENTARIOS",
+    "INDICADOR STOCK ESPEC.",
+    "MARCA DE QM",
+    "RANGO CONS",
+    "RANGO COBERTURA",
+    "RANGO DE PERMANENCIA 2",
+]
+
+
+def _avon_natura_branches(df: pd.DataFrame) -> Tuple[np.ndarray, pd.Series, pd.Series]:
+    """
+    Asigna cada fila de AVON y NATURA a su rama de calculate_avon_natura_factor_and_class.
+
+    Returns:
+        Tuple[np.ndarray, pd.Series, pd.Series]: Clave a buscar en la matriz NaturaCo (None si
+        la fila no consulta la matriz), máscara de filas que usan el respaldo por primer dígito
+        y 'RANGO CONS' normalizado.
+    """
+    seg = df["SEGMENTACION"]
+    status = df["STATUS CONS"]
+    indic = df["INDICADOR STOCK ESPEC."]
+    negocio = df["NEGOCIO INVENTARIOS"]
+    rango_cons = text_column(df, "RANGO CONS")
+
+    sin_riesgo = (
+        seg.isin(["MARCAS PROPIAS", "EXPERTOS NO LOCALES", "DUEÑOS DE DEMANDA"])
+        & (status == "BLOQUEADO")
+        & (df["TIEMPO BLOQUEADO"] <= 30)
+    ) | (
+        status.isin(["DISPONIBLE", "PAV"])
+        & (df["PERMANENCIA"] <= 30)
+        & df["TIPO DE MATERIAL (I)"].isin(["GRANEL FAB A TERCERO", "GRANEL"])
+    )
+    por_negocio = ~sin_riesgo & (
+        (negocio == "FPT")
+        | ((indic != "W") & status.isin(["OBSOLETO", "BLOQUEADO", "VENCIDO"]))
+    )
+    por_cobertura = ~sin_riesgo & ~por_negocio & (indic != "W") & (status == "DISPONIBLE")
+    por_digito = (
+        ~sin_riesgo
+        & ~por_negocio
+        & ~por_cobertura
+        & df["MARCA DE QM"].isin(["AVON", "NATURA"])
+        & status.isin(["VENCIDO", "OBSOLETO", "PAV"])
+    )
+
+    claves = np.full(len(df), None, dtype=object)
+    en_matriz = (por_negocio | por_cobertura).to_numpy(dtype=bool)
+    if en_matriz.any():
+        clave_negocio = negocio.astype(str) + status.astype(str) + rango_cons
+        clave_cobertura = text_column(df, "RANGO COBERTURA") + text_column(df, "RANGO DE PERMANENCIA 2")
+        claves[en_matriz] = clave_negocio.where(por_negocio, clave_cobertura).to_numpy(dtype=object)[en_matriz]
+    return claves, por_digito, rango_cons
+
+
+def avon_natura_candidate_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    Llave (tipo_matriz + clave) que cada fila de AVON y NATURA busca en la matriz NaturaCo.
+
+    Args:
+        df: DataFrame con las columnas de AVON_NATURA_FACTOR_COLUMNS
+
+    Returns:
+        np.ndarray: Llave de cada fila, o None si la fila no consulta la matriz.
+    """
+    claves, _, _ = _avon_natura_branches(df)
+    en_matriz = pd.notna(claves)
+    claves[en_matriz] = matrix_key(MATRIZ_NATURACO, claves[en_matriz])
+    return claves
+
+
+def resolve_avon_natura_factor_and_class(
+    df: pd.DataFrame, matrix_index: MatrixIndex
+) -> pd.DataFrame:
+    """
+    Calcula 'FACTOR PROV' y 'CLAS BASE RIESGO' para AVON y NATURA sobre todo el DataFrame.
+
+    Equivalente vectorizado de calculate_avon_natura_factor_and_class. Cada fila se asigna
+    a la primera rama que cumple; las filas que se resuelven contra la matriz arman su
+    clave (negocio+status+rango_cons o cobertura+rango_perm) con operaciones de texto sobre
+    columnas completas y se buscan todas a la vez. Los respaldos por el primer dígito de
+    'RANGO CONS' se aplican con máscaras.
+
+    Args:
+        df: DataFrame con las columnas formuladas hasta 'TIEMPO BLOQUEADO'
+        matrix_index: Índice compilado con compile_avon_natura_index
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas 'FACTOR PROV' y 'CLAS BASE RIESGO', alineado con df.
+    """
+    claves, por_digito, rango_cons = _avon_natura_branches(df)
+
+    factores = np.zeros(len(df), dtype=float)
+    clasificaciones = np.full(len(df), "BAJO", dtype=object)
+
+    # Búsqueda en la matriz: una sola clave por fila según la rama
+    en_matriz = pd.notna(claves)
+    if en_matriz.any():
+        f, c, _ = matrix_index.lookup(MATRIZ_NATURACO, pd.Series(claves[en_matriz]))
+        factores[en_matriz] = f
+        clasificaciones[en_matriz] = c
+
+    # Respaldo por el primer dígito de 'RANGO CONS': > 4 es MUY ALTO, el resto MEDIO
+    primer_caracter = rango_cons.str[:1]
+    es_digito = primer_caracter.str.isdecimal()
+    muy_alto = (por_digito & es_digito & (primer_caracter > "4")).to_numpy(dtype=bool)
+    medio = (por_digito & es_digito & (primer_caracter <= "4")).to_numpy(dtype=bool)
+    factores[muy_alto] = 1.0
+    clasificaciones[muy_alto] = "MUY ALTO"
+    factores[medio] = 0.2
+    clasificaciones[medio] = "MEDIO"
+
+    return pd.DataFrame(
+        {"FACTOR PROV": factores, "CLAS BASE RIESGO": pd.Categorical(clasificaciones)},
+        index=df.index,
+    )
+
+
+#* FACTOR PROV Y CLAS BASE RIESGO PARA EL RESTO DE MARCAS (VECTORIZADO)
+
+# Columnas que lee resolve_otros_marcas_factor_and_class (las de la tabla de decisión)
+OTROS_MARCAS_FACTOR_COLUMNS: List[str] = list(
+    dict.fromkeys(c for regla in OTROS_MARCAS_DECISION_TABLE for c in regla.columns)
+)
+
+
+def resolve_otros_marcas_factor_and_class(
+    df: pd.DataFrame, matrix_index: Union[MatrixIndex, DecisionPlan]
+) -> pd.DataFrame:
+    """
+    Calcula 'FACTOR PROV' y 'CLAS BASE RIESGO' para el resto de marcas sobre todo el DataFrame.
+
+    Equivalente vectorizado de calculate_otros_marcas_factor_and_class. Las ramas (filas sin
+    riesgo, indicador W, SIN ASIGNAR/O y el respaldo de los DISPONIBLES en la matriz
+    'OBSOLETOS, BLOQUEADOS, VENCIDOS') están declaradas en OTROS_MARCAS_DECISION_TABLE; aquí
+    la tabla se compila contra las matrices y se evalúa con una búsqueda por nivel de prioridad.
+    Quien llama varias veces con las mismas matrices debe pasar el plan ya compilado
+    (compile_decision_plan) para no compilarlo en cada llamada.
+
+    Args:
+        df: DataFrame con las columnas formuladas hasta 'TIEMPO BLOQUEADO'
+        matrix_index: Índice compilado de df_matrices_otros_tipos (ver compile_matrix_index)
+                      o el plan ya compilado con compile_decision_plan
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas 'FACTOR PROV' y 'CLAS BASE RIESGO', alineado con df.
+    """
+    if isinstance(matrix_index, DecisionPlan):
+        return matrix_index.evaluate(df)
+    return compile_decision_plan(matrix_index, OTROS_MARCAS_DECISION_TABLE).evaluate(df)
+
+
+def compile_otros_marcas_plan(
+    df_matrices_otros_tipos: Union[pd.DataFrame, MatrixIndex, DecisionPlan],
+) -> DecisionPlan:
+    """
+    Compila las matrices del resto de marcas hasta el plan de la tabla de decisión.
+
+    Args:
+        df_matrices_otros_tipos: Matrices, su índice compilado o el plan ya compilado
+                                 (en ese caso se retorna tal cual)
+
+    Returns:
+        DecisionPlan: Plan listo para resolve_otros_marcas_factor_and_class.
+    """
+    if isinstance(df_matrices_otros_tipos, DecisionPlan):
+        return df_matrices_otros_tipos
+    if not isinstance(df_matrices_otros_tipos, MatrixIndex):
+        df_matrices_otros_tipos = compile_matrix_index(df_matrices_otros_tipos, keep="first")
+    return compile_decision_plan(df_matrices_otros_tipos)
+
+
+#* RELACIÓN ENTRE CADA COLUMNA FORMULADA Y SU VERSIÓN VECTORIZADA
+#TODO: CADA QUE SE CREA UNA COLUMNA FORMULADA DEBES DE AÑADIRLA AQUÍ Y EN _reference_rules
+
+VECTORIZED_RULES: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "RANGO DE PERMANENCIA 2": compute_rango_permanencia_column,
+    "STATUS CONS": compute_status_cons_column,
+    "VALOR DEF": compute_valor_def_column,
+    "RANGO OBSOLESCENCIA": compute_rango_obsoleto_column,
+    "RANGO VENCIDO 2": compute_rango_vencido_column,
+    "RANGO BLOQUEADO 2": compute_rango_bloqueado_column,
+    "RANGO CONS": compute_rango_cons_column,
+    "TIEMPO BLOQUEADO": compute_tiempo_bloqueo_column,
+    "BASE RIESGO": compute_base_riesgo_column,
+    "PROVISION": compute_provision_column,
+}
+
+
+def _reference_rules() -> Dict[str, Callable[[pd.Series], object]]:
+    """
+    Retorna las funciones fila a fila de data_processing.py que sirven de referencia.
+
+    Se importan aquí para evitar la importación circular con data_processing.py,
+    que a su vez usa este módulo.
+    """
+    from .data_processing import (
+        calculate_rango_permanencia_column,
+        calculate_status_cons_column,
+        calculate_valor_def_column,
+        calculate_rango_obsoleto_column,
+        calculate_rango_vencido_column,
+        calculate_rango_bloqueado_column,
+        calculate_tiempo_bloqueo_column,
+        calculate_rango_cons_column,
+        calculate_base_riesgo_column,
+        calculate_provision_column,
+    )
+
+    return {
+        "RANGO DE PERMANENCIA 2": calculate_rango_permanencia_column,
+        "STATUS CONS": calculate_status_cons_column,
+        "VALOR DEF": calculate_valor_def_column,
+        "RANGO OBSOLESCENCIA": calculate_rango_obsoleto_column,
+        "RANGO VENCIDO 2": calculate_rango_vencido_column,
+        "RANGO BLOQUEADO 2": calculate_rango_bloqueado_column,
+        "RANGO CONS": calculate_rango_cons_column,
+        "TIEMPO BLOQUEADO": calculate_tiempo_bloqueo_column,
+        "BASE RIESGO": calculate_base_riesgo_column,
+        "PROVISION": calculate_provision_column,
+    }
+
+
+def _same_values(reference: pd.Series, vectorized: pd.Series) -> pd.Series:
+    """
+    Compara dos columnas elemento a elemento considerando NaN == NaN y tolerancia numérica.
+    """
+    ambos_nulos = reference.isna() & vectorized.isna()
+    ref_num = pd.to_numeric(reference, errors="coerce")
+    vec_num = pd.to_numeric(vectorized, errors="coerce")
+    numericos = ref_num.notna() & vec_num.notna()
+    iguales_num = pd.Series(
+        np.isclose(ref_num.to_numpy(dtype=float), vec_num.to_numpy(dtype=float)),
+        index=reference.index,
+    )
+    iguales_txt = reference.astype(object) == vectorized.astype(object)
+    return ambos_nulos | (numericos & iguales_num) | (~numericos & iguales_txt)
+
+
+def _compare_factor_and_class(
+    df: pd.DataFrame,
+    referencia: Callable[[pd.Series], Tuple[float, str]],
+    vectorizada: Callable[[pd.DataFrame], pd.DataFrame],
+) -> Dict[str, int]:
+    """
+    Cuenta las diferencias en 'FACTOR PROV' y 'CLAS BASE RIESGO' entre la función fila a fila
+    y el resolvedor vectorizado.
+    """
+    columnas_factor = ["FACTOR PROV", "CLAS BASE RIESGO"]
+    if df.empty:
+        return {columna: 0 for columna in columnas_factor}
+    esperado = df.apply(
+        lambda r: pd.Series(referencia(r), index=columnas_factor), axis=1
+    )
+    obtenido = vectorizada(df)
+    return {
+        columna: int((~_same_values(esperado[columna], obtenido[columna])).sum())
+        for columna in columnas_factor
+    }
+
+
+def verify_rules_engine(
+    df: pd.DataFrame,
+    columns: Optional[List[str]] = None,
+    df_matrices_otros_tipos: Optional[pd.DataFrame] = None,
+    df_matrices_avon_natura: Optional[pd.DataFrame] = None,
+) -> Dict[str, int]:
+    """
+    Verifica que el motor vectorizado y las funciones fila a fila produzcan el mismo resultado.
+
+    Ambas implementaciones se evalúan sobre exactamente la misma entrada: un DataFrame ya
+    procesado (con todas las columnas formuladas), de modo que cada regla lee las mismas
+    columnas de las que depende. Útil para validar cambios en la lógica de negocio antes
+    de llevarlos a producción.
+
+    Args:
+        df: DataFrame procesado por process_dataframe_avon_natura o process_dataframe_otras_marcas
+        columns: Lista opcional de columnas formuladas a verificar. Por defecto se verifican todas.
+        df_matrices_otros_tipos: Matrices del resto de marcas. Si se indica, también se verifican
+                                 'FACTOR PROV' y 'CLAS BASE RIESGO' contra
+                                 calculate_otros_marcas_factor_and_class.
+        df_matrices_avon_natura: Matrices de AVON y NATURA. Si se indica, también se verifican
+                                 'FACTOR PROV' y 'CLAS BASE RIESGO' contra
+                                 calculate_avon_natura_factor_and_class.
+
+    Returns:
+        Dict[str, int]: Número de filas en las que difieren ambas implementaciones por columna.
+                        Un resultado con todos los valores en 0 indica paridad total.
+    """
+    referencias = _reference_rules()
+    diferencias = {}
+    for columna, vectorizada in VECTORIZED_RULES.items():
+        if columns is not None and columna not in columns:
+            continue
+        referencia = referencias[columna]
+        if df.empty:
+            diferencias[columna] = 0
+            continue
+        esperado = df.apply(referencia, axis=1)
+        obtenido = vectorizada(df)
+        diferencias[columna] = int((~_same_values(esperado, obtenido)).sum())
+
+    if df_matrices_otros_tipos is not None:
+        from .data_processing import calculate_otros_marcas_factor_and_class
+
+        diferencias.update(
+            _compare_factor_and_class(
+                df,
+                lambda r: calculate_otros_marcas_factor_and_class(r, df_matrices_otros_tipos),
+                lambda d: resolve_otros_marcas_factor_and_class(
+                    d, compile_matrix_index(df_matrices_otros_tipos, keep="first")
+                ),
+            )
+        )
+    if df_matrices_avon_natura is not None:
+        from .data_processing import calculate_avon_natura_factor_and_class
+
+        lookup_dict = {
+            str(r["concatenado"]).strip(): (r["factor_prov"], r["clasificacion"])
+            for _, r in df_matrices_avon_natura.iterrows()
+        }
+        diferencias.update(
+            _compare_factor_and_class(
+                df,
+                lambda r: calculate_avon_natura_factor_and_class(r, lookup_dict),
+                lambda d: resolve_avon_natura_factor_and_class(
+                    d, compile_avon_natura_index(df_matrices_avon_natura)
+                ),
+            )
+        )
+    return diferencias
@@ -0,0 +1,507 @@
+import pandas as pd
+import numpy as np
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import datetime
+import threading
+import time
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .matrix_index import MatrixIndex, compile_matrix_index, matrix_key
+from .rules_engine import (
+    MATRIZ_NATURACO,
+    AVON_NATURA_FACTOR_COLUMNS,
+    OTROS_MARCAS_FACTOR_COLUMNS,
+    compile_avon_natura_index,
+    avon_natura_candidate_keys,
+    resolve_avon_natura_factor_and_class,
+    compute_base_riesgo_column,
+    compute_provision_column,
+)
+from .decision_table import DecisionPlan, compile_decision_plan
+from .scenarios import Scenario, run_scenarios
+from .schema import to_export_frame
+
+#* AQUÍ SE GUARDA LA ÚLTIMA CORRIDA DE /risk/process PARA RECALCULAR SOLO LO QUE CAMBIA AL EDITAR MATRICES
+#! LA CORRIDA VIVE EN MEMORIA DEL PROCESO DEL BACKEND; SI EL SERVIDOR SE REINICIA HAY QUE VOLVER A EJECUTAR /risk/process
+
+# Campos editables desde /risk/matrices-save en cada tabla
+MATRIZ_EDIT_FIELDS: List[str] = [
+    "concatenado",
+    "segmento",
+    "permanencia",
+    "factor_prov",
+    "clasificacion",
+    "tipo_matriz",
+]
+INVENTARIO_EDIT_FIELDS: List[str] = ["subsegmento", "estado", "cobertura", "negocio"]
+
+
+def apply_matrix_edits(
+    df_matrices: pd.DataFrame, edits: List[Dict[str, Any]]
+) -> Tuple[pd.DataFrame, Set[str]]:
+    """
+    Aplica a una copia de las matrices normalizadas las filas editadas en /risk/matrices-save.
+
+    Los valores se normalizan igual que al leer las matrices de la base de datos (textos en
+    mayúsculas y factor_prov de porcentaje a [0-1]). Solo se aplican los campos presentes
+    y no nulos, como en el UPDATE del endpoint.
+
+    Args:
+        df_matrices: Matrices normalizadas (df_matrices_avon_natura() y df_matrices_otros_tipos()
+                     unidas), con la columna 'id_politica_base_riesgo'
+        edits: Filas enviadas a /risk/matrices-save
+
+    Returns:
+        Tuple[pd.DataFrame, Set[str]]: Matrices con las ediciones aplicadas y llaves
+        (tipo_matriz + concatenado) afectadas, tanto las anteriores como las nuevas.
+    """
+    df_matrices = df_matrices.copy()
+    posiciones = pd.Index(df_matrices["id_politica_base_riesgo"]).get_indexer(
+        [row.get("id_politica_base_riesgo") for row in edits]
+    )
+    cambiadas: Set[str] = set()
+
+    def _llave(posicion: int) -> str:
+        fila = df_matrices.iloc[posicion]
+        return matrix_key(str(fila["tipo_matriz"]), str(fila["concatenado"]).strip())
+
+    for row, posicion in zip(edits, posiciones):
+        if posicion < 0:
+            continue
+        llave_anterior = _llave(posicion)
+        for campo in MATRIZ_EDIT_FIELDS + INVENTARIO_EDIT_FIELDS:
+            if campo not in row or row[campo] is None or campo not in df_matrices.columns:
+                continue
+            if campo == "factor_prov":
+                valor = float(row[campo]) / 100.0
+            else:
+                valor = str(row[campo]).upper()
+            df_matrices.iat[posicion, df_matrices.columns.get_loc(campo)] = valor
+        cambiadas.update({llave_anterior, _llave(posicion)})
+    return df_matrices, cambiadas
+
+
+# Columnas por las que se agrupan los deltas de una simulación
+SIMULATION_GROUP_COLUMNS: List[str] = ["MARCA DE QM", "SEGMENTACION", "STATUS CONS"]
+
+
+def _compile_matrices(
+    df_matrices: pd.DataFrame,
+) -> Tuple[MatrixIndex, MatrixIndex, DecisionPlan]:
+    """
+    Compila el índice de AVON/NATURA, el del resto de marcas y su plan de decisión.
+    """
+    es_naturaco = df_matrices["tipo_matriz"] == MATRIZ_NATURACO
+    indice_otros_tipos = compile_matrix_index(df_matrices[~es_naturaco], keep="first")
+    return (
+        compile_avon_natura_index(df_matrices[es_naturaco]),
+        indice_otros_tipos,
+        compile_decision_plan(indice_otros_tipos),
+    )
+
+
+class ProcessedRun:
+    """
+    Última corrida procesada junto con las llaves de matriz que puede consultar cada fila.
+
+    Permite recalcular 'FACTOR PROV', 'CLAS BASE RIESGO', 'BASE RIESGO' y 'PROVISION' solo
+    para las filas cuyas llaves coinciden con las filas editadas de las matrices, ya sea
+    para guardar el resultado (recompute) o solo para simularlo (simulate).
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        df_matrices: pd.DataFrame,
+        temp_file: Optional[str] = None,
+    ):
+        """
+        Guarda la corrida y construye el índice inverso llave de matriz → filas.
+
+        Args:
+            df (pd.DataFrame): Resultado de process_riskbase_dataframe / process_riskbase_parallel.
+            df_matrices (pd.DataFrame): Matrices normalizadas de todos los tipos.
+            temp_file (str, opcional): Archivo Excel temporal generado por la corrida (nombre
+                dentro de TEMP_DIR).
+        """
+        self.df = df.reset_index(drop=True)
+        self.df_matrices = df_matrices.reset_index(drop=True)
+        self.temp_file = temp_file
+        # Aumenta con cada recálculo que cambia filas; el archivo temporal se reescribe por revisión
+        self.revision = 0
+        self.created_at = datetime.now()
+        self.es_avon_natura = self.df["MARCA DE QM"].isin(["AVON", "NATURA"]).to_numpy(dtype=bool)
+        self.indice_avon_natura, self.indice_otros_tipos, self.plan_otros = _compile_matrices(
+            self.df_matrices
+        )
+
+        # Llaves candidatas: una para AVON/NATURA y una por nivel de la tabla de decisión
+        n = len(self.df)
+        otras = ~self.es_avon_natura
+        claves: List[np.ndarray] = []
+        filas: List[np.ndarray] = []
+        if self.es_avon_natura.any():
+            claves.append(
+                avon_natura_candidate_keys(
+                    self._columnas(self.es_avon_natura, AVON_NATURA_FACTOR_COLUMNS)
+                )
+            )
+            filas.append(np.flatnonzero(self.es_avon_natura))
+        if otras.any():
+            for claves_nivel in self.plan_otros.candidate_keys(
+                self._columnas(otras, OTROS_MARCAS_FACTOR_COLUMNS)
+            ):
+                claves.append(claves_nivel)
+                filas.append(np.flatnonzero(otras))
+
+        # Índice inverso: código de cada llave distinta y filas ordenadas por código
+        claves_todas = np.concatenate(claves) if claves else np.empty(0, dtype=object)
+        filas_todas = np.concatenate(filas) if filas else np.empty(0, dtype=np.int64)
+        validas = pd.notna(claves_todas)
+        codigos, unicas = pd.factorize(claves_todas[validas])
+        orden = np.argsort(codigos, kind="stable")
+        self._llaves = pd.Index(unicas)
+        self._codigos = codigos[orden]
+        self._filas = filas_todas[validas][orden]
+
+    def _columnas(self, filas: np.ndarray, columnas: List[str]) -> pd.DataFrame:
+        """
+        Subconjunto de filas con solo las columnas indicadas que existan.
+        """
+        return self.df.loc[filas, [c for c in columnas if c in self.df.columns]]
+
+    def affected_rows(self, llaves: Set[str]) -> np.ndarray:
+        """
+        Posiciones (ordenadas) de las filas que consultan alguna de las llaves indicadas.
+        """
+        codigos = self._llaves.get_indexer(list(llaves))
+        codigos = codigos[codigos >= 0]
+        if not len(codigos):
+            return np.empty(0, dtype=np.int64)
+        inicios = np.searchsorted(self._codigos, codigos, side="left")
+        fines = np.searchsorted(self._codigos, codigos, side="right")
+        return np.unique(
+            np.concatenate([self._filas[i:f] for i, f in zip(inicios, fines)])
+        )
+
+    def _evaluate_edits(self, edits: List[Dict[str, Any]]):
+        """
+        Calcula el resultado de las filas afectadas por unas ediciones sin modificar la corrida.
+
+        Returns:
+            Tuple: Matrices editadas, índices compilados, llaves cambiadas, posiciones de las
+            filas afectadas y DataFrame con sus nuevos 'FACTOR PROV', 'CLAS BASE RIESGO',
+            'BASE RIESGO' y 'PROVISION'.
+        """
+        df_matrices, cambiadas = apply_matrix_edits(self.df_matrices, edits)
+        indice_avon_natura, indice_otros_tipos, plan_otros = _compile_matrices(df_matrices)
+        posiciones = self.affected_rows(cambiadas)
+
+        columnas = [
+            c
+            for c in dict.fromkeys(
+                AVON_NATURA_FACTOR_COLUMNS
+                + OTROS_MARCAS_FACTOR_COLUMNS
+                + SIMULATION_GROUP_COLUMNS
+                + ["VALOR DEF"]
+            )
+            if c in self.df.columns
+        ]
+        df_afectadas = self.df.iloc[posiciones, self.df.columns.get_indexer(columnas)]
+        es_avon_natura = self.es_avon_natura[posiciones]
+
+        factores = np.zeros(len(posiciones), dtype=float)
+        clases = np.full(len(posiciones), "BAJO", dtype=object)
+        if es_avon_natura.any():
+            factor_clase = resolve_avon_natura_factor_and_class(
+                df_afectadas[es_avon_natura], indice_avon_natura
+            )
+            factores[es_avon_natura] = factor_clase["FACTOR PROV"].to_numpy()
+            clases[es_avon_natura] = factor_clase["CLAS BASE RIESGO"].to_numpy(dtype=object)
+        if (~es_avon_natura).any():
+            factor_clase = plan_otros.evaluate(df_afectadas[~es_avon_natura])
+            factores[~es_avon_natura] = factor_clase["FACTOR PROV"].to_numpy()
+            clases[~es_avon_natura] = factor_clase["CLAS BASE RIESGO"].to_numpy(dtype=object)
+
+        nuevos = df_afectadas[["MARCA DE QM", "VALOR DEF"]].copy()
+        nuevos["FACTOR PROV"] = factores
+        nuevos["CLAS BASE RIESGO"] = clases
+        nuevos["BASE RIESGO"] = compute_base_riesgo_column(nuevos)
+        nuevos["PROVISION"] = compute_provision_column(nuevos)
+        return (
+            df_matrices,
+            (indice_avon_natura, indice_otros_tipos, plan_otros),
+            cambiadas,
+            posiciones,
+            nuevos,
+        )
+
+    def totals(self) -> Dict[str, Any]:
+        """
+        Totales de la corrida.
+        """
+        return {
+            "rows": len(self.df),
+            "base_riesgo": float(self.df["BASE RIESGO"].sum()),
+            "provision": float(self.df["PROVISION"].sum()),
+        }
+
+    def recompute(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Aplica las ediciones de matrices y recalcula solo las filas afectadas (solo en memoria;
+        el archivo Excel temporal se actualiza aparte, ver recompute_last_run).
+
+        Args:
+            edits: Campos guardados con éxito en /risk/matrices-save, con su
+                   'id_politica_base_riesgo'
+
+        Returns:
+            Dict[str, Any]: Filas recalculadas, totales antes y después y tiempo empleado.
+        """
+        t0 = time.perf_counter()
+        antes = self.totals()
+        df_matrices, indices, cambiadas, posiciones, nuevos = self._evaluate_edits(edits)
+        self.df_matrices = df_matrices
+        self.indice_avon_natura, self.indice_otros_tipos, self.plan_otros = indices
+
+        if len(posiciones):
+            # Se trabaja sobre una copia superficial que luego reemplaza a self.df: quien tenga
+            # una referencia al DataFrame anterior (por ejemplo run_scenarios_last_run) no lo ve cambiar
+            df = self.df.copy(deep=False)
+            for columna in ("FACTOR PROV", "BASE RIESGO", "PROVISION"):
+                valores = df[columna].to_numpy(dtype=float, copy=True)
+                valores[posiciones] = nuevos[columna].to_numpy(dtype=float)
+                df[columna] = valores
+
+            # 'CLAS BASE RIESGO' se actualiza por códigos para no convertir toda la columna a texto
+            clases = df["CLAS BASE RIESGO"].astype("category")
+            faltantes = pd.Index(nuevos["CLAS BASE RIESGO"].unique()).difference(
+                clases.cat.categories
+            )
+            clases = clases.cat.add_categories(faltantes)
+            codigos = clases.cat.codes.to_numpy(copy=True)
+            codigos[posiciones] = clases.cat.categories.get_indexer(nuevos["CLAS BASE RIESGO"])
+            df["CLAS BASE RIESGO"] = pd.Categorical.from_codes(
+                codigos, categories=clases.cat.categories
+            )
+            self.df = df
+            self.revision += 1
+
+        despues = self.totals()
+        return {
+            "rows_recomputed": int(len(posiciones)),
+            "changed_keys": len(cambiadas),
+            "previous_totals": antes,
+            "totals": despues,
+            "delta_provision": despues["provision"] - antes["provision"],
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+    def simulate(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Calcula el impacto de unas ediciones de matrices sin guardarlas ni modificar la corrida.
+
+        Args:
+            edits: Filas propuestas, con el mismo formato que /risk/matrices-save
+
+        Returns:
+            Dict[str, Any]: Filas afectadas, deltas totales, deltas agrupados por
+            SIMULATION_GROUP_COLUMNS y tiempo empleado.
+        """
+        t0 = time.perf_counter()
+        _, _, cambiadas, posiciones, nuevos = self._evaluate_edits(edits)
+
+        actuales = self.df.iloc[
+            posiciones, self.df.columns.get_indexer(SIMULATION_GROUP_COLUMNS + ["BASE RIESGO", "PROVISION"])
+        ]
+        deltas = actuales[SIMULATION_GROUP_COLUMNS].copy()
+        deltas["filas"] = 1
+        deltas["delta_base_riesgo"] = nuevos["BASE RIESGO"] - actuales["BASE RIESGO"]
+        deltas["delta_provision"] = nuevos["PROVISION"] - actuales["PROVISION"]
+        agrupado = (
+            deltas.groupby(SIMULATION_GROUP_COLUMNS, observed=True, dropna=False, sort=True)
+            .sum()
+            .reset_index()
+        )
+        agrupado = agrupado.astype(object).where(agrupado.notna(), None)
+
+        totales = self.totals()
+        delta_base_riesgo = float(deltas["delta_base_riesgo"].sum())
+        delta_provision = float(deltas["delta_provision"].sum())
+        return {
+            "rows_affected": int(len(posiciones)),
+            "changed_keys": len(cambiadas),
+            "totals": totales,
+            "simulated_totals": {
+                "rows": totales["rows"],
+                "base_riesgo": totales["base_riesgo"] + delta_base_riesgo,
+                "provision": totales["provision"] + delta_provision,
+            },
+            "delta_base_riesgo": delta_base_riesgo,
+            "delta_provision": delta_provision,
+            "deltas": agrupado.to_dict(orient="records"),
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+
+# Última corrida de /risk/process en este proceso
+_last_run: Optional[ProcessedRun] = None
+_lock = threading.Lock()
+# Un solo hilo reescribe los archivos temporales, en el orden en que se recalculan las corridas
+_temp_file_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-temp-file")
+
+
+def _write_temp_file(corrida: ProcessedRun, df: pd.DataFrame, revision: int) -> bool:
+    """
+    Vuelve a escribir el archivo Excel temporal de una corrida con una copia de sus filas.
+
+    /risk/save-to-db y /risk/data-view leen ese archivo, por lo que debe reflejar los
+    recálculos. No se escribe si ya hay una revisión más nueva en cola o si el archivo fue
+    eliminado (por ejemplo con /risk/delete-temp-file). Se escribe primero en un archivo
+    auxiliar y luego se reemplaza, para que nunca se lea un archivo a medio escribir.
+
+    Returns:
+        bool: True si se escribió el archivo.
+    """
+    temp_dir = os.environ.get("TEMP_DIR")
+    if not corrida.temp_file or not temp_dir or corrida.revision != revision:
+        return False
+    ruta = os.path.join(temp_dir, corrida.temp_file)
+    if not os.path.exists(ruta):
+        return False
+    parcial = os.path.join(temp_dir, f"~{corrida.temp_file}")
+    t0 = time.perf_counter()
+    try:
+        to_export_frame(df).to_excel(parcial, index=False)
+        if not os.path.exists(ruta):
+            os.remove(parcial)
+            return False
+        os.replace(parcial, ruta)
+    except Exception as e:
+        print(f"[run-cache] Error al reescribir el archivo temporal {corrida.temp_file}: {e}")
+        return False
+    print(
+        f"[run-cache] Archivo temporal {corrida.temp_file} reescrito en "
+        f"{time.perf_counter() - t0:.2f} s (revisión {revision})"
+    )
+    return True
+
+
+def wait_temp_file_writes(timeout: Optional[float] = None) -> None:
+    """
+    Espera a que terminen las reescrituras de archivos temporales en cola.
+
+    Llamar antes de leer o eliminar un archivo temporal, para no leer uno desactualizado
+    ni que una escritura pendiente lo vuelva a crear.
+
+    Args:
+        timeout: Segundos máximos de espera. Por defecto sin límite.
+    """
+    _temp_file_writer.submit(lambda: None).result(timeout)
+
+
+def store_last_run(
+    df: pd.DataFrame,
+    df_matrices_avon_natura: pd.DataFrame,
+    df_matrices_otros_tipos: pd.DataFrame,
+    temp_file: Optional[str] = None,
+) -> ProcessedRun:
+    """
+    Guarda en memoria la última corrida procesada y las matrices con las que se calculó.
+
+    Args:
+        df: Resultado final de la corrida
+        df_matrices_avon_natura: Resultado de df_matrices_avon_natura()
+        df_matrices_otros_tipos: Resultado de df_matrices_otros_tipos()
+        temp_file: Archivo Excel temporal de la corrida
+
+    Returns:
+        ProcessedRun: Corrida guardada.
+    """
+    global _last_run
+    df_matrices = pd.concat(
+        [df_matrices_avon_natura, df_matrices_otros_tipos], ignore_index=True
+    )
+    corrida = ProcessedRun(df, df_matrices, temp_file)
+    with _lock:
+        _last_run = corrida
+    return corrida
+
+
+def get_last_run() -> Optional[ProcessedRun]:
+    """
+    Retorna la última corrida guardada, o None si no hay ninguna.
+    """
+    return _last_run
+
+
+def recompute_last_run(edits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Recalcula la última corrida con las ediciones de matrices indicadas.
+
+    El recálculo se hace en memoria. Si cambia alguna fila, la reescritura del archivo Excel
+    temporal se deja en cola con una copia de las filas, fuera del candado, de modo que ni
+    esta llamada ni las simulaciones esperan a que se escriba (ver wait_temp_file_writes).
+
+    Args:
+        edits: Campos guardados con éxito en /risk/matrices-save, con su
+               'id_politica_base_riesgo'
+
+    Returns:
+        Optional[Dict[str, Any]]: Resumen del recálculo y si se dejó en cola la reescritura
+        del archivo temporal ('temp_file_refresh'), o None si no hay corrida guardada.
+    """
+    escritura: Optional[Future] = None
+    with _lock:
+        if _last_run is None:
+            return None
+        corrida = _last_run
+        resumen = corrida.recompute(edits)
+        if resumen["rows_recomputed"] and corrida.temp_file:
+            escritura = _temp_file_writer.submit(
+                _write_temp_file, corrida, corrida.df.copy(), corrida.revision
+            )
+    resumen["temp_file"] = corrida.temp_file
+    resumen["temp_file_refresh"] = escritura is not None
+    return resumen
+
+
+def simulate_last_run(edits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Simula sobre la última corrida el impacto de unas ediciones de matrices, sin guardarlas.
+
+    Args:
+        edits: Filas propuestas, con el mismo formato que /risk/matrices-save
+
+    Returns:
+        Optional[Dict[str, Any]]: Resumen de la simulación, o None si no hay corrida guardada.
+    """
+    with _lock:
+        if _last_run is None:
+            return None
+        return _last_run.simulate(edits)
+
+
+def run_scenarios_last_run(
+    scenarios: List[Scenario], dimension: str = "MARCA DE QM"
+) -> Optional[pd.DataFrame]:
+    """
+    Evalúa escenarios de estrés sobre la última corrida (ver run_scenarios).
+
+    Args:
+        scenarios: Escenarios a evaluar
+        dimension: Columna por la que se resume cada escenario (ver SCENARIO_DIMENSIONS)
+
+    Returns:
+        Optional[pd.DataFrame]: Resumen escenario × dimensión, o None si no hay corrida guardada.
+    """
+    # Se toman referencias bajo el candado y se evalúa fuera de él, para no bloquear los
+    # recálculos ni las simulaciones; recompute reemplaza el DataFrame en lugar de modificarlo
+    with _lock:
+        if _last_run is None:
+            return None
+        df = _last_run.df
+        indice_avon_natura = _last_run.indice_avon_natura
+        plan_otros = _last_run.plan_otros
+    return run_scenarios(df, scenarios, indice_avon_natura, plan_otros, dimension)
@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .schema import SapColumn
+
+#* AQUÍ SE ENCUENTRA LA DECODIFICACIÓN DIRECTA DE LOS RESULTADOS DE RRW3_GET_QUERY_VIEW_DATA
+#! PRODUCE EL MISMO DATAFRAME QUE SAPConnection.clean_data + data_structuring, SIN DATAFRAME LARGO NI pivot_table
+#! LAS CELDAS SE DECODIFICAN CON UN SOLO reshape EN LUGAR DE UN groupby POR MEDIDA
+#! CON UN ESQUEMA DECLARADO (SAP_OUTPUT_SCHEMA) SOLO SE MATERIALIZAN LAS COLUMNAS QUE SE USAN
+
+# Eje de filas de la consulta
+ROWS_AXIS = "001"
+
+
+def key_characteristics(axis_info: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Características clave (CHATYP '1') de la información de los ejes y su etiqueta.
+
+    Args:
+        axis_info: E_AXIS_INFO de la respuesta de SAP
+
+    Returns:
+        Dict[str, str]: CHANM → CAPTION. Si una característica aparece en varios ejes se
+        conserva la última etiqueta, igual que el renombrado de data_structuring.
+    """
+    caracteristicas: Dict[str, str] = {}
+    for axis in axis_info:
+        for char in axis.get("CHARS", []):
+            if char["CHATYP"] == "1":
+                caracteristicas[char["CHANM"]] = char["CAPTION"]
+    return caracteristicas
+
+
+def _fill_axis(
+    conjuntos: List[List[Dict[str, Any]]],
+    destinos: Dict[str, List[Tuple[str, int]]],
+    columnas: int,
+    capacidad: int,
+) -> Tuple[List[List[Any]], np.ndarray, Dict[int, Any], List[bool]]:
+    """
+    Recorre una sola vez los elementos del eje y escribe cada valor en la posición de su TUPLE_ORDINAL.
+
+    Args:
+        conjuntos: Listas 'SET' del eje a decodificar
+        destinos: CHANM → [(representación, columna)] para cada característica clave. Las
+            características sin destinos solo marcan la tupla como presente.
+        columnas: Número de columnas a llenar
+        capacidad: Número de tuplas estimado; los arreglos crecen si hay más.
+
+    Returns:
+        Tuple: (arreglos por columna, posiciones de las tuplas presentes en orden,
+        posición → TUPLE_ORDINAL original, columnas con al menos un valor).
+    """
+    valores: List[List[Any]] = [[np.nan] * capacidad for _ in range(columnas)]
+    presentes = [False] * capacidad
+    vistas = [False] * columnas
+    ordinales: Dict[Any, int] = {}
+
+    for conjunto in conjuntos:
+        for item in conjunto:
+            destino = destinos.get(item["CHANM"])
+            if destino is None:
+                continue
+            ordinal = item["TUPLE_ORDINAL"]
+            t = ordinales.get(ordinal)
+            if t is None:
+                t = ordinales[ordinal] = int(ordinal)
+                if t >= capacidad:
+                    # Más tuplas de las estimadas: se amplían los arreglos al doble
+                    extra = max(t + 1, 2 * capacidad) - capacidad
+                    for arreglo in valores:
+                        arreglo.extend([np.nan] * extra)
+                    presentes.extend([False] * extra)
+                    capacidad += extra
+                presentes[t] = True
+            for representacion, j in destino:
+                valores[j][t] = item[representacion]
+                vistas[j] = True
+
+    ordinal_de_posicion = {t: ordinal for ordinal, t in ordinales.items()}
+    return valores, np.flatnonzero(presentes), ordinal_de_posicion, vistas
+
+
+def _conjuntos_y_capacidad(
+    axis_data: List[Dict[str, Any]], axis: str, caracteristicas: int
+) -> Tuple[List[List[Dict[str, Any]]], int]:
+    """
+    Listas 'SET' del eje y número de tuplas estimado a partir del número de elementos.
+    """
+    conjuntos = [entry["SET"] for entry in axis_data if entry["AXIS"] == axis]
+    capacidad = max(sum(len(conjunto) for conjunto in conjuntos) // max(caracteristicas, 1), 1)
+    return conjuntos, capacidad
+
+
+def decode_axis_data(
+    axis_info: List[Dict[str, Any]],
+    axis_data: List[Dict[str, Any]],
+    representations: Sequence[str] = ("CAPTION", "CHAVL"),
+    axis: str = ROWS_AXIS,
+) -> pd.DataFrame:
+    """
+    Decodifica los datos del eje de filas en un DataFrame ancho con una sola pasada.
+
+    Se reserva un arreglo por cada (característica, representación) y cada elemento de
+    E_AXIS_DATA se escribe directamente en la posición de su TUPLE_ORDINAL. El resultado es
+    el mismo que el de clean_data + data_structuring: una fila por tupla en orden de
+    TUPLE_ORDINAL, columnas '<CAPTION>-<representación>' ordenadas por representación y
+    CHANM, el último valor ante repeticiones y sin las características que no aparecen.
+
+    Args:
+        axis_info: E_AXIS_INFO de la respuesta de SAP
+        axis_data: E_AXIS_DATA de la respuesta de SAP
+        representations: Campos de cada elemento a extraer (por ejemplo 'CAPTION' y 'CHAVL')
+        axis: Eje a decodificar. Por defecto el de filas ('001').
+
+    Returns:
+        pd.DataFrame: DataFrame con la columna 'TUPLE_ORDINAL' y una columna por
+        característica clave y representación.
+    """
+    caracteristicas = key_characteristics(axis_info)
+    chanms = sorted(caracteristicas)
+    representaciones = sorted(representations)
+
+    # Columnas en el orden de salida: por representación y después por CHANM
+    columnas = [(r, chanm) for r in representaciones for chanm in chanms]
+    destinos: Dict[str, List[Tuple[str, int]]] = {chanm: [] for chanm in chanms}
+    for j, (representacion, chanm) in enumerate(columnas):
+        destinos[chanm].append((representacion, j))
+
+    conjuntos, capacidad = _conjuntos_y_capacidad(axis_data, axis, len(chanms))
+    valores, filas, ordinal_de_posicion, vistas = _fill_axis(
+        conjuntos, destinos, len(columnas), capacidad
+    )
+
+    # Filas de las tuplas presentes en orden de TUPLE_ORDINAL
+    completas = len(valores) == 0 or len(filas) == len(valores[0])
+    nombres = ["TUPLE_ORDINAL"]
+    arreglos = [np.array([ordinal_de_posicion[t] for t in filas])]
+    for j, (representacion, chanm) in enumerate(columnas):
+        if not vistas[j]:
+            continue
+        arreglo = np.array(valores[j], dtype=object)
+        nombres.append(f"{caracteristicas[chanm]}-{representacion}")
+        arreglos.append(arreglo if completas else arreglo[filas])
+
+    # Dos características pueden tener la misma etiqueta: las columnas se asignan por posición
+    df = pd.DataFrame(dict(enumerate(arreglos)))
+    df.columns = nombres
+    return df
+
+
+def _typed_column(arreglo: np.ndarray, dtype: str) -> Any:
+    """
+    Convierte una columna decodificada al tipo declarado, con el texto en mayúsculas.
+
+    El paso a mayúsculas se hace una sola vez por valor distinto. Las categóricas quedan
+    con las categorías ordenadas, igual que astype("category").
+
+    Args:
+        arreglo: Valores de la columna (object, NaN donde la tupla no trae la característica)
+        dtype: 'object', 'category' o 'datetime64[ns]'
+
+    Returns:
+        Columna convertida (ndarray, Categorical o DatetimeIndex).
+    """
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(pd.Series(arreglo, dtype=object), errors="coerce").to_numpy()
+
+    codigos, unicos = pd.factorize(arreglo)
+    mayusculas = np.array([str(valor).upper() for valor in unicos], dtype=object)
+    if dtype == "object":
+        # La última posición corresponde a los nulos (código -1)
+        return np.append(mayusculas, np.nan)[codigos]
+
+    # Dos valores pueden coincidir al pasar a mayúsculas: se fusionan y se ordenan
+    codigos_mayus, categorias = pd.factorize(mayusculas)
+    orden = np.argsort(categorias, kind="stable")
+    rango = np.empty(len(orden), dtype=np.int64)
+    rango[orden] = np.arange(len(orden))
+    nuevos = np.append(rango[codigos_mayus], -1)[codigos]
+    return pd.Categorical.from_codes(nuevos, categories=categorias[orden])
+
+
+def decode_axis_columns(
+    axis_info: List[Dict[str, Any]],
+    axis_data: List[Dict[str, Any]],
+    columns: Sequence[SapColumn],
+    axis: str = ROWS_AXIS,
+) -> pd.DataFrame:
+    """
+    Decodifica solo las columnas declaradas del eje de filas, ya con su nombre y su tipo.
+
+    Funciona como decode_axis_data, pero solo se llenan los arreglos de las columnas del
+    esquema; el resto de características únicamente cuentan para saber qué tuplas existen.
+    Si dos características comparten etiqueta se usa la de menor CHANM, que era la primera
+    columna con ese nombre en la salida anterior. Las columnas declaradas cuya
+    característica no viene en E_AXIS_INFO se omiten; si viene pero sin valores, la
+    columna queda vacía.
+
+    Args:
+        axis_info: E_AXIS_INFO de la respuesta de SAP
+        axis_data: E_AXIS_DATA de la respuesta de SAP
+        columns: Columnas a materializar (por ejemplo SAP_OUTPUT_SCHEMA)
+        axis: Eje a decodificar. Por defecto el de filas ('001').
+
+    Returns:
+        pd.DataFrame: Una fila por tupla en orden de TUPLE_ORDINAL y una columna por
+        columna declarada presente, en el orden del esquema.
+    """
+    caracteristicas = key_characteristics(axis_info)
+    chanm_de_etiqueta: Dict[str, str] = {}
+    for chanm in sorted(caracteristicas, reverse=True):
+        chanm_de_etiqueta[caracteristicas[chanm]] = chanm
+
+    destinos: Dict[str, List[Tuple[str, int]]] = {chanm: [] for chanm in caracteristicas}
+    declaradas: List[SapColumn] = []
+    for columna in columns:
+        chanm = chanm_de_etiqueta.get(columna.caption)
+        if chanm is None:
+            continue
+        destinos[chanm].append((columna.representation, len(declaradas)))
+        declaradas.append(columna)
+
+    conjuntos, capacidad = _conjuntos_y_capacidad(axis_data, axis, len(caracteristicas))
+    valores, filas, _, _ = _fill_axis(conjuntos, destinos, len(declaradas), capacidad)
+
+    completas = len(valores) == 0 or len(filas) == len(valores[0])
+    arreglos = []
+    for j, columna in enumerate(declaradas):
+        arreglo = np.array(valores[j], dtype=object)
+        arreglos.append(_typed_column(arreglo if completas else arreglo[filas], columna.dtype))
+
+    df = pd.DataFrame(dict(enumerate(arreglos)), index=pd.RangeIndex(len(filas)))
+    df.columns = [columna.name for columna in declaradas]
+    return df
+
+
+def decode_cell_data(
+    cell_data: List[Dict[str, Any]],
+    column_names: Sequence[str],
+    tuples: Optional[int] = None,
+    numeric: bool = True,
+) -> pd.DataFrame:
+    """
+    Decodifica E_CELL_DATA en un DataFrame de (tuplas × medidas) con una sola pasada.
+
+    Las celdas llegan en orden de CELL_ORDINAL, tupla por tupla y medida por medida. Los
+    VALUE se leen a un arreglo contiguo, se convierten a número en el mismo paso y se
+    reorganizan con reshape, en lugar de un groupby(...).nth(i) por cada medida.
+
+    Args:
+        cell_data: E_CELL_DATA de la respuesta de SAP
+        column_names: Nombres de las medidas, en el orden en que las devuelve la consulta
+        tuples: Número de tuplas esperado (filas decodificadas del eje). Si se indica, se
+            valida que haya exactamente tuples × medidas celdas.
+        numeric: Si es True, los valores se convierten con pd.to_numeric(errors="coerce");
+            si es False se conservan las cadenas de SAP.
+
+    Returns:
+        pd.DataFrame: Una fila por tupla y una columna por medida.
+
+    Raises:
+        ValueError: Si el número de celdas no es múltiplo del número de medidas o no
+            corresponde con el número de tuplas esperado.
+    """
+    medidas = len(column_names)
+    total = len(cell_data)
+    if medidas == 0 or total % medidas:
+        raise ValueError(
+            f"E_CELL_DATA tiene {total} celdas, que no es múltiplo de {medidas} medidas"
+        )
+    if tuples is not None and total != tuples * medidas:
+        raise ValueError(
+            f"E_CELL_DATA tiene {total} celdas y se esperaban {tuples} tuplas × {medidas} medidas"
+        )
+
+    valores = np.fromiter((cell["VALUE"] for cell in cell_data), dtype=object, count=total)
+    if numeric:
+        valores = pd.to_numeric(valores, errors="coerce")
+
+    return pd.DataFrame(valores.reshape(total // medidas, medidas), columns=list(column_names))
@@ -1,10 +1,20 @@
-from pyrfc._cyrfc import Connection, ABAPApplicationError
 import pandas as pd
 import numpy as np
-from typing import List
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from .schema import (
+    is_categorical,
+    transform_categories,
+    concat_categorical,
+    SAP_OUTPUT_SCHEMA,
+    SAP_MEASURE_COLUMNS,
+)
+from .sap_decoding import decode_axis_data, decode_axis_columns, decode_cell_data
+from .sap_pool import SAPConnectionPool, get_sap_pool, sap_connection_params
+from .sap_replay import ABAPApplicationError, SHARD_PARAMETER_PREFIX, rfc_connection
 
 # Carga las variables de entorno desde el archivo .env
 load_dotenv()
@@ -13,7 +23,7 @@ load_dotenv()
 #! NO ES NECESARIO REALIZAR MODIFICACIONES EN ESTAS FUNCIONES
 
 class SAPConnection:
-    def __init__(self, ashost, sysnr, client, user, passwd, lang):
+    def __init__(self, ashost, sysnr, client, user, passwd, lang, pool: Optional[SAPConnectionPool] = None):
         """
         Inicializa la conexión a SAP con los parámetros de conexión necesarios.
         
@@ -24,6 +34,8 @@ class SAPConnection:
             user (str): Usuario para la conexión a SAP.
             passwd (str): Contraseña del usuario.
             lang (str): Idioma para la conexión (ej. 'ES' para español).
+            pool (SAPConnectionPool, opcional): Pool del que se toman las conexiones. Si se indica,
+                las consultas reutilizan sus conexiones en lugar de abrir y cerrar una por consulta.
         """
         self.connection_params = {
             'ashost': ashost,
@@ -34,6 +46,7 @@ class SAPConnection:
             'lang': lang
         }
         self.connection = None
+        self.pool = pool
 
     def open_connection(self):
         """
@@ -43,7 +56,7 @@ class SAPConnection:
             Connection: Objeto de conexión a SAP activo.
         """
         if self.connection is None:
-            self.connection = Connection(**self.connection_params)
+            self.connection = rfc_connection(**self.connection_params)
         return self.connection
 
     def close_connection(self):
@@ -58,9 +71,9 @@ class SAPConnection:
         """
         Ejecuta una consulta a SAP con parámetros dinámicos utilizando la función RRW3_GET_QUERY_VIEW_DATA.
 
-        Esta función abre una conexión a SAP, formatea los parámetros recibidos al formato requerido
-        por SAP BW, ejecuta la consulta y maneja posibles errores. Imprime información de depuración
-        sobre los parámetros enviados y el estado de la ejecución.
+        Esta función toma una conexión del pool (o abre una si no hay pool), formatea los parámetros
+        recibidos al formato requerido por SAP BW, ejecuta la consulta y maneja posibles errores.
+        Imprime información de depuración sobre los parámetros enviados y el estado de la ejecución.
 
         Args:
             query_name (str): Nombre del query SAP a ejecutar.
@@ -71,7 +84,6 @@ class SAPConnection:
             dict: Diccionario con los resultados de la consulta si es exitosa, None si ocurre un error.
                  El diccionario contiene claves como 'E_AXIS_INFO', 'E_AXIS_DATA' y 'E_CELL_DATA'.
         """
-        self.open_connection()
         # Construir la lista de parámetros dinámicamente
         formatted_parameters = [{"NAME": p[0], "VALUE": p[1]} for p in parameters]
         formatted_parameters += [
@@ -82,8 +94,25 @@ class SAPConnection:
             print(f"{param['NAME']} = {param['VALUE']}")
 
 
+        if self.pool is not None:
+            # La conexión vuelve al pool al terminar; si falla la comunicación se descarta
+            with self.pool.connection() as connection:
+                return self._call_query(connection, query_name, view_id, formatted_parameters)
+
+        try:
+            return self._call_query(self.open_connection(), query_name, view_id, formatted_parameters)
+        finally:
+            self.close_connection()
+
+    def _call_query(self, connection, query_name, view_id, formatted_parameters):
+        """
+        Llama a RRW3_GET_QUERY_VIEW_DATA sobre una conexión abierta.
+
+        Returns:
+            dict: Resultado de la consulta, None si SAP responde con un error de aplicación.
+        """
         try: 
-            result = self.connection.call(
+            result = connection.call(
                 "RRW3_GET_QUERY_VIEW_DATA",
                 I_QUERY=query_name,
                 I_VIEW_ID=view_id,
@@ -94,8 +123,6 @@ class SAPConnection:
         except ABAPApplicationError as error:
             print("Error en SAP: " + error.message)
             return None
-        finally:
-            self.close_connection()
 
     def extract_axis_data(self, axis_data):
         """
@@ -259,194 +286,198 @@ class SAPConnection:
         Returns:
             pd.DataFrame: DataFrame con los datos extraídos y estructurados según las columnas especificadas.
         """
-        self.open_connection()
         raw_data = self.execute_query(query_name, view_id, params)
 
 
-        # Obtenemos diccionario con los nombres originales de las columnas
-        axis_info = self.extract_axis_info(raw_data['E_AXIS_INFO'])
-        # Obtenemos información combinada y transformada
-        data_clean = self.clean_data(raw_data['E_AXIS_DATA'], raw_data['E_CELL_DATA'])
-        # Estructuramos columnas y filas para un mejor entendimiento y visualización
-        df_final_axis_values = self.data_structuring(data_clean, axis_info, ['CAPTION','CHAVL','VALUE']) #kevin
+        # Decodificamos las filas directamente a partir de la información de los ejes
+        df_final_axis_values = decode_axis_data(raw_data['E_AXIS_INFO'], raw_data['E_AXIS_DATA'], ['CAPTION','CHAVL'])
         
-        for record in raw_data['E_CELL_DATA']:
-            print(record)
-        
-        # Extraer los datos de las celdas del cubo y organizarlos en un DataFrame
-        cell_records = [
-            {'CELL_ORDINAL': record['CELL_ORDINAL'], 'VALUE': record['VALUE']}
-            for record in raw_data['E_CELL_DATA']
-        ]
-        df_final_cell = pd.DataFrame(cell_records)
+        # Decodificar las celdas del cubo en un DataFrame con las columnas ordenadas de acuerdo a `column_names`
+        df_final_cell_values = decode_cell_data(
+            raw_data['E_CELL_DATA'], column_names, tuples=len(df_final_axis_values)
+        )
+        return df_final_cell_values
 
-        df_final_cell['Group'] = df_final_cell.index // (len(column_names))
 
-        # Generar el DataFrame con las columnas ordenadas de acuerdo a `column_names`
-        df_final_cell_values = pd.DataFrame({
-            name: df_final_cell.groupby('Group')['VALUE'].nth(i).values
-            for i, name in enumerate(column_names)
-        })
-        return df_final_cell_values
+#* EXTRACCIÓN POR FRAGMENTOS: LA CONSULTA SE PARTE CON UNA VARIABLE BW ADICIONAL (POR EJEMPLO CENTRO)
+#! CADA FRAGMENTO SE CONSULTA EN UN HILO CON UNA CONEXIÓN DEL POOL Y SE DECODIFICA APENAS LLEGA
+
+# Variable BW por la que se fragmenta la consulta (vacía = una sola consulta) y sus valores.
+# SAP_SHARDS es una lista separada por comas de valores ('1000') o rangos ('1000:1999').
+SAP_SHARD_VARIABLE = os.getenv("SAP_SHARD_VARIABLE", "")
+SAP_SHARDS = os.getenv("SAP_SHARDS", "")
+SAP_SHARD_WORKERS = int(os.getenv("SAP_SHARD_WORKERS", "0"))  # 0 = tamaño del pool
 
+# Número de la variable que se agrega a los parámetros de la consulta para fragmentarla
+SHARD_VARIABLE_INDEX = 7
 
-def get_data_sap():
+
+def parse_shards(text: str) -> List[Tuple[str, str]]:
     """
-    Conecta a SAP y obtiene el stock del mes actual, procesando y estructurando los datos.
-    
-    Esta función crea una conexión a SAP utilizando las credenciales almacenadas en variables de entorno,
-    ejecuta una consulta para obtener los datos de stock del mes actual, y procesa los resultados
-    para generar un DataFrame estructurado con la información relevante.
-    
+    Interpreta la lista de fragmentos de SAP_SHARDS.
+
+    Args:
+        text: Valores separados por comas; cada uno es un valor único ('1000') o un rango
+              'desde:hasta' ('1000:1999').
+
     Returns:
-        pd.DataFrame: DataFrame con la información de stock procesada y estructurada, con columnas
-                      estandarizadas y datos convertidos a los tipos apropiados.
+        List[Tuple[str, str]]: Lista de (valor desde, valor hasta).
     """
-    today = datetime.now()
-    month = today.strftime("%m.%Y") #! LA VISTA SOLO SE CONSULTA POR MES Y AÑO
+    fragmentos = []
+    for parte in text.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        desde, _, hasta = parte.partition(":")
+        fragmentos.append((desde.strip(), (hasta or desde).strip()))
+    return fragmentos
 
-    sap_conn = SAPConnection(
-        ashost=os.getenv("ASHOST"),
-        sysnr=os.getenv("SYSNR"),
-        client=os.getenv("CLIENT"),
-        user=os.getenv("USER_SAP"),
-        passwd=os.getenv("PASSWORD_SAP"),
-        lang="ES",
-    )
 
-    params = [
-        ("VAR_ID_6", "0I_CMNTH                      0004"),
-        ("VAR_VALUE_LOW_EXT_6", month),
-        ("VAR_VALUE_HIGH_EXT_6", month),
+def shard_parameters(params: list, variable: str, low: str, high: str) -> list:
+    """
+    Parámetros de la consulta con la restricción de un fragmento sobre la variable indicada.
+
+    Args:
+        params: Parámetros base en formato (nombre, valor)
+        variable: Nombre técnico de la variable BW (por ejemplo la de Centro)
+        low: Valor desde
+        high: Valor hasta
+
+    Returns:
+        list: Parámetros base más VAR_NAME/VAR_VALUE_LOW_EXT/VAR_VALUE_HIGH_EXT del fragmento.
+    """
+    n = SHARD_VARIABLE_INDEX
+    return list(params) + [
+        (f"{SHARD_PARAMETER_PREFIX}{n}", variable),
+        (f"VAR_VALUE_LOW_EXT_{n}", low),
+        (f"VAR_VALUE_HIGH_EXT_{n}", high),
     ]
 
-    result = sap_conn.execute_query("ZICM_CM03_Q001", "Z_BASE_RIESGO", params)
 
-    # Primero extraemos la informacion de los ejes y los limpiamos
-    axis_info = sap_conn.extract_axis_info(result["E_AXIS_INFO"])
+def decode_query_result(result: dict) -> pd.DataFrame:
+    """
+    Decodifica la respuesta de Z_BASE_RIESGO en el DataFrame de stock.
 
-    # Limpia los datos de la consulta y la informacion de las celdas
-    data_clean = sap_conn.clean_data(result["E_AXIS_DATA"], result["E_CELL_DATA"])
+    Args:
+        result: Respuesta de RRW3_GET_QUERY_VIEW_DATA
 
-    # Con la informacion de los ejes, estructuramos los datos para que se ajusten a la estructura de un DataFrame
-    df_final_axis_values = sap_conn.data_structuring(
-        data_clean, axis_info, ["CAPTION", "CHAVL"]
+    Returns:
+        pd.DataFrame: Columnas de SAP_OUTPUT_SCHEMA seguidas de las medidas de SAP_MEASURE_COLUMNS.
+    """
+    # Con la informacion de los ejes, decodificamos solo las columnas declaradas en SAP_OUTPUT_SCHEMA,
+    # ya con su nombre final, en mayusculas y con su tipo (categoricas y fechas en datetime64)
+    df_final_axis_values = decode_axis_columns(
+        result["E_AXIS_INFO"], result["E_AXIS_DATA"], SAP_OUTPUT_SCHEMA
     )
 
-    # Estos son los nombres de las columnas que se van a crear en el DataFrame final
-    column_names = ['Costo Unitario Real',
-                    'Inventario Disponibl', 
-                    'Inventario No Dispon', 
-                    'Valor OBSOLETO', 
-                    'Valor BLOQUEADO MM', 
-                    'Valor Total MM', 
-                    'Permanencia'
-                ]
-
-    # Con la informacion de las celdas, creamos un diccionario que contiene los valores de cada celda
-    cell_records = [
-        {'CELL_ORDINAL': record['CELL_ORDINAL'], 'VALUE': record['VALUE']}
-        for record in result['E_CELL_DATA']
-    ]
-
-    # Con el diccionario, creamos un DataFrame que contiene los valores de las celdas
-    df_final_cell = pd.DataFrame(cell_records)
+    # Con la informacion de las celdas, leemos los valores en orden y los reorganizamos en
+    # (tuplas × medidas), convirtiendolos a numero en el mismo paso
+    df_final_cell_values = decode_cell_data(
+        result['E_CELL_DATA'], SAP_MEASURE_COLUMNS, tuples=len(df_final_axis_values)
+    )
 
-    # Agregamos una columna 'Group' que indica a que grupo pertenece cada celda. Se hace con // (divisin entera)
-    df_final_cell['Group'] = df_final_cell.index // (len(column_names))
+    # Finalmente, concatenamos los dos DataFrames en uno solo, con la informacion de los ejes y los valores de las celdas
+    return pd.concat([df_final_axis_values, df_final_cell_values], axis=1)
+
+
+def extract_sharded(
+    sap_conn: "SAPConnection",
+    query_name: str,
+    view_id: str,
+    params: list,
+    variable: str,
+    shards: List[Tuple[str, str]],
+    workers: int = 0,
+) -> pd.DataFrame:
+    """
+    Ejecuta la consulta por fragmentos en paralelo y concatena los resultados decodificados.
 
-    # Creamos un nuevo DataFrame que contiene los valores de las celdas agrupados por el grupo
-    df_final_cell_values = pd.DataFrame({
-        name: df_final_cell.groupby('Group')['VALUE'].nth(i).values
-        for i, name in enumerate(column_names)
-    })
+    Cada hilo consulta un fragmento con una conexión del pool y lo decodifica apenas llega,
+    de modo que la respuesta cruda de cada fragmento se libera antes de terminar la
+    extracción: la memoria máxima depende del tamaño del fragmento y no del mes completo.
 
-    # Finalmente, concatenamos los dos DataFrames en uno solo, con la informacion de los ejes y los valores de las celdas
-    df_final_combined = pd.concat([df_final_axis_values, df_final_cell_values], axis=1)
+    Args:
+        sap_conn: Conexión con pool (SAPConnection(..., pool=...))
+        query_name: Nombre del query SAP
+        view_id: ID de la vista SAP
+        params: Parámetros base de la consulta
+        variable: Variable BW por la que se fragmenta
+        shards: Lista de (desde, hasta) de cada fragmento
+        workers: Hilos a usar; 0 usa el tamaño del pool
 
-    # Renombrar columnas
-    df_final_combined = df_final_combined.rename(
-        columns={
-            'Material-CAPTION': 'Descripción', 
-        }
-    )
+    Returns:
+        pd.DataFrame: Resultados de todos los fragmentos en el orden de shards.
 
-    # Eliminar columnas innecesarias
-    df_final_combined = df_final_combined.drop(
-        columns=[
-            "TUPLE_ORDINAL",
-            "Lote-CAPTION",
-            "Fecha entrada-CAPTION",
-            "Centro-CAPTION",
-            "Unidad medida-CAPTION",
-            "Codigo Almacen Cliente-CAPTION",
-            "Rango Cobertura-CAPTION",
-            "Creado el-CAPTION",
-            "Fecha Bloqueado-CAPTION",
-            "Fecha Obsoleto-CAPTION",
-            "Fech. Fabricación-CAPTION",
-            "Rango de Permanencia-CAPTION",
-            "Rango Bloqueado-CAPTION",
-            "Rango Vencidos-CAPTION",
-            "Rango Obsoleto-CAPTION",
-            "Rango Próximos a Ven-CAPTION",
-            "Rango Próx.Vencer MM-CAPTION",
-            "Fech, Caducidad/Fech Pref. Consumo-CAPTION",
-            "Año natural/Mes-CHAVL",
-            "Indicador Stock Espec.-CHAVL",
-            "Marca de QM-CHAVL",
-            "Tipo Material Inventario-CHAVL",
-            "Negocio Inventarios-CHAVL",
-            "Tipo de Material (I)-CHAVL",
-            "Núm.stock.esp.-CHAVL",
-        ]
-    )
+    Raises:
+        RuntimeError: Si SAP no retorna datos para algún fragmento.
+    """
+    def extraer(fragmento: Tuple[str, str]) -> pd.DataFrame:
+        desde, hasta = fragmento
+        result = sap_conn.execute_query(
+            query_name, view_id, shard_parameters(params, variable, desde, hasta)
+        )
+        if result is None:
+            raise RuntimeError(f"SAP no retornó datos para el fragmento {variable} {desde}-{hasta}")
+        df = decode_query_result(result)
+        print(f"[sap-shards] Fragmento {desde}-{hasta}: {len(df)} filas")
+        return df
+
+    limite = sap_conn.pool.max_size if sap_conn.pool is not None else 1
+    hilos = max(1, min(len(shards), workers or limite))
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        frames = list(executor.map(extraer, shards))
+
+    # Un fragmento puede no traer alguna característica: todos quedan con las mismas columnas
+    columnas = [c.name for c in SAP_OUTPUT_SCHEMA] + SAP_MEASURE_COLUMNS
+    columnas = [c for c in columnas if any(c in frame.columns for frame in frames)]
+    frames = [frame if list(frame.columns) == columnas else frame.reindex(columns=columnas) for frame in frames]
+
+    # Las categorías de cada fragmento son distintas: se unifican para conservar las categóricas
+    return concat_categorical(frames)
+
+
+def get_data_sap(
+    shard_variable: Optional[str] = None,
+    shards: Optional[List[Tuple[str, str]]] = None,
+):
+    """
+    Conecta a SAP y obtiene el stock del mes actual, procesando y estructurando los datos.
+    
+    Esta función crea una conexión a SAP utilizando las credenciales almacenadas en variables de entorno,
+    ejecuta una consulta para obtener los datos de stock del mes actual, y procesa los resultados
+    para generar un DataFrame estructurado con la información relevante. Si hay una variable de
+    fragmentación configurada, la consulta se parte en fragmentos que se extraen en paralelo.
 
-    # Eliminar sufijos de los nombres de columnas
-    df_final_combined.columns = df_final_combined.columns.str.replace("-CHAVL", "").str.replace(
-        "-CAPTION", ""
-    )
+    Args:
+        shard_variable (str, opcional): Variable BW para fragmentar. Por defecto SAP_SHARD_VARIABLE.
+        shards (List[Tuple[str, str]], opcional): Fragmentos (desde, hasta). Por defecto SAP_SHARDS.
+    
+    Returns:
+        pd.DataFrame: DataFrame con la información de stock procesada y estructurada, con columnas
+                      estandarizadas y datos convertidos a los tipos apropiados.
+    """
+    today = datetime.now()
+    month = today.strftime("%m.%Y") #! LA VISTA SOLO SE CONSULTA POR MES Y AÑO
 
-    # Convertir todas las columnas a mayúsculas
-    df_final_combined = df_final_combined.apply(
-        lambda x: x.str.upper() if x.dtype == "object" else x
-    )
-    df_final_combined.columns = df_final_combined.columns.str.upper()
-
-    # Convertir columnas numéricas
-    columnas_numericas = [
-        "COSTO UNITARIO REAL",
-        "INVENTARIO DISPONIBL",
-        "INVENTARIO NO DISPON",
-        "VALOR OBSOLETO",
-        "VALOR BLOQUEADO MM",
-        "VALOR TOTAL MM",
-        "PERMANENCIA",
-    ]
+    # Las conexiones se toman del pool compartido del proceso, sin un logon RFC por solicitud
+    sap_conn = SAPConnection(**sap_connection_params(), pool=get_sap_pool())
 
-    for col in columnas_numericas:
-        if col in df_final_combined.columns:
-            df_final_combined[col] = pd.to_numeric(df_final_combined[col], errors="coerce")
-
-    # Convertir columnas de fechas
-    columnas_fecha = [
-        "FECHA ENTRADA",
-        "CREADO EL",
-        "FECHA BLOQUEADO",
-        "FECHA OBSOLETO",
-        "FECH. FABRICACIÓN",
-        "FECH, CADUCIDAD/FECH PREF. CONSUMO",
+    params = [
+        ("VAR_ID_6", "0I_CMNTH                      0004"),
+        ("VAR_VALUE_LOW_EXT_6", month),
+        ("VAR_VALUE_HIGH_EXT_6", month),
     ]
 
-    for col in columnas_fecha:
-        if col in df_final_combined.columns:
-            df_final_combined[col] = pd.to_datetime(
-                df_final_combined[col], errors="coerce"
-            ).dt.strftime("%d/%m/%Y")
+    variable = SAP_SHARD_VARIABLE if shard_variable is None else shard_variable
+    fragmentos = parse_shards(SAP_SHARDS) if shards is None else shards
+    if variable and fragmentos:
+        return extract_sharded(
+            sap_conn, "ZICM_CM03_Q001", "Z_BASE_RIESGO", params, variable, fragmentos,
+            workers=SAP_SHARD_WORKERS,
+        )
 
-    df_final_combined = pd.DataFrame(df_final_combined)
-
-    return df_final_combined
+    result = sap_conn.execute_query("ZICM_CM03_Q001", "Z_BASE_RIESGO", params)
+    return decode_query_result(result)
 
 
 def filter_avon_natura(df: pd.DataFrame) -> pd.DataFrame:
@@ -482,7 +513,10 @@ def filter_marca_otros(df: pd.DataFrame) -> pd.DataFrame:
     """
     # Aseguramos uniformidad en mayúsculas
     df = df.copy()
-    df["MARCA DE QM"] = df["MARCA DE QM"].str.upper()
+    if is_categorical(df["MARCA DE QM"]):
+        df["MARCA DE QM"] = transform_categories(df["MARCA DE QM"], lambda c: c.str.upper())
+    else:
+        df["MARCA DE QM"] = df["MARCA DE QM"].str.upper()
     
     # Filtramos inversamente
     mask = ~df["MARCA DE QM"].isin(["AVON", "NATURA"])
@@ -0,0 +1,283 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from contextlib import contextmanager
+import threading
+import time
+import os
+from dotenv import load_dotenv
+
+from .sap_replay import rfc_connection
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA EL POOL DE CONEXIONES RFC A SAP
+#! CADA LOGON RFC ES COSTOSO: LAS CONEXIONES SE REUTILIZAN ENTRE CONSULTAS Y SE COMPARTEN EN EL PROCESO DEL API
+
+# Configuración por variables de entorno
+SAP_POOL_SIZE = int(os.getenv("SAP_POOL_SIZE", "4"))
+SAP_POOL_IDLE_TIMEOUT = float(os.getenv("SAP_POOL_IDLE_TIMEOUT", "300"))  # segundos
+SAP_POOL_ACQUIRE_TIMEOUT = float(os.getenv("SAP_POOL_ACQUIRE_TIMEOUT", "120"))  # segundos
+
+
+class SAPConnectionPool:
+    """
+    Pool acotado de conexiones RFC a SAP.
+
+    Mantiene hasta max_size conexiones abiertas. Una conexión libre se reutiliza en la
+    siguiente consulta; antes de entregarla se descarta si lleva más de idle_timeout
+    segundos sin usarse o si no responde a ping(). Si todas las conexiones están en uso,
+    acquire espera a que se libere una.
+
+    La fábrica recibe los parámetros de conexión como argumentos con nombre y debe
+    retornar un objeto con call(), ping() y close(), como pyrfc.Connection; en pruebas se
+    puede pasar una conexión falsa.
+    """
+
+    def __init__(
+        self,
+        connection_params: Dict[str, Any],
+        max_size: int = SAP_POOL_SIZE,
+        idle_timeout: float = SAP_POOL_IDLE_TIMEOUT,
+        factory: Optional[Callable[..., Any]] = None,
+        health_check: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Inicializa el pool sin abrir conexiones; se abren a medida que se necesitan.
+
+        Args:
+            connection_params (Dict[str, Any]): Parámetros de la conexión (ashost, sysnr, client, user, passwd, lang).
+            max_size (int): Máximo de conexiones abiertas a la vez.
+            idle_timeout (float): Segundos que una conexión puede estar libre antes de cerrarse.
+            factory (Callable, opcional): Función que abre una conexión. Por defecto rfc_connection
+                (pyrfc.Connection, o grabación/reproducción según SAP_RFC_MODE).
+            health_check (bool): Si es True, se hace ping() a la conexión antes de reutilizarla.
+            clock (Callable): Reloj en segundos (por defecto time.monotonic).
+
+        Raises:
+            ValueError: Si max_size es menor que 1.
+        """
+        if max_size < 1:
+            raise ValueError("El pool de SAP necesita al menos una conexión")
+        self.connection_params = dict(connection_params)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.factory = factory or rfc_connection
+        self.health_check = health_check
+        self.clock = clock
+
+        self._condition = threading.Condition()
+        # Conexiones libres con el instante en que se liberaron; la última liberada se reutiliza primero
+        self._idle: List[Tuple[Any, float]] = []
+        self._size = 0
+        self._closed = False
+        self._stats = {"created": 0, "reused": 0, "discarded": 0, "waits": 0}
+
+    def _discard(self, connection: Any) -> None:
+        """
+        Cierra una conexión sin propagar errores (se usa con conexiones vencidas o caídas).
+        """
+        try:
+            connection.close()
+        except Exception as error:
+            print(f"[sap-pool] Error al cerrar una conexión: {error}")
+
+    def _is_alive(self, connection: Any) -> bool:
+        """
+        Indica si una conexión libre sigue respondiendo.
+        """
+        if not self.health_check:
+            return True
+        try:
+            connection.ping()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout: Optional[float] = SAP_POOL_ACQUIRE_TIMEOUT) -> Any:
+        """
+        Entrega una conexión del pool, reutilizando una libre o abriendo una nueva.
+
+        Args:
+            timeout (float, opcional): Segundos máximos de espera si el pool está lleno. None espera sin límite.
+
+        Returns:
+            Conexión abierta. Debe devolverse con release().
+
+        Raises:
+            RuntimeError: Si el pool está cerrado.
+            TimeoutError: Si no se libera ninguna conexión dentro del tiempo de espera.
+        """
+        limite = None if timeout is None else self.clock() + timeout
+        while True:
+            vencidas = []
+            candidata = None
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("El pool de conexiones de SAP está cerrado")
+                ahora = self.clock()
+                while self._idle:
+                    connection, liberada = self._idle.pop()
+                    if ahora - liberada > self.idle_timeout:
+                        vencidas.append(connection)
+                        self._size -= 1
+                        continue
+                    candidata = connection
+                    break
+                crear = candidata is None and self._size < self.max_size
+                if crear:
+                    self._size += 1
+                if candidata is None and not crear:
+                    self._stats["waits"] += 1
+                    restante = None if limite is None else limite - self.clock()
+                    if restante is not None and restante <= 0:
+                        raise TimeoutError(
+                            f"No hay conexiones libres a SAP tras {timeout} segundos "
+                            f"({self.max_size} en uso)"
+                        )
+                    self._condition.wait(restante)
+
+            # Cierre, ping y logon fuera del candado para no bloquear a los demás hilos
+            for connection in vencidas:
+                self._discard(connection)
+            with self._condition:
+                self._stats["discarded"] += len(vencidas)
+
+            if candidata is not None:
+                if self._is_alive(candidata):
+                    with self._condition:
+                        self._stats["reused"] += 1
+                    return candidata
+                self._discard(candidata)
+                with self._condition:
+                    self._size -= 1
+                    self._stats["discarded"] += 1
+                    self._condition.notify()
+                continue
+
+            if crear:
+                try:
+                    connection = self.factory(**self.connection_params)
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._stats["created"] += 1
+                return connection
+
+    def release(self, connection: Any, discard: bool = False) -> None:
+        """
+        Devuelve una conexión al pool.
+
+        Args:
+            connection: Conexión entregada por acquire().
+            discard (bool): Si es True la conexión se cierra en lugar de reutilizarse
+                            (por ejemplo tras un error de comunicación).
+        """
+        with self._condition:
+            cerrar = discard or self._closed
+            if cerrar:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((connection, self.clock()))
+            self._condition.notify()
+        if cerrar:
+            self._discard(connection)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = SAP_POOL_ACQUIRE_TIMEOUT):
+        """
+        Conexión del pool para usar con 'with'; se devuelve al salir del bloque.
+
+        Si el bloque termina con una excepción la conexión se descarta, porque no se puede
+        saber si quedó en un estado válido.
+
+        Args:
+            timeout (float, opcional): Igual que en acquire().
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def close(self) -> None:
+        """
+        Cierra las conexiones libres y rechaza nuevas solicitudes. Las conexiones en uso se
+        cierran cuando se devuelven.
+        """
+        with self._condition:
+            self._closed = True
+            libres = [connection for connection, _ in self._idle]
+            self._idle = []
+            self._size -= len(libres)
+            self._stats["discarded"] += len(libres)
+            self._condition.notify_all()
+        for connection in libres:
+            self._discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estado del pool.
+
+        Returns:
+            Dict[str, Any]: Conexiones abiertas, libres y en uso, y contadores de conexiones
+            creadas, reutilizadas, descartadas y esperas.
+        """
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "open": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self._stats,
+            }
+
+
+# Pool compartido por el proceso del API
+_pool: Optional[SAPConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def sap_connection_params() -> Dict[str, Any]:
+    """
+    Parámetros de conexión a SAP tomados de las variables de entorno.
+    """
+    return {
+        "ashost": os.getenv("ASHOST"),
+        "sysnr": os.getenv("SYSNR"),
+        "client": os.getenv("CLIENT"),
+        "user": os.getenv("USER_SAP"),
+        "passwd": os.getenv("PASSWORD_SAP"),
+        "lang": "ES",
+    }
+
+
+def get_sap_pool() -> SAPConnectionPool:
+    """
+    Retorna el pool de conexiones compartido, creándolo en la primera llamada.
+
+    Returns:
+        SAPConnectionPool: Pool con las credenciales de las variables de entorno.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SAPConnectionPool(sap_connection_params())
+        return _pool
+
+
+def close_sap_pool() -> None:
+    """
+    Cierra el pool compartido (por ejemplo al apagar el API). La siguiente llamada a
+    get_sap_pool() crea uno nuevo.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
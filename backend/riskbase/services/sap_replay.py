@@ -0,0 +1,343 @@
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración del logger para este módulo
+logger = logging.getLogger(__name__)
+
+#* AQUÍ SE ENCUENTRA LA GRABACIÓN Y REPRODUCCIÓN DE RESPUESTAS DE SAP (RRW3_GET_QUERY_VIEW_DATA)
+#! CON SAP_RFC_MODE=replay SE PUEDE EJECUTAR get_data_sap SIN SAP NI pyrfc (PRUEBAS Y BENCHMARKS OFFLINE)
+
+try:
+    from pyrfc._cyrfc import Connection, ABAPApplicationError
+
+    PYRFC_AVAILABLE = True
+except ImportError:  # Sin el SDK de SAP solo se puede usar el modo replay
+    Connection = None
+    PYRFC_AVAILABLE = False
+
+    class ABAPApplicationError(Exception):
+        """
+        Sustituto de pyrfc.ABAPApplicationError cuando pyrfc no está instalado.
+        """
+
+        def __init__(self, message: str = ""):
+            super().__init__(message)
+            self.message = message
+
+
+# Configuración por variables de entorno
+SAP_RFC_MODE = os.getenv("SAP_RFC_MODE", "live").lower()  # live, record o replay
+SAP_RECORD_DIR = os.getenv("SAP_RECORD_DIR", "./sap_recordings")
+# Si no hay grabación con los mismos parámetros, usar la más reciente del mismo query y vista
+SAP_REPLAY_FALLBACK = os.getenv("SAP_REPLAY_FALLBACK", "false").lower() in ("1", "true", "yes")
+
+# Tablas de la respuesta que se graban
+RESPONSE_TABLES = ("E_AXIS_INFO", "E_AXIS_DATA", "E_CELL_DATA")
+
+# Prefijo de los parámetros con los que shard_parameters restringe un fragmento
+SHARD_PARAMETER_PREFIX = "VAR_NAME_"
+
+
+def is_shard_request(parameters: Sequence[Dict[str, Any]]) -> bool:
+    """
+    Indica si los parámetros corresponden a un fragmento de una extracción por fragmentos.
+    """
+    return any(str(p.get("NAME", "")).startswith(SHARD_PARAMETER_PREFIX) for p in parameters)
+
+
+def recording_name(query: str, view: str, parameters: Sequence[Dict[str, Any]]) -> str:
+    """
+    Nombre del archivo de una grabación: query, vista y un hash de los parámetros.
+
+    Args:
+        query: Nombre del query (I_QUERY)
+        view: ID de la vista (I_VIEW_ID)
+        parameters: Parámetros enviados (I_T_PARAMETER)
+
+    Returns:
+        str: Nombre del archivo, por ejemplo 'ZICM_CM03_Q001_Z_BASE_RIESGO_1a2b3c4d5e6f.json.gz'.
+    """
+    firma = json.dumps(list(parameters), sort_keys=True, default=str)
+    return f"{query}_{view}_{hashlib.sha256(firma.encode('utf-8')).hexdigest()[:12]}.json.gz"
+
+
+def save_response(path: str, result: Dict[str, Any], **metadata: Any) -> str:
+    """
+    Guarda una respuesta de RRW3_GET_QUERY_VIEW_DATA como JSON comprimido con gzip.
+
+    Args:
+        path: Ruta del archivo
+        result: Respuesta de SAP; solo se guardan E_AXIS_INFO, E_AXIS_DATA y E_CELL_DATA
+        **metadata: Datos adicionales (query, vista, parámetros, fecha de grabación)
+
+    Returns:
+        str: La ruta del archivo.
+    """
+    carpeta = os.path.dirname(path)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    contenido = {
+        "metadata": metadata,
+        "result": {tabla: result[tabla] for tabla in RESPONSE_TABLES if tabla in result},
+    }
+    temporal = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(temporal, "wt", encoding="utf-8") as archivo:
+        json.dump(contenido, archivo, separators=(",", ":"), default=str)
+    os.replace(temporal, path)
+    return path
+
+
+def load_response(path: str) -> Dict[str, Any]:
+    """
+    Carga una respuesta grabada con save_response.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        Dict[str, Any]: Respuesta con E_AXIS_INFO, E_AXIS_DATA y E_CELL_DATA.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as archivo:
+        return json.load(archivo)["result"]
+
+
+def scale_response(
+    result: Dict[str, Any], factor: int, distinct_captions: Sequence[str] = ("Lote",)
+) -> Dict[str, Any]:
+    """
+    Multiplica por factor el número de filas de una respuesta grabada.
+
+    Cada copia repite las tuplas del eje de filas y sus celdas con TUPLE_ORDINAL y
+    CELL_ORDINAL desplazados. Los valores de las características de distinct_captions se
+    marcan con el número de copia ('L001-1', 'L001-2', ...) para que las llaves de las
+    filas (por ejemplo MATERIAL, LOTE y CENTRO) no se repitan.
+
+    Args:
+        result: Respuesta de SAP (por ejemplo la de load_response)
+        factor: Número de copias (1 retorna una respuesta equivalente)
+        distinct_captions: Etiquetas de las características que se marcan en cada copia
+
+    Returns:
+        Dict[str, Any]: Nueva respuesta con factor veces las filas.
+
+    Raises:
+        ValueError: Si factor es menor que 1.
+    """
+    if factor < 1:
+        raise ValueError("El factor de escala debe ser al menos 1")
+
+    distintas = {
+        char["CHANM"]
+        for axis in result["E_AXIS_INFO"]
+        for char in axis.get("CHARS", [])
+        if char["CAPTION"] in distinct_captions
+    }
+
+    ejes: List[Dict[str, Any]] = []
+    for entry in result["E_AXIS_DATA"]:
+        if entry["AXIS"] != "001":
+            ejes.append(entry)
+            continue
+        items = entry["SET"]
+        tuplas = max((int(item["TUPLE_ORDINAL"]) for item in items), default=-1) + 1
+        escalado = []
+        for copia in range(factor):
+            desplazamiento = copia * tuplas
+            for item in items:
+                nuevo = dict(item)
+                nuevo["TUPLE_ORDINAL"] = int(item["TUPLE_ORDINAL"]) + desplazamiento
+                if copia and item["CHANM"] in distintas:
+                    nuevo["CHAVL"] = f"{item['CHAVL']}-{copia}"
+                    nuevo["CAPTION"] = f"{item['CAPTION']}-{copia}"
+                escalado.append(nuevo)
+        ejes.append({**entry, "SET": escalado})
+
+    celdas = result["E_CELL_DATA"]
+    total = len(celdas)
+    celdas_escaladas = []
+    for copia in range(factor):
+        desplazamiento = copia * total
+        for cell in celdas:
+            nueva = dict(cell)
+            nueva["CELL_ORDINAL"] = int(cell["CELL_ORDINAL"]) + desplazamiento
+            celdas_escaladas.append(nueva)
+
+    return {**result, "E_AXIS_DATA": ejes, "E_CELL_DATA": celdas_escaladas}
+
+
+class ReplayConnection:
+    """
+    Conexión falsa que responde RRW3_GET_QUERY_VIEW_DATA con respuestas grabadas.
+
+    Se puede crear con una respuesta fija (response) o con una carpeta de grabaciones. En
+    el segundo caso busca la grabación de los mismos query, vista y parámetros. Solo con
+    fallback (por defecto SAP_REPLAY_FALLBACK) usa, si no existe, la grabación más reciente
+    del mismo query y vista (por ejemplo de otro mes), y lo advierte en el log.
+
+    Un fragmento (ver is_shard_request) siempre exige su grabación exacta, y la respuesta
+    fija no se puede usar con fragmentos: cada fragmento recibiría la respuesta completa y
+    las filas se repetirían una vez por fragmento.
+    Acepta y descarta los parámetros de conexión, para poder usarse como fábrica del pool.
+    """
+
+    def __init__(
+        self,
+        response: Optional[Dict[str, Any]] = None,
+        directory: Optional[str] = None,
+        fallback: Optional[bool] = None,
+        **connection_params: Any,
+    ):
+        """
+        Args:
+            response (Dict[str, Any], opcional): Respuesta fija para todas las consultas.
+            directory (str, opcional): Carpeta de grabaciones. Por defecto SAP_RECORD_DIR.
+            fallback (bool, opcional): Usar la grabación más reciente del mismo query y vista
+                si no hay una exacta. Por defecto SAP_REPLAY_FALLBACK.
+            **connection_params: Parámetros de conexión (se ignoran).
+        """
+        self.response = response
+        self.directory = directory or SAP_RECORD_DIR
+        self.fallback = SAP_REPLAY_FALLBACK if fallback is None else fallback
+        self.calls = 0
+        self.closed = False
+
+    def _find(self, query: str, view: str, parameters: Sequence[Dict[str, Any]]) -> str:
+        """
+        Ruta de la grabación que corresponde a la consulta.
+        """
+        exacta = os.path.join(self.directory, recording_name(query, view, parameters))
+        if os.path.exists(exacta):
+            return exacta
+        if is_shard_request(parameters) or not self.fallback:
+            raise ABAPApplicationError(
+                f"No hay una grabación de {query}/{view} con estos parámetros en "
+                f"{self.directory} ({os.path.basename(exacta)})"
+            )
+        prefijo = f"{query}_{view}_"
+        candidatas = [
+            os.path.join(self.directory, nombre)
+            for nombre in (os.listdir(self.directory) if os.path.isdir(self.directory) else [])
+            if nombre.startswith(prefijo) and nombre.endswith(".json.gz")
+        ]
+        if not candidatas:
+            raise ABAPApplicationError(
+                f"No hay grabaciones de {query}/{view} en {self.directory}"
+            )
+        ruta = max(candidatas, key=os.path.getmtime)
+        logger.warning(
+            f"[sap-replay] Sin grabación exacta de {query}/{view}; se usa {os.path.basename(ruta)}, "
+            f"grabada con otros parámetros"
+        )
+        return ruta
+
+    def call(self, function: str, **kwargs: Any) -> Dict[str, Any]:
+        """
+        Responde la llamada con la respuesta fija o con la grabación correspondiente.
+
+        Raises:
+            ValueError: Si la función no es RRW3_GET_QUERY_VIEW_DATA.
+            ABAPApplicationError: Si no hay una grabación para la consulta, o si se pide un
+                fragmento con una respuesta fija.
+        """
+        if function != "RRW3_GET_QUERY_VIEW_DATA":
+            raise ValueError(f"ReplayConnection no reproduce la función {function}")
+        self.calls += 1
+        if self.response is not None:
+            if is_shard_request(kwargs.get("I_T_PARAMETER", [])):
+                raise ABAPApplicationError(
+                    "La respuesta fija no se puede usar con fragmentos (SAP_SHARDS); "
+                    "use una carpeta de grabaciones"
+                )
+            return self.response
+        return load_response(
+            self._find(kwargs["I_QUERY"], kwargs["I_VIEW_ID"], kwargs.get("I_T_PARAMETER", []))
+        )
+
+    def ping(self) -> None:
+        """
+        Siempre disponible.
+        """
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class RecordingConnection:
+    """
+    Envoltura de una conexión real que graba cada respuesta de RRW3_GET_QUERY_VIEW_DATA.
+
+    Las grabaciones quedan en la carpeta indicada con el nombre de recording_name, listas
+    para ReplayConnection.
+    """
+
+    def __init__(self, connection: Any, directory: Optional[str] = None):
+        """
+        Args:
+            connection: Conexión real (pyrfc.Connection)
+            directory (str, opcional): Carpeta de grabaciones. Por defecto SAP_RECORD_DIR.
+        """
+        self.connection = connection
+        self.directory = directory or SAP_RECORD_DIR
+
+    def call(self, function: str, **kwargs: Any) -> Dict[str, Any]:
+        """
+        Ejecuta la llamada en la conexión real y graba la respuesta.
+        """
+        result = self.connection.call(function, **kwargs)
+        if function == "RRW3_GET_QUERY_VIEW_DATA":
+            parametros = kwargs.get("I_T_PARAMETER", [])
+            ruta = os.path.join(
+                self.directory, recording_name(kwargs["I_QUERY"], kwargs["I_VIEW_ID"], parametros)
+            )
+            save_response(
+                ruta,
+                result,
+                query=kwargs["I_QUERY"],
+                view=kwargs["I_VIEW_ID"],
+                parameters=parametros,
+                recorded_at=datetime.now().isoformat(timespec="seconds"),
+            )
+            print(f"[sap-replay] Respuesta grabada en {ruta}")
+        return result
+
+    def ping(self) -> None:
+        self.connection.ping()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def rfc_connection(**params: Any) -> Any:
+    """
+    Abre una conexión RFC según SAP_RFC_MODE.
+
+    'live' abre una conexión de pyrfc, 'record' la envuelve para grabar cada respuesta en
+    SAP_RECORD_DIR y 'replay' responde con las grabaciones de SAP_RECORD_DIR sin conectarse.
+
+    Args:
+        **params: Parámetros de conexión (ashost, sysnr, client, user, passwd, lang)
+
+    Returns:
+        Conexión con call(), ping() y close().
+
+    Raises:
+        RuntimeError: Si el modo requiere pyrfc y no está instalado, o si el modo no es válido.
+    """
+    if SAP_RFC_MODE == "replay":
+        return ReplayConnection(**params)
+    if SAP_RFC_MODE not in ("live", "record"):
+        raise RuntimeError(f"SAP_RFC_MODE '{SAP_RFC_MODE}' no válido (live, record o replay)")
+    if not PYRFC_AVAILABLE:
+        raise RuntimeError("pyrfc no está instalado; use SAP_RFC_MODE=replay para trabajar sin SAP")
+    connection = Connection(**params)
+    if SAP_RFC_MODE == "record":
+        return RecordingConnection(connection)
+    return connection
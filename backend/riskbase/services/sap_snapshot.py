@@ -0,0 +1,193 @@
+import pandas as pd
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime
+import hashlib
+import json
+import threading
+import time
+import os
+from dotenv import load_dotenv
+
+from .sap_operations import get_data_sap
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA LA FOTO MENSUAL DE LOS DATOS DE SAP GUARDADA EN DISCO (PARQUET)
+#! /risk/process REUTILIZA LA FOTO DEL MES SI EXISTE; CON refresh=True SE VUELVE A CONSULTAR SAP
+
+# Configuración por variables de entorno
+SAP_SNAPSHOT_DIR = os.getenv("SAP_SNAPSHOT_DIR", "./sap_snapshots")
+SAP_SNAPSHOT_COMPRESSION = os.getenv("SAP_SNAPSHOT_COMPRESSION", "zstd")
+
+# Vista de SAP de la que se extrae el stock
+SAP_SNAPSHOT_VIEW = "Z_BASE_RIESGO"
+
+# Evita que dos solicitudes simultáneas extraigan el mismo mes de SAP
+_lock = threading.Lock()
+
+
+def snapshot_paths(
+    month: int, year: int, view: str = SAP_SNAPSHOT_VIEW, directory: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Rutas del archivo Parquet y de su metadata para un mes, año y vista.
+
+    Args:
+        month: Mes (1-12)
+        year: Año
+        view: Vista de SAP
+        directory: Carpeta de las fotos. Por defecto SAP_SNAPSHOT_DIR.
+
+    Returns:
+        Tuple[str, str]: (ruta del .parquet, ruta del .json)
+    """
+    base = os.path.join(directory or SAP_SNAPSHOT_DIR, f"{view}_{year:04d}_{month:02d}")
+    return f"{base}.parquet", f"{base}.json"
+
+
+def _file_hash(path: str) -> str:
+    """
+    SHA-256 del contenido de un archivo.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def save_snapshot(
+    df: pd.DataFrame,
+    month: int,
+    year: int,
+    view: str = SAP_SNAPSHOT_VIEW,
+    directory: Optional[str] = None,
+    extraction_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Guarda el DataFrame decodificado de SAP como Parquet comprimido junto con su metadata.
+
+    Los archivos se escriben primero con un nombre temporal y luego se reemplazan, de modo
+    que una lectura simultánea nunca ve una foto a medio escribir. Las columnas categóricas
+    y las fechas (datetime64) conservan su tipo.
+
+    Args:
+        df: DataFrame retornado por get_data_sap
+        month: Mes (1-12)
+        year: Año
+        view: Vista de SAP
+        directory: Carpeta de las fotos. Por defecto SAP_SNAPSHOT_DIR.
+        extraction_seconds: Duración de la extracción de SAP, para la metadata
+
+    Returns:
+        Dict[str, Any]: Metadata guardada (vista, mes, año, fecha de extracción, filas, columnas y hash).
+    """
+    ruta_parquet, ruta_json = snapshot_paths(month, year, view, directory)
+    os.makedirs(os.path.dirname(ruta_parquet), exist_ok=True)
+
+    temporal = f"{ruta_parquet}.{os.getpid()}.tmp"
+    df.to_parquet(temporal, compression=SAP_SNAPSHOT_COMPRESSION, index=False)
+    metadata = {
+        "view": view,
+        "month": month,
+        "year": year,
+        "extracted_at": datetime.now().isoformat(timespec="seconds"),
+        "extraction_seconds": None if extraction_seconds is None else round(extraction_seconds, 2),
+        "rows": int(len(df)),
+        "columns": int(df.shape[1]),
+        "bytes": os.path.getsize(temporal),
+        "sha256": _file_hash(temporal),
+    }
+    os.replace(temporal, ruta_parquet)
+
+    temporal = f"{ruta_json}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(metadata, archivo, indent=2)
+    os.replace(temporal, ruta_json)
+    return metadata
+
+
+def load_snapshot(
+    month: int, year: int, view: str = SAP_SNAPSHOT_VIEW, directory: Optional[str] = None
+) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """
+    Carga la foto de un mes si existe y está íntegra.
+
+    Args:
+        month: Mes (1-12)
+        year: Año
+        view: Vista de SAP
+        directory: Carpeta de las fotos. Por defecto SAP_SNAPSHOT_DIR.
+
+    Returns:
+        Optional[Tuple[pd.DataFrame, Dict[str, Any]]]: (DataFrame, metadata), o None si no hay
+        foto o si su hash o su número de filas no coinciden con la metadata.
+    """
+    ruta_parquet, ruta_json = snapshot_paths(month, year, view, directory)
+    if not (os.path.exists(ruta_parquet) and os.path.exists(ruta_json)):
+        return None
+
+    try:
+        with open(ruta_json, encoding="utf-8") as archivo:
+            metadata = json.load(archivo)
+        if _file_hash(ruta_parquet) != metadata.get("sha256"):
+            print(f"[sap-snapshot] La foto {ruta_parquet} no coincide con su hash; se ignora")
+            return None
+        df = pd.read_parquet(ruta_parquet)
+    except Exception as error:
+        print(f"[sap-snapshot] No se pudo leer la foto {ruta_parquet}: {error}")
+        return None
+
+    if len(df) != metadata.get("rows"):
+        print(f"[sap-snapshot] La foto {ruta_parquet} no tiene las filas esperadas; se ignora")
+        return None
+    return df, metadata
+
+
+def get_data_sap_snapshot(
+    refresh: bool = False, directory: Optional[str] = None
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Datos de SAP del mes actual, tomados de la foto en disco si existe.
+
+    Si no hay foto del mes (o refresh es True) se consulta SAP con get_data_sap y se guarda
+    una foto nueva. Si la foto no se puede guardar, el proceso continúa con los datos
+    extraídos.
+
+    Args:
+        refresh: Si es True se ignora la foto existente y se vuelve a consultar SAP.
+        directory: Carpeta de las fotos. Por defecto SAP_SNAPSHOT_DIR.
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, Any]]: (DataFrame, metadata). La metadata incluye
+        'source': 'snapshot' si se leyó de disco o 'sap' si se extrajo.
+    """
+    today = datetime.now()
+    month, year = today.month, today.year
+
+    with _lock:
+        if not refresh:
+            t0 = time.perf_counter()
+            cargada = load_snapshot(month, year, directory=directory)
+            if cargada is not None:
+                df, metadata = cargada
+                return df, {
+                    **metadata,
+                    "source": "snapshot",
+                    "load_seconds": round(time.perf_counter() - t0, 3),
+                }
+
+        t0 = time.perf_counter()
+        df = get_data_sap()
+        segundos = time.perf_counter() - t0
+        if df is None or df.empty:
+            return df, {"source": "sap", "rows": 0}
+
+        try:
+            metadata = save_snapshot(
+                df, month, year, directory=directory, extraction_seconds=segundos
+            )
+        except Exception as error:
+            print(f"[sap-snapshot] No se pudo guardar la foto de {month:02d}/{year}: {error}")
+            metadata = {"view": SAP_SNAPSHOT_VIEW, "month": month, "year": year, "rows": int(len(df))}
+        return df, {**metadata, "source": "sap"}
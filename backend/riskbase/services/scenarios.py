@@ -0,0 +1,340 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from itertools import product
+import math
+import os
+from dotenv import load_dotenv
+
+from .matrix_index import MatrixIndex
+from .decision_table import DecisionPlan
+from .rules_engine import (
+    RANGO_PERMANENCIA_EDGES,
+    DAY_RANGE_EDGES,
+    AVON_NATURA_FACTOR_COLUMNS,
+    OTROS_MARCAS_FACTOR_COLUMNS,
+    compile_avon_natura_index,
+    compile_otros_marcas_plan,
+    compute_rango_permanencia_column,
+    compute_day_range_columns,
+    compute_rango_cons_column,
+    resolve_avon_natura_factor_and_class,
+    resolve_otros_marcas_factor_and_class,
+)
+
+load_dotenv()
+
+#* AQUÍ SE ENCUENTRA EL MOTOR DE ESCENARIOS DE ESTRÉS SOBRE EL INVENTARIO PROCESADO
+#! TODOS LOS ESCENARIOS SE EVALÚAN EN UNA SOLA PASADA: MATRIZ DE FACTORES (ESCENARIOS × LOTES) POR 'VALOR DEF'
+#! SOLO LOS DESPLAZAMIENTOS DE DÍAS DISTINTOS VUELVEN A CONSULTAR LAS MATRICES; EL ESCALADO DE FACTORES ES ARITMÉTICO
+
+# Filas de lotes que se procesan a la vez para acotar la memoria de la matriz de factores
+SCENARIO_CHUNK_ROWS = 65536
+# Escenarios máximos por evaluación (la memoria y el tiempo crecen con cada escenario)
+SCENARIO_MAX_COUNT = int(os.getenv("SCENARIO_MAX_COUNT", "200"))
+
+# Columnas por las que se puede resumir un escenario (todas de baja cardinalidad)
+SCENARIO_DIMENSIONS: List[str] = [
+    "MARCA DE QM",
+    "SEGMENTACION",
+    "SUBSEGMENTACION",
+    "STATUS CONS",
+    "CENTRO",
+    "CLAS BASE RIESGO",
+]
+
+
+class Scenario:
+    """
+    Un escenario de estrés sobre el inventario procesado.
+
+    factor_scale multiplica el factor de provisión de las filas según su clasificación
+    (por ejemplo {"MUY ALTO": 1.2}); el aumento se limita a 1.0 para que la provisión no
+    supere el valor del lote (un factor actual mayor que 1.0 no se reduce). threshold_shift_days desplaza los límites en
+    días que calcula el motor de reglas (540/720 de 'RANGO DE PERMANENCIA 2' y los de
+    'RANGO OBSOLESCENCIA', 'RANGO VENCIDO 2' y 'RANGO BLOQUEADO 2'); con un valor negativo
+    los lotes pasan antes a los rangos más altos.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factor_scale: Optional[Dict[str, float]] = None,
+        threshold_shift_days: int = 0,
+    ):
+        """
+        Inicializa y valida el escenario.
+
+        Args:
+            name (str): Nombre del escenario.
+            factor_scale (Dict[str, float], opcional): Multiplicador del factor por clasificación.
+            threshold_shift_days (int): Días que se suman a los límites de los rangos.
+
+        Raises:
+            ValueError: Si algún multiplicador es negativo o el desplazamiento no es entero.
+        """
+        factor_scale = {str(k).strip().upper(): float(v) for k, v in (factor_scale or {}).items()}
+        negativos = [k for k, v in factor_scale.items() if v < 0]
+        if negativos:
+            raise ValueError(f"El escenario '{name}' tiene multiplicadores negativos: {negativos}")
+        if int(threshold_shift_days) != threshold_shift_days:
+            raise ValueError(
+                f"El desplazamiento del escenario '{name}' debe ser un número entero de días"
+            )
+        self.name = name
+        self.factor_scale = factor_scale
+        self.threshold_shift_days = int(threshold_shift_days)
+
+    def __repr__(self) -> str:
+        return (
+            f"Scenario({self.name!r}, factor_scale={self.factor_scale}, "
+            f"threshold_shift_days={self.threshold_shift_days})"
+        )
+
+
+def scenario_grid(
+    factor_scales: Optional[Dict[str, Sequence[float]]] = None,
+    threshold_shifts: Sequence[int] = (0,),
+    max_scenarios: int = SCENARIO_MAX_COUNT,
+) -> List[Scenario]:
+    """
+    Construye todas las combinaciones de multiplicadores por clasificación y desplazamientos.
+
+    Args:
+        factor_scales: Valores a probar para cada clasificación, por ejemplo
+                       {"MUY ALTO": [1.0, 1.1, 1.2], "ALTO": [1.0, 1.1]}
+        threshold_shifts: Desplazamientos en días a probar, por ejemplo [0, -30, -60]
+        max_scenarios: Combinaciones máximas permitidas
+
+    Returns:
+        List[Scenario]: Un escenario por combinación.
+
+    Raises:
+        ValueError: Si el número de combinaciones supera max_scenarios.
+    """
+    factor_scales = factor_scales or {}
+    clasificaciones = list(factor_scales.keys())
+    # El tamaño se valida antes de construir las combinaciones
+    total = math.prod(len(factor_scales[c]) for c in clasificaciones) * len(threshold_shifts)
+    if total > max_scenarios:
+        raise ValueError(
+            f"La grilla genera {total} escenarios; el máximo es {max_scenarios}"
+        )
+    escenarios = []
+    for escalas in product(*[factor_scales[c] for c in clasificaciones]):
+        for desplazamiento in threshold_shifts:
+            partes = [f"{c} x{e:g}" for c, e in zip(clasificaciones, escalas)]
+            partes.append(f"{int(desplazamiento):+d} DIAS")
+            escenarios.append(
+                Scenario(
+                    " | ".join(partes),
+                    dict(zip(clasificaciones, escalas)),
+                    desplazamiento,
+                )
+            )
+    return escenarios
+
+
+def _factor_and_class_for_shift(
+    df: pd.DataFrame,
+    desplazamiento: int,
+    indice_avon_natura: MatrixIndex,
+    plan_otros_tipos: DecisionPlan,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Factor y clasificación de cada fila con los límites de días desplazados.
+
+    Se recalculan los rangos de días y 'RANGO CONS'; solo las filas cuyo rango cambia vuelven
+    a consultar las matrices, el resto conserva las columnas ya calculadas.
+    """
+    factores = df["FACTOR PROV"].to_numpy(dtype=float, copy=True)
+    clases = df["CLAS BASE RIESGO"].to_numpy(dtype=object, copy=True)
+    if desplazamiento == 0:
+        return factores, clases
+
+    columnas = list(
+        dict.fromkeys(
+            AVON_NATURA_FACTOR_COLUMNS
+            + OTROS_MARCAS_FACTOR_COLUMNS
+            + [
+                "LOTE",
+                "RANGO DE PERMANENCIA",
+                "FECHA ENTRADA",
+                "FECHA OBSOLETO",
+                "FECH, CADUCIDAD/FECH PREF. CONSUMO",
+                "FECHA BLOQUEADO",
+            ]
+        )
+    )
+    df = df[[c for c in columnas if c in df.columns]].copy()
+    rangos_actuales = {
+        columna: df[columna].to_numpy(dtype=object)
+        for columna in ("RANGO DE PERMANENCIA 2", "RANGO CONS")
+    }
+    df["RANGO DE PERMANENCIA 2"] = compute_rango_permanencia_column(
+        df, tuple(limite + desplazamiento for limite in RANGO_PERMANENCIA_EDGES)
+    )
+    rangos_dias = compute_day_range_columns(df, DAY_RANGE_EDGES + desplazamiento)
+    for columna in rangos_dias.columns:
+        df[columna] = rangos_dias[columna]
+    df["RANGO CONS"] = compute_rango_cons_column(df)
+
+    # Las llaves de las matrices solo dependen de los rangos a través de estas dos columnas
+    cambiadas = np.zeros(len(df), dtype=bool)
+    for columna, actuales in rangos_actuales.items():
+        cambiadas |= df[columna].to_numpy(dtype=object) != actuales
+
+    es_avon_natura = df["MARCA DE QM"].isin(["AVON", "NATURA"]).to_numpy(dtype=bool)
+    for filas, resolver, indice in (
+        (cambiadas & es_avon_natura, resolve_avon_natura_factor_and_class, indice_avon_natura),
+        (cambiadas & ~es_avon_natura, resolve_otros_marcas_factor_and_class, plan_otros_tipos),
+    ):
+        if filas.any():
+            factor_clase = resolver(df[filas], indice)
+            factores[filas] = factor_clase["FACTOR PROV"].to_numpy(dtype=float)
+            clases[filas] = factor_clase["CLAS BASE RIESGO"].to_numpy(dtype=object)
+    return factores, clases
+
+
+def run_scenarios(
+    df: pd.DataFrame,
+    scenarios: Sequence[Scenario],
+    df_matrices_avon_natura: Union[pd.DataFrame, MatrixIndex],
+    df_matrices_otros_tipos: Union[pd.DataFrame, MatrixIndex, DecisionPlan],
+    dimension: str = "MARCA DE QM",
+    chunk_rows: int = SCENARIO_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    Evalúa varios escenarios de estrés sobre el inventario procesado en una sola pasada.
+
+    Para cada desplazamiento de días distinto se obtiene el factor y la clasificación de cada
+    lote (el desplazamiento 0 reutiliza las columnas ya calculadas). Después se arma por
+    bloques de lotes la matriz de factores (escenarios × lotes), aplicando el multiplicador
+    de cada escenario según la clasificación, se multiplica por 'VALOR DEF' y se suma por
+    la dimensión indicada con np.bincount (memoria proporcional a escenarios × lotes del
+    bloque, sin depender de cuántos valores tenga la dimensión).
+
+    Args:
+        df: Resultado de process_riskbase_dataframe / process_riskbase_parallel
+        scenarios: Escenarios a evaluar (ver Scenario y scenario_grid)
+        df_matrices_avon_natura: Matrices de AVON y NATURA o su índice compilado
+        df_matrices_otros_tipos: Matrices del resto de marcas, su índice o su plan compilado
+        dimension: Columna por la que se resume cada escenario (ver SCENARIO_DIMENSIONS)
+        chunk_rows: Lotes por bloque de la matriz de factores
+
+    Returns:
+        pd.DataFrame: Una fila por escenario y valor de la dimensión con 'BASE RIESGO',
+        'PROVISION' y sus deltas frente a los valores actuales del DataFrame.
+
+    Raises:
+        ValueError: Si no hay escenarios, hay más de SCENARIO_MAX_COUNT, hay nombres repetidos,
+        la dimensión no está en SCENARIO_DIMENSIONS o no es una columna del DataFrame.
+    """
+    if not scenarios:
+        raise ValueError("No se indicaron escenarios")
+    if len(scenarios) > SCENARIO_MAX_COUNT:
+        raise ValueError(
+            f"Se indicaron {len(scenarios)} escenarios; el máximo es {SCENARIO_MAX_COUNT}"
+        )
+    nombres = pd.Series([s.name for s in scenarios])
+    repetidos = nombres[nombres.duplicated()].unique().tolist()
+    if repetidos:
+        raise ValueError(f"Hay escenarios con el mismo nombre: {repetidos}")
+    if dimension not in SCENARIO_DIMENSIONS:
+        raise ValueError(
+            f"La dimensión '{dimension}' no está permitida (solo {SCENARIO_DIMENSIONS})"
+        )
+    if dimension not in df.columns:
+        raise ValueError(f"La dimensión '{dimension}' no es una columna del inventario procesado")
+    if not isinstance(df_matrices_avon_natura, MatrixIndex):
+        df_matrices_avon_natura = compile_avon_natura_index(df_matrices_avon_natura)
+    # La tabla de decisión se compila una sola vez para todos los desplazamientos
+    df_matrices_otros_tipos = compile_otros_marcas_plan(df_matrices_otros_tipos)
+
+    # Factor y clasificación por desplazamiento distinto (K × lotes)
+    desplazamientos = sorted({s.threshold_shift_days for s in scenarios})
+    resultados = [
+        _factor_and_class_for_shift(
+            df, d, df_matrices_avon_natura, df_matrices_otros_tipos
+        )
+        for d in desplazamientos
+    ]
+    n = len(df)
+    # Un factor nulo cuenta como 0, igual que la 'PROVISION' nula en los valores actuales
+    factores = np.nan_to_num(
+        np.vstack([f for f, _ in resultados]).reshape(len(desplazamientos), n)
+    )
+    clasificaciones = pd.Index(
+        pd.unique(np.concatenate([pd.unique(c) for _, c in resultados]))
+    )
+    codigos = np.vstack(
+        [clasificaciones.get_indexer(c) for _, c in resultados]
+    ).reshape(len(desplazamientos), n)
+    es_bajo = np.asarray(clasificaciones == "BAJO")
+
+    # Multiplicador de cada escenario por clasificación (S × C) y desplazamiento de cada escenario
+    escalas = np.array(
+        [[s.factor_scale.get(c, 1.0) for c in clasificaciones] for s in scenarios],
+        dtype=float,
+    ).reshape(len(scenarios), len(clasificaciones))
+    fila_desplazamiento = np.array(
+        [desplazamientos.index(s.threshold_shift_days) for s in scenarios]
+    )
+    filas_escenario = np.arange(len(scenarios))[:, None]
+
+    valor = np.nan_to_num(df["VALOR DEF"].to_numpy(dtype=float))
+    valor_provision = valor * (df["MARCA DE QM"] != "OTRAS").to_numpy(dtype=bool)
+    grupos, etiquetas = pd.factorize(df[dimension], use_na_sentinel=False)
+
+    k = len(etiquetas)
+    provision = np.zeros(len(scenarios) * k)
+    base_riesgo = np.zeros(len(desplazamientos) * k)
+    # Cada fila de la matriz (escenario o desplazamiento) suma en su propio tramo de k grupos
+    tramos_escenario = np.arange(len(scenarios))[:, None] * k
+    tramos_desplazamiento = np.arange(len(desplazamientos))[:, None] * k
+    for inicio in range(0, n, chunk_rows):
+        bloque = slice(inicio, min(inicio + chunk_rows, n))
+        grupos_bloque = grupos[bloque]
+
+        factores_bloque = factores[fila_desplazamiento, bloque]
+        matriz_factores = (
+            factores_bloque * escalas[filas_escenario, codigos[fila_desplazamiento, bloque]]
+        )
+        # El límite de 1.0 solo acota el aumento por escala: con escala 1 el factor no cambia
+        np.minimum(
+            matriz_factores, np.maximum(factores_bloque, 1.0, out=factores_bloque), out=matriz_factores
+        )
+        matriz_factores *= valor_provision[bloque]
+        provision += np.bincount(
+            (tramos_escenario + grupos_bloque).ravel(),
+            weights=matriz_factores.ravel(),
+            minlength=provision.size,
+        )
+        base_riesgo += np.bincount(
+            (tramos_desplazamiento + grupos_bloque).ravel(),
+            weights=(~es_bajo[codigos[:, bloque]] * valor[bloque]).ravel(),
+            minlength=base_riesgo.size,
+        )
+    provision = provision.reshape(len(scenarios), k)
+    base_riesgo = base_riesgo.reshape(len(desplazamientos), k)
+
+    # Valores actuales por valor de la dimensión para calcular los deltas
+    provision_actual = np.bincount(
+        grupos, weights=np.nan_to_num(df["PROVISION"].to_numpy(dtype=float)), minlength=k
+    )
+    base_riesgo_actual = np.bincount(
+        grupos, weights=np.nan_to_num(df["BASE RIESGO"].to_numpy(dtype=float)), minlength=k
+    )
+
+    base_riesgo = base_riesgo[fila_desplazamiento]
+    etiquetas = np.asarray(etiquetas, dtype=object)
+    return pd.DataFrame(
+        {
+            "ESCENARIO": np.repeat([s.name for s in scenarios], len(etiquetas)),
+            dimension: np.tile(etiquetas, len(scenarios)),
+            "BASE RIESGO": base_riesgo.ravel(),
+            "PROVISION": provision.ravel(),
+            "DELTA BASE RIESGO": (base_riesgo - base_riesgo_actual).ravel(),
+            "DELTA PROVISION": (provision - provision_actual).ravel(),
+        }
+    )
@@ -0,0 +1,305 @@
+import pandas as pd
+import numpy as np
+from typing import Callable, List, Optional
+from pandas.api.types import union_categoricals
+
+#* AQUÍ SE ENCUENTRA EL ESQUEMA DE TIPOS DEL INVENTARIO DE BASE RIESGO
+#! LAS COLUMNAS DE TEXTO CON POCOS VALORES DISTINTOS VIAJAN COMO CATEGÓRICAS DESDE SAP HASTA LA EXPORTACIÓN
+#! SOLO SE CONVIERTEN DE NUEVO A TEXTO EN LA FRONTERA (EXCEL O BASE DE DATOS) CON to_export_frame
+
+# Tipos admitidos para las columnas que se decodifican de SAP
+SAP_COLUMN_DTYPES = ("object", "category", "datetime64[ns]")
+
+
+class SapColumn:
+    """
+    Una columna declarada de la salida de SAP.
+
+    Indica de qué característica (por su etiqueta en E_AXIS_INFO) y de qué representación
+    ('CAPTION' o 'CHAVL') sale la columna, con qué nombre queda en el DataFrame y con qué
+    tipo. Solo las columnas declaradas se materializan al decodificar; el texto llega en
+    mayúsculas.
+    """
+
+    def __init__(self, caption: str, representation: str, name: str, dtype: str = "object"):
+        """
+        Inicializa y valida la columna.
+
+        Args:
+            caption (str): Etiqueta de la característica en SAP (por ejemplo 'Marca de QM').
+            representation (str): 'CAPTION' (texto) o 'CHAVL' (valor clave).
+            name (str): Nombre de la columna en el DataFrame.
+            dtype (str): 'object', 'category' o 'datetime64[ns]'.
+
+        Raises:
+            ValueError: Si la representación o el tipo no son válidos.
+        """
+        if representation not in ("CAPTION", "CHAVL"):
+            raise ValueError(f"Representación '{representation}' no válida para '{name}'")
+        if dtype not in SAP_COLUMN_DTYPES:
+            raise ValueError(f"Tipo '{dtype}' no admitido para '{name}'")
+        self.caption = caption
+        self.representation = representation
+        self.name = name
+        self.dtype = dtype
+
+    def __repr__(self) -> str:
+        return f"SapColumn({self.caption!r}, {self.representation!r}, {self.name!r}, {self.dtype!r})"
+
+
+# Salida de la vista Z_BASE_RIESGO: solo estas columnas se decodifican, en este orden.
+# 'RANGO OBSOLETO 2' y 'PRÓXIMO A VENCER' se toman solo del texto (CAPTION), que es la
+# aparición que se conservaba al ordenar las columnas finales.
+SAP_OUTPUT_SCHEMA: List[SapColumn] = [
+    SapColumn("Negocio Inventarios", "CAPTION", "NEGOCIO INVENTARIOS", "category"),
+    SapColumn("Año natural/Mes", "CAPTION", "AÑO NATURAL/MES", "category"),
+    SapColumn("Tipo Material Inventario", "CAPTION", "TIPO MATERIAL INVENTARIO", "category"),
+    SapColumn("Marca de QM", "CAPTION", "MARCA DE QM", "category"),
+    SapColumn("Material", "CHAVL", "MATERIAL"),
+    SapColumn("Material", "CAPTION", "DESCRIPCIÓN"),
+    SapColumn("Unidad medida", "CHAVL", "UNIDAD MEDIDA", "category"),
+    SapColumn("Centro", "CHAVL", "CENTRO", "category"),
+    SapColumn("Codigo Almacen Cliente", "CHAVL", "CODIGO ALMACEN CLIENTE", "category"),
+    SapColumn("Indicador Stock Espec.", "CAPTION", "INDICADOR STOCK ESPEC.", "category"),
+    SapColumn("Núm.stock.esp.", "CAPTION", "NÚM.STOCK.ESP."),
+    SapColumn("Lote", "CHAVL", "LOTE"),
+    SapColumn("Creado el", "CHAVL", "CREADO EL", "datetime64[ns]"),
+    SapColumn("Fech. Fabricación", "CHAVL", "FECH. FABRICACIÓN", "datetime64[ns]"),
+    SapColumn(
+        "Fech, Caducidad/Fech Pref. Consumo",
+        "CHAVL",
+        "FECH, CADUCIDAD/FECH PREF. CONSUMO",
+        "datetime64[ns]",
+    ),
+    SapColumn("Fecha Bloqueado", "CHAVL", "FECHA BLOQUEADO", "datetime64[ns]"),
+    SapColumn("Fecha Obsoleto", "CHAVL", "FECHA OBSOLETO", "datetime64[ns]"),
+    SapColumn("Fecha entrada", "CHAVL", "FECHA ENTRADA", "datetime64[ns]"),
+    SapColumn("Rango Obsoleto 2", "CAPTION", "RANGO OBSOLETO 2", "category"),
+    SapColumn("Rango Cobertura", "CHAVL", "RANGO COBERTURA", "category"),
+    SapColumn("Rango de Permanencia", "CHAVL", "RANGO DE PERMANENCIA", "category"),
+    SapColumn("Rango Bloqueado", "CHAVL", "RANGO BLOQUEADO", "category"),
+    SapColumn("Rango Obsoleto", "CHAVL", "RANGO OBSOLETO", "category"),
+    SapColumn("Rango Vencidos", "CHAVL", "RANGO VENCIDOS", "category"),
+    SapColumn("Próximo a Vencer", "CAPTION", "PRÓXIMO A VENCER", "category"),
+    SapColumn("Rango Próx.Vencer MM", "CHAVL", "RANGO PRÓX.VENCER MM", "category"),
+    SapColumn("Rango Próximos a Ven", "CHAVL", "RANGO PRÓXIMOS A VEN", "category"),
+    SapColumn("Tipo de Material (I)", "CAPTION", "TIPO DE MATERIAL (I)", "category"),
+]
+
+# Medidas de la vista Z_BASE_RIESGO, en el orden en que llegan las celdas
+SAP_MEASURE_COLUMNS: List[str] = [
+    "COSTO UNITARIO REAL",
+    "INVENTARIO DISPONIBL",
+    "INVENTARIO NO DISPON",
+    "VALOR OBSOLETO",
+    "VALOR BLOQUEADO MM",
+    "VALOR TOTAL MM",
+    "PERMANENCIA",
+]
+
+# Columnas que llegan de SAP con pocos valores distintos
+SAP_CATEGORICAL_COLUMNS: List[str] = [
+    columna.name for columna in SAP_OUTPUT_SCHEMA if columna.dtype == "category"
+]
+
+# Columnas formuladas por el motor de reglas que también son categóricas
+DERIVED_CATEGORICAL_COLUMNS: List[str] = [
+    "MARCA CONCAT",
+    "SEGMENTACION",
+    "SUBSEGMENTACION",
+    "RANGO DE PERMANENCIA 2",
+    "STATUS CONS",
+    "RANGO OBSOLESCENCIA",
+    "RANGO VENCIDO 2",
+    "RANGO BLOQUEADO 2",
+    "RANGO CONS",
+    "CLAS BASE RIESGO",
+]
+
+CATEGORICAL_COLUMNS: List[str] = SAP_CATEGORICAL_COLUMNS + DERIVED_CATEGORICAL_COLUMNS
+
+# Valor con el que SAP marca los datos inválidos o vacíos
+INVALID_VALUE = "#"
+
+# Columnas de fecha: se decodifican una sola vez a datetime64 y así llegan hasta la exportación
+DATE_COLUMNS: List[str] = [
+    columna.name for columna in SAP_OUTPUT_SCHEMA if columna.dtype == "datetime64[ns]"
+]
+
+
+def is_categorical(serie: pd.Series) -> bool:
+    """
+    Indica si una columna es categórica.
+    """
+    return isinstance(serie.dtype, pd.CategoricalDtype)
+
+
+def apply_categorical_schema(
+    df: pd.DataFrame, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Convierte a categóricas las columnas de texto del esquema presentes en el DataFrame.
+
+    Las columnas se recorren por posición porque el DataFrame de SAP puede traer nombres
+    repetidos (por ejemplo 'RANGO OBSOLETO 2' y 'PRÓXIMO A VENCER').
+
+    Args:
+        df: DataFrame a convertir (se modifica en el lugar)
+        columns: Columnas a convertir. Por defecto CATEGORICAL_COLUMNS.
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame con las columnas convertidas.
+    """
+    columnas = set(CATEGORICAL_COLUMNS if columns is None else columns)
+    for posicion, nombre in enumerate(df.columns):
+        if nombre not in columnas:
+            continue
+        serie = df.iloc[:, posicion]
+        if serie.dtype == object:
+            df.isetitem(posicion, serie.astype("category"))
+    return df
+
+
+def parse_date_columns(
+    df: pd.DataFrame, columns: Optional[List[str]] = None, format: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Convierte a datetime64 las columnas de fecha que todavía no lo son.
+
+    Las columnas que ya son datetime64 no se vuelven a recorrer, de modo que llamarla en
+    cada etapa no cuesta nada cuando las fechas ya vienen tipadas desde SAP. Los valores
+    que no se pueden interpretar quedan como NaT.
+
+    Args:
+        df: DataFrame a convertir (se modifica en el lugar)
+        columns: Columnas a convertir. Por defecto DATE_COLUMNS.
+        format: Formato de las fechas en texto (por ejemplo "%d/%m/%Y"). Por defecto se infiere.
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame con las columnas de fecha como datetime64.
+    """
+    columnas = set(DATE_COLUMNS if columns is None else columns)
+    for posicion, nombre in enumerate(df.columns):
+        if nombre not in columnas:
+            continue
+        serie = df.iloc[:, posicion]
+        if not pd.api.types.is_datetime64_any_dtype(serie):
+            df.isetitem(posicion, pd.to_datetime(serie, format=format, errors="coerce"))
+    return df
+
+
+def replace_invalid_values(df: pd.DataFrame, invalid: str = INVALID_VALUE) -> pd.DataFrame:
+    """
+    Reemplaza por NaN el valor inválido de SAP en todo el DataFrame.
+
+    En las columnas categóricas basta con quitar la categoría, sin recorrer las filas;
+    el resto de columnas de texto se reemplaza como antes con replace.
+
+    Args:
+        df: DataFrame a limpiar (se modifica en el lugar)
+        invalid: Valor a reemplazar por NaN
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame sin el valor inválido.
+    """
+    for posicion in range(df.shape[1]):
+        serie = df.iloc[:, posicion]
+        if is_categorical(serie):
+            if invalid in serie.cat.categories:
+                df.isetitem(posicion, serie.cat.remove_categories(invalid))
+        elif serie.dtype == object:
+            df.isetitem(posicion, serie.mask(serie == invalid))
+    return df
+
+
+def text_column(df: pd.DataFrame, columna: str, default: str = "") -> pd.Series:
+    """
+    Equivalente vectorizado de str(row.get(columna, default)).strip().
+
+    En las columnas categóricas la limpieza se hace una sola vez por categoría.
+
+    Args:
+        df: DataFrame de origen
+        columna: Columna a normalizar
+        default: Valor de todas las filas si la columna no existe
+
+    Returns:
+        pd.Series: Columna de texto (object) sin espacios al inicio ni al final.
+    """
+    if columna not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    serie = df[columna]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Se limpia cada categoría una sola vez; la última posición corresponde a los nulos ("nan")
+        textos = np.append(
+            serie.cat.categories.astype(str).str.strip().to_numpy(dtype=object), "nan"
+        )
+        return pd.Series(textos[serie.cat.codes.to_numpy()], index=df.index, dtype=object)
+    return serie.astype(str).str.strip()
+
+
+def transform_categories(serie: pd.Series, funcion: Callable[[pd.Index], pd.Index]) -> pd.Series:
+    """
+    Aplica una transformación de texto una sola vez por categoría en lugar de por fila.
+
+    Si la transformación hace coincidir dos categorías (por ejemplo al pasar a mayúsculas),
+    se fusionan en una sola.
+
+    Args:
+        serie: Columna categórica
+        funcion: Transformación sobre el índice de categorías (por ejemplo lambda c: c.str.upper())
+
+    Returns:
+        pd.Series: Columna categórica transformada.
+    """
+    codigos, categorias = pd.factorize(funcion(serie.cat.categories))
+    nuevos = np.where(serie.cat.codes.to_numpy() >= 0, codigos[serie.cat.codes.to_numpy()], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(nuevos, categories=categorias), index=serie.index, name=serie.name
+    )
+
+
+def concat_categorical(frames: List[pd.DataFrame], ignore_index: bool = True) -> pd.DataFrame:
+    """
+    Concatena DataFrames con las mismas columnas conservando las columnas categóricas.
+
+    pd.concat convierte a object las categóricas cuyas categorías no coinciden; aquí se
+    unifican antes las categorías (union_categoricals) para que el resultado siga siendo
+    categórico.
+
+    Args:
+        frames: DataFrames con las mismas columnas y en el mismo orden
+        ignore_index: Si es True (por defecto) se reinicia el índice; si es False se conserva
+                      el índice de cada DataFrame.
+
+    Returns:
+        pd.DataFrame: DataFrame concatenado.
+    """
+    frames = [frame.copy(deep=False) for frame in frames]
+    for posicion in range(frames[0].shape[1]):
+        series = [frame.iloc[:, posicion] for frame in frames]
+        if not all(is_categorical(serie) for serie in series):
+            continue
+        categorias = union_categoricals([serie.values for serie in series]).categories
+        tipo = pd.CategoricalDtype(categorias)
+        for frame, serie in zip(frames, series):
+            frame.isetitem(posicion, serie.astype(tipo))
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def to_export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte de nuevo a texto las columnas categóricas antes de exportar a Excel o a la base de datos.
+
+    Args:
+        df: DataFrame procesado
+
+    Returns:
+        pd.DataFrame: Copia del DataFrame sin columnas categóricas.
+    """
+    df = df.copy(deep=False)
+    for posicion in range(df.shape[1]):
+        serie = df.iloc[:, posicion]
+        if is_categorical(serie):
+            df.isetitem(posicion, serie.astype(object))
+    return df